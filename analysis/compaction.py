@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from types import MappingProxyType
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from utils.models import Activity, ActivityType
+
+# 同一域名的连续浏览记录间隔不超过这个秒数时折叠为一条
+DEFAULT_FOLD_WINDOW = 120
+
+# 折叠记录中最多保留的网页标题数量
+MAX_FOLDED_TITLES = 5
+
+# 需要从URL中去掉的跟踪参数
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "twclid", "igshid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "_hsenc", "_hsmi", "mkt_tok", "ref_src", "spm", "vero_id",
+})
+TRACKING_PREFIXES = ("utm_",)
+
+
+class CompactionStats:
+    """压缩阶段的统计：输入的记录数和输出的条目数，随着迭代更新"""
+
+    def __init__(self):
+        self.records = 0
+        self.entries = 0
+
+    @property
+    def ratio(self):
+        """压缩比（输入记录数 / 输出条目数）"""
+        return round(self.records / self.entries, 2) if self.entries else 1.0
+
+    def as_dict(self):
+        return {"records": self.records, "entries": self.entries, "ratio": self.ratio}
+
+
+def activity_repeat(activity):
+    """一个（可能经过压缩的）条目代表的原始记录数量"""
+    return activity.metadata.get("repeat", 1)
+
+
+def activity_end_epoch(activity):
+    """一个（可能经过压缩的）条目的结束时间"""
+    return activity.metadata.get("until", activity.epoch)
+
+
+def is_tracking_param(name):
+    """判断查询参数是否是跟踪参数"""
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def strip_tracking_params(url):
+    """
+    去掉URL中的跟踪参数，其他参数保持原来的顺序
+
+    Args:
+        url (str): URL
+
+    Returns:
+        str: 去掉跟踪参数后的URL，没有跟踪参数时返回原字符串
+    """
+    if "?" not in url:
+        return url
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    kept = [(name, value) for name, value in query if not is_tracking_param(name)]
+    if len(kept) == len(query):
+        return url
+    return urlunsplit(parts._replace(query=urlencode(kept)))
+
+
+def _domain(activity):
+    """浏览记录的域名，终端命令和无法解析的URL返回None"""
+    if activity.activity_type == ActivityType.TERMINAL:
+        return None
+    try:
+        return urlsplit(activity.content).hostname
+    except ValueError:
+        return None
+
+
+def strip_tracking(activities):
+    """
+    第一遍：去掉浏览记录URL中的跟踪参数
+
+    Args:
+        activities (iterable): 按时间排序的活动记录
+
+    Yields:
+        Activity: 活动记录，URL有变化时是新的记录
+    """
+    for activity in activities:
+        if activity.activity_type != ActivityType.TERMINAL and activity.content:
+            url = strip_tracking_params(activity.content)
+            if url is not activity.content:
+                activity = Activity(activity.epoch, activity.activity_type, url, activity.source,
+                                    activity.metadata, activity.title)
+        yield activity
+
+
+def collapse_repeats(activities):
+    """
+    第二遍：把连续的相同命令或相同URL合并为一条带次数的记录
+
+    合并后的metadata中repeat为次数，until为最后一次的时间。
+
+    Args:
+        activities (iterable): 按时间排序的活动记录
+
+    Yields:
+        Activity: 活动记录
+    """
+    run = None
+    count = 0
+    last_epoch = 0
+    for activity in activities:
+        if (run is not None and activity.content == run.content
+                and activity.activity_type == run.activity_type):
+            count += activity_repeat(activity)
+            last_epoch = activity_end_epoch(activity)
+            continue
+        if run is not None:
+            yield _repeated(run, count, last_epoch)
+        run, count, last_epoch = activity, activity_repeat(activity), activity_end_epoch(activity)
+    if run is not None:
+        yield _repeated(run, count, last_epoch)
+
+
+def _repeated(activity, count, last_epoch):
+    if count == 1:
+        return activity
+    metadata = dict(activity.metadata)
+    metadata.update(repeat=count, until=last_epoch)
+    return Activity(activity.epoch, activity.activity_type, activity.content, activity.source,
+                    MappingProxyType(metadata), activity.title)
+
+
+def fold_domains(activities, window=DEFAULT_FOLD_WINDOW):
+    """
+    第三遍：把时间上接近的同一域名的连续浏览记录折叠为一条
+
+    跳转链和在同一个网站内的连续浏览合并后，内容为域名，标题为去重后的前几个页面标题，
+    metadata中pages为页面数，repeat为访问次数，until为最后一次访问的时间。
+
+    Args:
+        activities (iterable): 按时间排序的活动记录
+        window (int): 两次访问之间的最大间隔（秒）
+
+    Yields:
+        Activity: 活动记录
+    """
+    group = []
+    group_domain = None
+    for activity in activities:
+        domain = _domain(activity)
+        if (group and domain is not None and domain == group_domain
+                and activity.activity_type == group[0].activity_type
+                and activity.epoch - activity_end_epoch(group[-1]) <= window):
+            group.append(activity)
+            continue
+        if group:
+            yield _folded(group, group_domain)
+        group = [activity]
+        group_domain = domain
+    if group:
+        yield _folded(group, group_domain)
+
+
+def _folded(group, domain):
+    first = group[0]
+    if len(group) == 1:
+        return first
+
+    titles = []
+    for activity in group:
+        if activity.title and activity.title not in titles and len(titles) < MAX_FOLDED_TITLES:
+            titles.append(activity.title)
+    metadata = MappingProxyType({
+        "repeat": sum(activity_repeat(activity) for activity in group),
+        "pages": len(group),
+        "until": activity_end_epoch(group[-1]),
+    })
+    return Activity(first.epoch, first.activity_type, domain, first.source, metadata,
+                    " | ".join(titles) or None)
+
+
+def compact_activities(activities, window=DEFAULT_FOLD_WINDOW, stats=None):
+    """
+    在生成提示词之前压缩活动记录：去掉跟踪参数、合并连续的重复记录、折叠同一域名的连续浏览
+
+    每一步都是对输入的一遍线性扫描，整个阶段是惰性的，可以直接接在merge_activities
+    或iter_merged_activities的输出后面。
+
+    Args:
+        activities (iterable): 按时间排序的活动记录
+        window (int): 折叠同一域名浏览记录的最大间隔（秒）
+        stats (CompactionStats, optional): 迭代过程中更新的统计
+
+    Yields:
+        Activity: 压缩后的条目
+    """
+    stats = stats if stats is not None else CompactionStats()
+
+    def counted(source):
+        for activity in source:
+            stats.records += 1
+            yield activity
+
+    for entry in fold_domains(collapse_repeats(strip_tracking(counted(activities))), window):
+        stats.entries += 1
+        yield entry
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 大模型结果缓存的默认路径
+DEFAULT_CACHE_PATH = os.path.expanduser("~/.wihd/llm_cache.db")
+
+# 缓存的默认容量上限（字节）
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+# 超出容量时淘汰到容量上限的这个比例，避免每次写入都触发淘汰
+EVICTION_TARGET_RATIO = 0.9
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+"""
+
+
+def content_key(*parts):
+    """
+    由任意可JSON序列化的内容计算缓存键
+
+    Args:
+        *parts: 参与计算的内容，例如提示词模板版本、模型设置和提示词
+
+    Returns:
+        str: SHA-256十六进制摘要
+    """
+    data = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    按内容寻址的大模型结果缓存，保存在SQLite中
+
+    键是提示词、模板和模型设置的摘要，内容相同的请求直接复用之前的结果。
+    总大小超过上限时按最近使用时间淘汰（LRU）。
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_CACHE_BYTES):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(CACHE_SCHEMA)
+        self._lock = threading.Lock()
+        self.total_bytes = self.conn.execute("SELECT coalesce(sum(size), 0) FROM entries").fetchone()[0]
+
+    def close(self):
+        """关闭数据库连接"""
+        self.conn.close()
+
+    def get(self, key):
+        """
+        读取缓存，命中时更新最近使用时间
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            object: 缓存的值，未命中时返回None
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            with self.conn:
+                self.conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """
+        写入缓存，总大小超过上限时淘汰最久未使用的条目
+
+        Args:
+            key (str): 缓存键
+            value (object): 可JSON序列化的值
+        """
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        with self._lock, self.conn:
+            old = self.conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                              (key, data, size, time.time()))
+            self.total_bytes += size - (old[0] if old else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """按最近使用时间从旧到新删除条目，直到总大小低于目标"""
+        target = self.max_bytes * EVICTION_TARGET_RATIO
+        cursor = self.conn.execute("SELECT key, size FROM entries ORDER BY last_access")
+        evicted = []
+        for key, size in cursor:
+            if self.total_bytes <= target:
+                break
+            evicted.append((key,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import os
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from analysis.llm_cache import content_key
+from analysis.compaction import (compact_activities, CompactionStats, activity_repeat, activity_end_epoch,
+                                 DEFAULT_FOLD_WINDOW)
+from analysis.sampler import StratifiedSampler, DEFAULT_SAMPLE_SIZE, DEFAULT_SAMPLE_SEED
+
+# 每个分块提示词的默认token预算
+DEFAULT_CHUNK_TOKENS = 3000
+
+# 同时发出的大模型请求数量上限
+DEFAULT_CONCURRENCY = 4
+
+# 提示词中说明文字部分预留的token数量
+PROMPT_OVERHEAD_TOKENS = 300
+
+# 每条活动记录的内容最多保留的字符数
+MAX_CONTENT_CHARS = 100
+
+SYSTEM_PROMPT = "你是一个专业的数据分析师，擅长总结用户的电脑使用行为。"
+
+# 提示词模板的版本，修改模板时递增，使旧的缓存结果失效
+PROMPT_VERSION = 4
+
+
+def estimate_tokens(text):
+    """
+    粗略估计文本的token数量
+
+    英文和符号按每4个字符1个token计算，中文等非ASCII字符按每个字符1个token计算。
+
+    Args:
+        text (str): 文本
+
+    Returns:
+        int: 估计的token数量
+    """
+    char_count = len(text)
+    # 常见的非ASCII字符在UTF-8中占3个字节，由字节数和字符数的差估计其数量
+    wide_count = (len(text.encode("utf-8")) - char_count) // 2
+    return (char_count - wide_count) // 4 + wide_count + 1
+
+
+def format_activity_line(activity):
+    """
+    把一条活动记录格式化为提示词中的一行
+
+    经过压缩的条目显示时间范围，以及次数或折叠的页面数。
+    """
+    timestamp = activity.timestamp.strftime("%H:%M:%S")
+    end_epoch = activity_end_epoch(activity)
+    if end_epoch != activity.epoch:
+        timestamp += "-" + datetime.fromtimestamp(end_epoch).strftime("%H:%M:%S")
+    activity_type = activity.activity_type.value
+    content = activity.content[:MAX_CONTENT_CHARS] if activity.content else ""
+    if activity.title:
+        line = f"{timestamp} [{activity_type}] {activity.title} - {content}"
+    else:
+        line = f"{timestamp} [{activity_type}] {content}"
+
+    repeat = activity_repeat(activity)
+    if "pages" in activity.metadata:
+        line += f" （{activity.metadata['pages']}个页面，共{repeat}次访问）"
+    elif repeat > 1:
+        line += f" ×{repeat}"
+    return line
+
+
+def chunk_activities(activities, token_budget=DEFAULT_CHUNK_TOKENS):
+    """
+    把按时间排序的活动记录切分为时间上连续的分块，每块的提示词不超过token预算
+
+    Args:
+        activities (iterable): 按时间排序的活动记录，可以是生成器
+        token_budget (int): 每个分块的token预算
+
+    Yields:
+        list: (活动记录, 提示词中的一行)的列表，每块至少包含一条记录
+    """
+    budget = max(1, token_budget - PROMPT_OVERHEAD_TOKENS)
+    chunk = []
+    used = 0
+    for activity in activities:
+        line = format_activity_line(activity)
+        tokens = estimate_tokens(line)
+        if chunk and used + tokens > budget:
+            yield chunk
+            chunk = []
+            used = 0
+        chunk.append((activity, line))
+        used += tokens
+    if chunk:
+        yield chunk
+
+
+def create_llm_prompt(chunk):
+    """
+    创建总结一个时间段的提示词，包含该时间段内的全部活动记录
+
+    Args:
+        chunk (list): chunk_activities产出的(活动记录, 行)列表
+
+    Returns:
+        str: 提示词
+    """
+    start = chunk[0][0].timestamp.strftime("%Y-%m-%d %H:%M")
+    end = datetime.fromtimestamp(activity_end_epoch(chunk[-1][0])).strftime("%H:%M")
+
+    type_counts = {}
+    for activity, _ in chunk:
+        activity_type = activity.activity_type.value
+        type_counts[activity_type] = type_counts.get(activity_type, 0) + activity_repeat(activity)
+
+    prompt = f"""以下是我在 {start} 至 {end} 之间的电脑活动记录，包含：
+- {type_counts.get('terminal', 0)} 条终端命令
+- {type_counts.get('safari', 0)} 条Safari浏览记录
+- {type_counts.get('chrome', 0)} 条Chrome浏览记录
+- {type_counts.get('firefox', 0)} 条Firefox浏览记录
+
+活动记录（按时间顺序）：
+
+"""
+    prompt += "\n".join(line for _, line in chunk)
+    prompt += "\n\n请用两到四句话总结这段时间我主要在做什么，提到具体的项目、工具或主题。"
+    return prompt
+
+
+def create_overview(summary, top=5):
+    """
+    由本地统计（analysis.statistics的结果）生成附在最后一次合并中的整体概况，不再遍历记录
+
+    Args:
+        summary (dict): generate_mock_summary的结果
+        top (int): 每一项最多列出的条目数量
+
+    Returns:
+        str: 概况文本，没有统计时返回None
+    """
+    counts = summary.get("stats")
+    if not counts:
+        return None
+    lines = ["记录数量：" + "，".join(f"{activity_type} {count}条" for activity_type, count in counts.items())]
+    if summary.get("time_range"):
+        lines.append(f"活动时间范围：{summary['time_range']}")
+    hourly = summary.get("hourly")
+    if hourly:
+        totals = [sum(row[hour] for row in hourly.values()) for hour in range(24)]
+        busiest = sorted((hour for hour in range(24) if totals[hour]), key=lambda hour: (-totals[hour], hour))[:3]
+        lines.append("最活跃的时段：" + "，".join(f"{hour}点（{totals[hour]}条）" for hour in busiest))
+    if summary.get("top_commands"):
+        lines.append("最常用的命令：" + "，".join(f"{name}（{count}次）" for name, count in summary["top_commands"][:top]))
+    if summary.get("top_domains"):
+        lines.append("最常访问的网站：" + "，".join(f"{name}（{count}次）" for name, count in summary["top_domains"][:top]))
+    projects = summary.get("time", {}).get("projects")
+    if projects:
+        lines.append("时间最多的项目：" + "，".join(f"{name}（{seconds // 60}分钟）" for name, seconds in projects[:top]))
+    return "\n".join(f"- {line}" for line in lines)
+
+
+def create_reduce_prompt(partials, final=True, examples=None, overview=None):
+    """
+    创建合并多个时间段总结的提示词
+
+    Args:
+        partials (list): (时间段, 总结文本)的列表
+        final (bool): 是否是最后一次合并，最后一次要求返回JSON
+        examples (list, optional): 附在最后一次合并中的有代表性的原始活动记录行
+        overview (str, optional): 附在最后一次合并中的整体统计概况
+
+    Returns:
+        str: 提示词
+    """
+    prompt = ""
+    if overview:
+        prompt += f"整体统计：\n{overview}\n\n"
+    prompt += "以下是我一段时间内按时间顺序排列的各时间段电脑活动总结：\n\n"
+    prompt += "\n\n".join(f"[{period}] {text}" for period, text in partials)
+    if examples:
+        prompt += "\n\n从全天按时段和类型抽取的原始活动记录示例：\n\n" + "\n".join(examples)
+    if final:
+        prompt += """
+
+请综合这些总结，只返回如下格式的JSON，不要包含其他内容：
+{"summary": "一段总结，描述主要活动、使用电脑的目的、花费时间最多的活动，以及改进效率的建议", "categories": ["活动的主题或项目", "..."]}"""
+    else:
+        prompt += "\n\n请把这些总结合并为一段按时间顺序的总结，保留具体的项目、工具和主题。"
+    return prompt
+
+
+def parse_summary_response(text):
+    """
+    解析最后一次合并返回的JSON，无法解析时把整段文本作为总结
+
+    Args:
+        text (str): 大模型返回的文本
+
+    Returns:
+        dict: 包含summary和categories的字典
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start >= 0 and end > start:
+        try:
+            data = json.loads(text[start:end + 1])
+            if isinstance(data, dict) and isinstance(data.get("summary"), str):
+                categories = data.get("categories")
+                return {
+                    "summary": data["summary"],
+                    "categories": [str(c) for c in categories] if isinstance(categories, list) else []
+                }
+        except ValueError:
+            pass
+    return {"summary": text.strip(), "categories": []}
+
+
+class LLMBackend(ABC):
+    """
+    大模型后端的接口
+
+    实现complete方法即可替换为其他服务或本地模型。
+    """
+
+    @property
+    def settings(self):
+        """影响回复内容的设置（模型名称、温度等），参与缓存键的计算"""
+        return {}
+
+    @abstractmethod
+    async def complete(self, messages):
+        """
+        发送一次对话请求
+
+        Args:
+            messages (list): OpenAI格式的消息列表
+
+        Returns:
+            str: 模型回复的文本
+        """
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """调用OpenAI兼容的/chat/completions接口，请求在线程池中执行，不需要额外的依赖"""
+
+    def __init__(self, base_url, model, api_key=None, temperature=0.3, timeout=120, max_workers=DEFAULT_CONCURRENCY):
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.model = model
+        self.api_key = api_key if api_key is not None else os.environ.get("OPENAI_API_KEY")
+        self.temperature = temperature
+        self.timeout = timeout
+        # 阻塞的HTTP请求在专用线程池中执行，线程数应不小于并发上限
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+
+    @property
+    def settings(self):
+        return {"model": self.model, "temperature": self.temperature}
+
+    def _post(self, messages):
+        body = json.dumps({
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+        }).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(self.url, data=body, headers=headers, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            data = json.loads(response.read().decode("utf-8"))
+        return data["choices"][0]["message"]["content"]
+
+    async def complete(self, messages):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._post, messages)
+
+
+class MapReduceSummarizer:
+    """
+    分块并发的大模型总结
+
+    先把时间线切分为不超过token预算的连续分块，在并发上限内分别总结（map），
+    再把各分块的总结合并为最终的summary和categories（reduce）。合并的输入
+    超过预算时分组逐层合并。
+
+    默认在切分之前压缩时间线（见analysis.compaction），减少每个请求的token数量；
+    同时从原始记录中分层抽取有代表性的示例（见analysis.sampler），附在最后一次合并中。
+    提供缓存时，每次请求按提示词、模板版本和模型设置的摘要缓存回复，整个总结按
+    各分块的缓存键缓存。只有最后一段时间变化的一天只会重新总结变化的分块。
+    """
+
+    def __init__(self, backend, chunk_tokens=DEFAULT_CHUNK_TOKENS, concurrency=DEFAULT_CONCURRENCY, cache=None,
+                 compact=True, fold_window=DEFAULT_FOLD_WINDOW, examples=DEFAULT_SAMPLE_SIZE,
+                 seed=DEFAULT_SAMPLE_SEED):
+        self.backend = backend
+        self.chunk_tokens = chunk_tokens
+        self.concurrency = max(1, concurrency)
+        self.cache = cache
+        self.compact = compact
+        self.fold_window = fold_window
+        self.examples = examples
+        self.seed = seed
+        self.requests = 0
+        self.failures = 0
+
+    def _cache_key(self, kind, content):
+        return content_key(PROMPT_VERSION, SYSTEM_PROMPT, self.backend.settings, kind, content)
+
+    async def _complete(self, semaphore, prompt, counter, key=None):
+        if self.cache is not None:
+            key = key or self._cache_key("prompt", prompt)
+            cached = self.cache.get(key)
+            if cached is not None:
+                counter["hits"] += 1
+                return cached
+            counter["misses"] += 1
+
+        async with semaphore:
+            self.requests += 1
+            counter["requests"] += 1
+            response = await self.backend.complete([
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ])
+        # 只缓存成功的回复
+        if self.cache is not None:
+            self.cache.put(key, response)
+        return response
+
+    async def _map(self, semaphore, period, prompt, fallback, counter, key=None):
+        try:
+            return period, (await self._complete(semaphore, prompt, counter, key)).strip()
+        except Exception as e:
+            self.failures += 1
+            counter["failures"] += 1
+            print(f"总结时间段 {period} 时出错: {str(e)}")
+            return period, fallback
+
+    async def _collect(self, semaphore, activities, counter, keys):
+        """
+        并发总结每个分块，按时间顺序返回各分块的(时间段, 总结)
+
+        同时在途的分块数量有上限，输入是生成器时内存占用有界。各分块提示词的
+        缓存键按顺序追加到keys中。
+        """
+        tasks = []
+        pending = set()
+        for chunk in chunk_activities(activities, self.chunk_tokens):
+            if len(pending) >= self.concurrency * 2:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            start, end = chunk[0][0].timestamp, datetime.fromtimestamp(activity_end_epoch(chunk[-1][0]))
+            period = f"{start.strftime('%Y-%m-%d %H:%M')}-{end.strftime('%H:%M')}"
+            fallback = f"这段时间有{sum(activity_repeat(activity) for activity, _ in chunk)}条活动记录。"
+            # 只保留提示词，分块中的活动记录可以尽早释放
+            prompt = create_llm_prompt(chunk)
+            key = self._cache_key("prompt", prompt)
+            keys.append(key)
+            task = asyncio.ensure_future(self._map(semaphore, period, prompt, fallback, counter, key))
+            tasks.append(task)
+            pending.add(task)
+        return [await task for task in tasks]
+
+    async def _reduce(self, semaphore, partials, counter, examples=None, overview=None):
+        """逐层合并各时间段的总结，最后一次合并返回summary和categories"""
+        # 最后一次合并还要附上示例和概况，预算中扣除这部分
+        example_tokens = sum(estimate_tokens(line) for line in examples or ()) + estimate_tokens(overview or "")
+        budget = max(1, self.chunk_tokens - PROMPT_OVERHEAD_TOKENS - example_tokens)
+        while sum(estimate_tokens(text) for _, text in partials) > budget and len(partials) > 1:
+            groups = []
+            group, used = [], 0
+            for period, text in partials:
+                tokens = estimate_tokens(text)
+                if group and used + tokens > budget:
+                    groups.append(group)
+                    group, used = [], 0
+                group.append((period, text))
+                used += tokens
+            groups.append(group)
+            if len(groups) == len(partials):
+                # 每条总结都已经超过预算，无法再分组，直接合并
+                break
+            partials = await asyncio.gather(*(
+                self._map(semaphore, f"{group[0][0]} ~ {group[-1][0]}",
+                          create_reduce_prompt(group, final=False), " ".join(text for _, text in group), counter)
+                for group in groups
+            ))
+
+        response = await self._complete(semaphore, create_reduce_prompt(partials, final=True, examples=examples,
+                                                                         overview=overview), counter)
+        return parse_summary_response(response)
+
+    async def summarize_async(self, activities, semaphore=None, overview=None):
+        """
+        总结一组活动记录（协程）
+
+        Args:
+            activities (iterable): 按时间排序的活动记录
+            semaphore (asyncio.Semaphore, optional): 与其他总结共享的并发限制
+            overview (str, optional): 由本地统计生成的整体概况，见create_overview
+
+        Returns:
+            dict: 包含summary、categories和llm统计信息的字典，没有记录时返回None
+        """
+        semaphore = semaphore or asyncio.Semaphore(self.concurrency)
+        started = time.perf_counter()
+        counter = self._new_counter()
+        keys = []
+        sampler = None
+        if self.examples > 0:
+            sampler = StratifiedSampler(self.examples, self.seed)
+            activities = sampler.feed(activities)
+        compaction = None
+        if self.compact:
+            compaction = CompactionStats()
+            activities = compact_activities(activities, self.fold_window, compaction)
+
+        partials = await self._collect(semaphore, activities, counter, keys)
+        if not partials:
+            return None
+
+        examples = [format_activity_line(activity) for activity in sampler.sample()] if sampler else None
+        result = None
+        if self.cache is not None:
+            summary_key = self._cache_key("summary", [keys, examples, overview])
+            result = self.cache.get(summary_key)
+            counter["summary_hit"] = result is not None
+        if result is None:
+            result = await self._reduce(semaphore, partials, counter, examples, overview)
+            # 有分块使用了后备文本时不缓存整个总结，下次运行会重试失败的分块
+            if self.cache is not None and not counter["failures"]:
+                self.cache.put(summary_key, result)
+
+        result["llm"] = {
+            "chunks": len(partials),
+            "requests": counter["requests"],
+            "elapsed": round(time.perf_counter() - started, 3),
+        }
+        if compaction is not None:
+            result["llm"]["compaction"] = compaction.as_dict()
+        if self.cache is not None:
+            result["llm"]["cache"] = {
+                "hits": counter["hits"],
+                "misses": counter["misses"],
+                "summary_hit": counter["summary_hit"],
+            }
+        return result
+
+    @staticmethod
+    def _new_counter():
+        return {"requests": 0, "failures": 0, "hits": 0, "misses": 0, "summary_hit": False}
+
+    def summarize(self, activities, overview=None):
+        """总结一组活动记录"""
+        return asyncio.run(self.summarize_async(activities, overview=overview))
+
+    def summarize_many(self, activity_groups, overviews=None):
+        """
+        在同一个事件循环中并发总结多组活动记录（例如日期范围中的每一天），共享并发限制
+
+        Args:
+            activity_groups (list): 活动记录序列的列表
+            overviews (list, optional): 与activity_groups一一对应的整体概况
+
+        Returns:
+            list: 与输入顺序一致的总结结果
+        """
+        overviews = overviews or [None] * len(activity_groups)
+
+        async def run():
+            semaphore = asyncio.Semaphore(self.concurrency)
+            return await asyncio.gather(*(self.summarize_async(activities, semaphore, overview)
+                                          for activities, overview in zip(activity_groups, overviews)))
+        return asyncio.run(run())
+
+    def combine(self, summaries, overview=None):
+        """
+        把已经生成的多段总结合并为一个总结，用于日期范围的汇总
+
+        Args:
+            summaries (list): (时间段, 总结文本)的列表
+            overview (str, optional): 整个范围的整体概况
+
+        Returns:
+            dict: 包含summary和categories的字典
+        """
+        async def run():
+            return await self._reduce(asyncio.Semaphore(self.concurrency), list(summaries), self._new_counter(),
+                                      overview=overview)
+        return asyncio.run(run())
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import heapq
+import math
+import zlib
+from urllib.parse import urlsplit
+
+from utils.models import ActivityType
+
+# 默认的示例数量
+DEFAULT_SAMPLE_SIZE = 20
+
+# 默认的随机种子
+DEFAULT_SAMPLE_SEED = 0
+
+# 估计命令和域名出现次数的Count-Min草图的宽度和深度，内存占用固定
+SKETCH_WIDTH = 4096
+SKETCH_DEPTH = 4
+
+
+class CountMinSketch:
+    """
+    固定内存的出现次数估计，估计值不小于真实次数
+
+    使用crc32计算哈希，不受PYTHONHASHSEED影响，同样的输入总是得到同样的估计。
+    """
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH):
+        self.width = width
+        self.rows = [[0] * width for _ in range(depth)]
+
+    def add(self, key):
+        """
+        记录一次出现
+
+        Args:
+            key (str): 命令或域名
+
+        Returns:
+            int: 包括这一次在内的估计出现次数
+        """
+        data = key.encode("utf-8")
+        estimate = None
+        for seed, row in enumerate(self.rows):
+            index = zlib.crc32(data, seed) % self.width
+            row[index] += 1
+            if estimate is None or row[index] < estimate:
+                estimate = row[index]
+        return estimate
+
+
+def rarity_key(activity):
+    """计算稀有程度时使用的键：终端命令是整条命令，浏览记录是域名"""
+    if activity.activity_type == ActivityType.TERMINAL:
+        return "cmd:" + (activity.content or "").strip()
+    try:
+        return "domain:" + (urlsplit(activity.content or "").hostname or "")
+    except ValueError:
+        return "domain:"
+
+
+class StratifiedSampler:
+    """
+    流式的分层加权水塘抽样
+
+    按(小时, 活动类型)分层，每层用加权水塘抽样（A-Res：保留u^(1/w)最大的记录）保存
+    候选，权重与命令或域名到目前为止的出现次数成反比，少见的命令和域名更容易被选中。
+    抽样键在对数域中计算为log(u)/w，顺序与u^(1/w)相同；出现上千次的命令的u^(1/w)会
+    下溢为0，那样同一层中常见的记录只能按时间取舍。
+    随机数由种子和记录本身的哈希得到，与记录在流中的位置无关：同样的种子和数据总是
+    得到同样的样本，一天中新增的记录也不会改变已有记录的抽样键。
+
+    内存占用有上限：每层最多保存size条候选，加上固定大小的计数草图。
+    """
+
+    def __init__(self, size=DEFAULT_SAMPLE_SIZE, seed=DEFAULT_SAMPLE_SEED):
+        self.size = size
+        self.seed = str(seed).encode("utf-8")
+        self.strata = {}
+        self.stratum_counts = {}
+        self.counts = CountMinSketch()
+        self.seen = 0
+
+    def _uniform(self, activity):
+        digest = hashlib.blake2b(self.seed, digest_size=8)
+        digest.update(f"{activity.epoch}\0{activity.activity_type.value}\0{activity.content}".encode("utf-8"))
+        # 取(0, 1]之间的均匀分布
+        return (int.from_bytes(digest.digest(), "big") + 1) / 2 ** 64
+
+    def add(self, activity):
+        """加入一条活动记录"""
+        self.seen += 1
+        if self.size <= 0:
+            return
+        stratum = (activity.timestamp.hour, activity.activity_type.value)
+        self.stratum_counts[stratum] = self.stratum_counts.get(stratum, 0) + 1
+
+        weight = 1.0 / self.counts.add(rarity_key(activity))
+        key = math.log(self._uniform(activity)) / weight
+
+        reservoir = self.strata.setdefault(stratum, [])
+        # 以(键, 时间, 序号)比较，不会比较到Activity对象
+        item = (key, activity.epoch, self.seen, activity)
+        if len(reservoir) < self.size:
+            heapq.heappush(reservoir, item)
+        elif item[:2] > reservoir[0][:2]:
+            heapq.heapreplace(reservoir, item)
+
+    def feed(self, activities):
+        """
+        把活动记录加入样本的同时原样产出，用于接在已有的流式处理前面
+
+        Args:
+            activities (iterable): 活动记录
+
+        Yields:
+            Activity: 输入的活动记录
+        """
+        for activity in activities:
+            self.add(activity)
+            yield activity
+
+    def sample(self):
+        """
+        从各层的候选中选出最多size条示例
+
+        按轮次从每一层依次取出键最大的候选，记录较多的层先取，保证样本覆盖尽量多的
+        时段和类型。
+
+        Returns:
+            list: 按时间排序的示例活动记录
+        """
+        ranked = {stratum: sorted(reservoir, key=lambda item: item[:2], reverse=True)
+                  for stratum, reservoir in self.strata.items()}
+        order = sorted(ranked, key=lambda stratum: (-self.stratum_counts[stratum], stratum))
+        picked = []
+        depth = 0
+        while len(picked) < self.size:
+            progressed = False
+            for stratum in order:
+                if depth < len(ranked[stratum]):
+                    picked.append(ranked[stratum][depth])
+                    progressed = True
+                    if len(picked) == self.size:
+                        break
+            if not progressed:
+                break
+            depth += 1
+        return [item[3] for item in sorted(picked, key=lambda item: (item[1], item[0]))]
+
+
+def sample_activities(activities, size=DEFAULT_SAMPLE_SIZE, seed=DEFAULT_SAMPLE_SEED):
+    """
+    一次遍历从活动记录中选出有代表性的示例
+
+    Args:
+        activities (iterable): 活动记录，可以是生成器
+        size (int): 示例数量
+        seed (int): 随机种子
+
+    Returns:
+        list: 按时间排序的示例活动记录
+    """
+    sampler = StratifiedSampler(size, seed)
+    for activity in activities:
+        sampler.add(activity)
+    return sampler.sample()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from array import array
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+from utils.models import ACTIVITY_TYPES, ACTIVITY_TYPE_CODES, ActivityType
+
+try:
+    import numpy as np
+except ImportError:  # 没有安装NumPy时使用纯Python的实现
+    np = None
+
+# 两条活动记录之间超过这个秒数视为离开，开始新的工作时段
+DEFAULT_IDLE_GAP = 30 * 60
+
+# 计算活跃时间时，两条记录之间的间隔最多计入这么多秒
+ACTIVE_GAP_CAP = 5 * 60
+
+
+def url_domain(url):
+    """
+    快速提取URL的域名（小写，不含端口和用户信息）
+
+    比urlsplit快得多，用于对大量记录逐条提取；不是URL时返回None。
+    """
+    _, sep, rest = url.partition("://")
+    if not sep:
+        return None
+    host = rest.split("/", 1)[0].split("?", 1)[0].split("#", 1)[0]
+    host = host.rpartition("@")[2].split(":", 1)[0]
+    return host.lower() or None
+
+
+class TimelineColumns:
+    """
+    合并后时间线的列式表示：时间戳、活动类型编码和域名编码
+
+    每条记录只占13个字节，可以在遍历活动记录时顺便收集，之后交给向量化的计算。
+    没有域名的记录（终端命令）域名编码为-1。
+    """
+
+    def __init__(self):
+        self.epochs = array('q')
+        self.type_codes = array('B')
+        self.domain_codes = array('i')
+        self.domains = []
+        self._domain_index = {}
+
+    @classmethod
+    def from_activities(cls, activities):
+        columns = cls()
+        for activity in activities:
+            columns.add(activity)
+        return columns
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def add(self, activity):
+        """追加一条活动记录"""
+        domain = None
+        if activity.activity_type != ActivityType.TERMINAL and activity.content:
+            domain = url_domain(activity.content)
+        self.append(activity.epoch, ACTIVITY_TYPE_CODES[activity.activity_type], domain)
+
+    def append(self, epoch, type_code, domain=None):
+        """追加已经解析好的一行：时间戳、类型编码和域名"""
+        self.epochs.append(epoch)
+        self.type_codes.append(type_code)
+        self.domain_codes.append(self.domain_code(domain))
+
+    def extend(self, other):
+        """
+        在后面拼接另一段时间线，other的域名编码换算为本时间线的编码
+
+        Args:
+            other (TimelineColumns): 之后的一段时间线
+        """
+        codes = [self.domain_code(domain) for domain in other.domains]
+        self.epochs.extend(other.epochs)
+        self.type_codes.extend(other.type_codes)
+        if codes == list(range(len(codes))):
+            self.domain_codes.extend(other.domain_codes)
+        elif np is not None:
+            # 换算表的最后一项是-1，没有域名的行（编码-1）换算后仍是-1
+            remap = np.array(codes + [-1], dtype=np.int32)
+            self.domain_codes.frombytes(remap[np.frombuffer(other.domain_codes, dtype=np.int32)].tobytes())
+        else:
+            self.domain_codes.extend(codes[code] if code >= 0 else -1 for code in other.domain_codes)
+
+    def domain_code(self, domain):
+        """域名的编码，第一次出现时分配，None为-1"""
+        if domain is None:
+            return -1
+        code = self._domain_index.get(domain)
+        if code is None:
+            code = self._domain_index[domain] = len(self.domains)
+            self.domains.append(domain)
+        return code
+
+
+@dataclass
+class Session:
+    """一个工作时段"""
+    start: int                    # 第一条记录的时间（Unix时间戳）
+    end: int                      # 最后一条记录的时间（Unix时间戳）
+    events: int                   # 记录数量
+    active_seconds: int           # 活跃时间：时段内相邻记录的间隔之和，每个间隔最多计入ACTIVE_GAP_CAP秒
+    activity_type: str            # 记录最多的活动类型
+    domain: Optional[str] = None  # 浏览记录中出现最多的域名
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def sessionize(columns, idle_gap=DEFAULT_IDLE_GAP, active_cap=ACTIVE_GAP_CAP):
+    """
+    按空闲间隔把时间线划分为工作时段
+
+    安装了NumPy时用一次向量化的差分和阈值比较找到分界，再用bincount和unique统计每个
+    时段的活跃时间、主要活动类型和主要域名；否则使用等价的纯Python实现。
+
+    Args:
+        columns (TimelineColumns): 按时间排序的时间线
+        idle_gap (int): 开始新时段的空闲间隔（秒）
+        active_cap (int): 计算活跃时间时每个间隔最多计入的秒数
+
+    Returns:
+        list: 按时间排序的Session列表
+    """
+    if not len(columns):
+        return []
+    if np is not None:
+        return _sessionize_numpy(columns, idle_gap, active_cap)
+    return _sessionize_python(columns, idle_gap, active_cap)
+
+
+def _sessionize_numpy(columns, idle_gap, active_cap):
+    epochs = np.frombuffer(columns.epochs, dtype=np.int64)
+    type_codes = np.frombuffer(columns.type_codes, dtype=np.uint8)
+    domain_codes = np.frombuffer(columns.domain_codes, dtype=np.int32)
+    if epochs.size > 1 and np.any(epochs[1:] < epochs[:-1]):
+        order = np.argsort(epochs, kind="stable")
+        epochs, type_codes, domain_codes = epochs[order], type_codes[order], domain_codes[order]
+
+    count = epochs.size
+    gaps = np.diff(epochs)
+    is_break = gaps > idle_gap
+    breaks = np.flatnonzero(is_break) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [count]))
+    session_count = starts.size
+
+    # 时段内的间隔之和：间隔的前缀和在每个时段首尾的差
+    capped = np.minimum(gaps, active_cap)
+    capped[is_break] = 0
+    prefix = np.concatenate(([0], np.cumsum(capped)))
+    active = prefix[ends - 1] - prefix[starts]
+
+    session_ids = np.repeat(np.arange(session_count), ends - starts)
+
+    type_total = len(ACTIVITY_TYPES)
+    type_counts = np.bincount(session_ids * type_total + type_codes,
+                              minlength=session_count * type_total).reshape(session_count, type_total)
+    dominant_types = type_counts.argmax(axis=1)
+
+    dominant_domains = np.full(session_count, -1, dtype=np.int64)
+    has_domain = domain_codes >= 0
+    if has_domain.any():
+        domain_total = len(columns.domains)
+        keys = session_ids[has_domain].astype(np.int64) * domain_total + domain_codes[has_domain]
+        unique_keys, key_counts = np.unique(keys, return_counts=True)
+        key_sessions, key_domains = unique_keys // domain_total, unique_keys % domain_total
+        # 每个时段按次数从多到少排列，次数相同时先出现的域名在前，取第一个
+        order = np.lexsort((key_domains, -key_counts, key_sessions))
+        sorted_sessions = key_sessions[order]
+        first = np.concatenate(([True], sorted_sessions[1:] != sorted_sessions[:-1]))
+        dominant_domains[sorted_sessions[first]] = key_domains[order][first]
+
+    return [
+        Session(
+            start=int(epochs[start]),
+            end=int(epochs[end - 1]),
+            events=int(end - start),
+            active_seconds=int(seconds),
+            activity_type=ACTIVITY_TYPES[type_code].value,
+            domain=columns.domains[domain_code] if domain_code >= 0 else None,
+        )
+        for start, end, seconds, type_code, domain_code in zip(
+            starts.tolist(), ends.tolist(), active.tolist(), dominant_types.tolist(), dominant_domains.tolist())
+    ]
+
+
+def _sessionize_python(columns, idle_gap, active_cap):
+    rows = zip(columns.epochs, columns.type_codes, columns.domain_codes)
+    if any(later < earlier for earlier, later in zip(columns.epochs, columns.epochs[1:])):
+        rows = sorted(rows, key=lambda row: row[0])
+
+    sessions = []
+    current = None
+    previous = None
+    for epoch, type_code, domain_code in rows:
+        if current is None or epoch - previous > idle_gap:
+            if current is not None:
+                sessions.append(_finish_session(current, previous, columns.domains))
+            current = {"start": epoch, "events": 0, "active": 0, "types": {}, "domains": {}}
+        else:
+            current["active"] += min(epoch - previous, active_cap)
+        current["events"] += 1
+        current["types"][type_code] = current["types"].get(type_code, 0) + 1
+        if domain_code >= 0:
+            current["domains"][domain_code] = current["domains"].get(domain_code, 0) + 1
+        previous = epoch
+    sessions.append(_finish_session(current, previous, columns.domains))
+    return sessions
+
+
+def _finish_session(current, end, domains):
+    # 次数相同时取编码较小的类型和先出现的域名，与NumPy的实现一致
+    type_code = min(current["types"], key=lambda code: (-current["types"][code], code))
+    domain = None
+    if current["domains"]:
+        domain_code = min(current["domains"], key=lambda code: (-current["domains"][code], code))
+        domain = domains[domain_code]
+    return Session(current["start"], end, current["events"], current["active"],
+                   ACTIVITY_TYPES[type_code].value, domain)
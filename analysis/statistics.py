@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+from datetime import datetime
+from itertools import compress
+
+from analysis.sessions import TimelineColumns, sessionize, url_domain, DEFAULT_IDLE_GAP
+from analysis.time_attribution import TimeAttributor, command_name
+from utils.profiler import span
+from utils.models import ACTIVITY_TYPES, ACTIVITY_TYPE_CODES, ActivityBatch, ActivityType
+
+try:
+    import numpy as np
+except ImportError:  # 没有安装NumPy时批次也逐条统计
+    np = None
+
+# 排行榜保留的条目数量
+TOP_K = 10
+
+# 所有时区的UTC偏移都是15分钟的整数倍，同一个15分钟区间内的本地小时相同
+HOUR_BUCKET_SECONDS = 15 * 60
+
+TERMINAL_CODE = ACTIVITY_TYPE_CODES[ActivityType.TERMINAL]
+
+
+class ActivityStatistics:
+    """
+    单遍的活动统计
+
+    一次遍历同时得到：各类型的数量、时间范围、每小时每类型的直方图、最常用的命令
+    （程序名）和最常访问的域名、不同命令和域名的数量，以及划分工作时段用的列式数据
+    和时间去向。总结、提示词和输出都使用这一份结果，不再各自重新遍历记录。
+
+    逐条的add可以接收生成器中的记录；add_batch接收ActivityBatch，安装了NumPy时数量、
+    时间范围和直方图是向量化计算的，命令和域名按不同的字符串而不是按记录解析。
+    记录需要按时间顺序加入。
+    """
+
+    def __init__(self, idle_gap=DEFAULT_IDLE_GAP, top=TOP_K):
+        self.idle_gap = idle_gap
+        self.top = top
+        self.type_counts = [0] * len(ACTIVITY_TYPES)
+        self.hourly = [[0] * 24 for _ in ACTIVITY_TYPES]
+        self.first_epoch = None
+        self.last_epoch = None
+        self.programs = Counter()
+        self.domains = Counter()
+        self.command_hashes = set()
+        self.columns = TimelineColumns()
+        self.attributor = TimeAttributor()
+        self._hours = {}
+
+    @property
+    def total(self):
+        return sum(self.type_counts)
+
+    def _local_hour(self, epoch):
+        bucket = epoch // HOUR_BUCKET_SECONDS
+        hour = self._hours.get(bucket)
+        if hour is None:
+            hour = self._hours[bucket] = datetime.fromtimestamp(bucket * HOUR_BUCKET_SECONDS).hour
+        return hour
+
+    def add(self, activity):
+        """加入一条活动记录"""
+        epoch = activity.epoch
+        type_code = ACTIVITY_TYPE_CODES[activity.activity_type]
+        self.type_counts[type_code] += 1
+        self.hourly[type_code][self._local_hour(epoch)] += 1
+        if self.first_epoch is None or epoch < self.first_epoch:
+            self.first_epoch = epoch
+        if self.last_epoch is None or epoch > self.last_epoch:
+            self.last_epoch = epoch
+
+        content = activity.content or ""
+        command = domain = None
+        if type_code == TERMINAL_CODE:
+            command = command_name(content)
+            if command is not None:
+                self.programs[command] += 1
+            self.command_hashes.add(hash(content))
+        else:
+            domain = url_domain(content)
+            if domain is not None:
+                self.domains[domain] += 1
+        self.columns.append(epoch, type_code, domain)
+        self.attributor.add_record(epoch, activity.activity_type, content, activity.metadata, command, domain)
+
+    def add_activities(self, activities):
+        """加入一组活动记录，ActivityBatch使用批量的实现"""
+        if isinstance(activities, ActivityBatch):
+            self.add_batch(activities)
+            return
+        for activity in activities:
+            self.add(activity)
+
+    def add_batch(self, batch):
+        """
+        加入一个按时间排序的ActivityBatch
+
+        Args:
+            batch (ActivityBatch): 活动记录批次
+        """
+        if np is None or not len(batch):
+            for activity in batch:
+                self.add(activity)
+            return
+
+        epochs = np.frombuffer(batch.epochs, dtype=np.int64)
+        type_codes = np.frombuffer(batch.type_codes, dtype=np.uint8)
+        type_total = len(ACTIVITY_TYPES)
+
+        for code, count in enumerate(np.bincount(type_codes, minlength=type_total).tolist()):
+            self.type_counts[code] += count
+        first, last = int(epochs.min()), int(epochs.max())
+        self.first_epoch = first if self.first_epoch is None else min(self.first_epoch, first)
+        self.last_epoch = last if self.last_epoch is None else max(self.last_epoch, last)
+
+        # 每个15分钟区间只换算一次本地小时
+        buckets, inverse = np.unique(epochs // HOUR_BUCKET_SECONDS, return_inverse=True)
+        bucket_hours = np.array([self._local_hour(int(bucket) * HOUR_BUCKET_SECONDS) for bucket in buckets.tolist()],
+                                dtype=np.int64)
+        hours = bucket_hours[inverse.reshape(-1)]
+        histogram = np.bincount(type_codes.astype(np.int64) * 24 + hours, minlength=type_total * 24)
+        for code, row in enumerate(histogram.reshape(type_total, 24).tolist()):
+            for hour, count in enumerate(row):
+                self.hourly[code][hour] += count
+
+        # 命令和URL先按字符串计数，每个不同的字符串只解析一次
+        is_terminal = (type_codes == TERMINAL_CODE).tolist()
+        commands = {}
+        for content, count in Counter(compress(batch.contents, is_terminal)).items():
+            command = commands[content] = command_name(content or "")
+            self.command_hashes.add(hash(content or ""))
+            if command is not None:
+                self.programs[command] += count
+        domains = {}
+        for content, count in Counter(compress(batch.contents, [not terminal for terminal in is_terminal])).items():
+            domain = domains[content] = url_domain(content or "")
+            if domain is not None:
+                self.domains[domain] += count
+
+        # 列式数据直接复制，域名编码按不同的URL换算
+        domain_codes = {content: self.columns.domain_code(domain) for content, domain in domains.items()}
+        self.columns.epochs.extend(batch.epochs)
+        self.columns.type_codes.extend(batch.type_codes)
+        self.columns.domain_codes.extend(
+            -1 if terminal else domain_codes[content] for content, terminal in zip(batch.contents, is_terminal))
+
+        # 时间去向需要逐条的时长，按记录顺序直接使用各列
+        add_record = self.attributor.add_record
+        for epoch, type_code, content, metadata, terminal in zip(batch.epochs, batch.type_codes, batch.contents,
+                                                                 batch.metadata, is_terminal):
+            if terminal:
+                add_record(epoch, ACTIVITY_TYPES[type_code], content, metadata, commands[content], None)
+            else:
+                add_record(epoch, ACTIVITY_TYPES[type_code], content, metadata, None, domains[content])
+
+    def merge(self, other):
+        """
+        合并之后一段时间线（例如下一天）的统计，不再重新遍历记录
+
+        数量、直方图、命令和域名的计数以及不同命令的集合直接相加，排行在result中由
+        合并后的完整计数得到；时间线的列拼接在后面，工作时段按合并后的时间线划分，
+        跨过午夜的时段不会被切开。时间去向见TimeAttributor.merge。
+
+        Args:
+            other (ActivityStatistics): 之后一段时间线的统计
+
+        Returns:
+            ActivityStatistics: self
+        """
+        for code, count in enumerate(other.type_counts):
+            self.type_counts[code] += count
+        for row, other_row in zip(self.hourly, other.hourly):
+            for hour, count in enumerate(other_row):
+                row[hour] += count
+        if other.first_epoch is not None:
+            self.first_epoch = other.first_epoch if self.first_epoch is None else min(self.first_epoch, other.first_epoch)
+            self.last_epoch = other.last_epoch if self.last_epoch is None else max(self.last_epoch, other.last_epoch)
+        self.programs.update(other.programs)
+        self.domains.update(other.domains)
+        self.command_hashes |= other.command_hashes
+        self.columns.extend(other.columns)
+        self.attributor.merge(other.attributor)
+        return self
+
+    def result(self):
+        """
+        统计结果
+
+        Returns:
+            dict: counts为各类型的数量，first_epoch/last_epoch为时间范围，hourly为各类型
+                  24小时的记录数，top_commands/top_domains为[名称, 次数]列表，distinct为
+                  不同命令行、程序和域名的数量，sessions为工作时段，time为时间去向
+        """
+        counts = {}
+        hourly = {}
+        for code, activity_type in enumerate(ACTIVITY_TYPES):
+            if self.type_counts[code]:
+                counts[activity_type.value] = self.type_counts[code]
+                hourly[activity_type.value] = list(self.hourly[code])
+
+        def ranked(counter):
+            return [[name, count] for name, count in sorted(counter.items(), key=lambda item: (-item[1], item[0]))[:self.top]]
+
+        return {
+            "total": self.total,
+            "counts": counts,
+            "first_epoch": self.first_epoch,
+            "last_epoch": self.last_epoch,
+            "hourly": hourly,
+            "top_commands": ranked(self.programs),
+            "top_domains": ranked(self.domains),
+            "distinct": {
+                "commands": len(self.command_hashes),
+                "programs": len(self.programs),
+                "domains": len(self.domains),
+            },
+            "sessions": [session.as_dict() for session in sessionize(self.columns, self.idle_gap)],
+            "time": self.attributor.finish(),
+        }
+
+
+def collect_statistics(activities, idle_gap=DEFAULT_IDLE_GAP):
+    """
+    一次遍历收集活动记录的统计，返回可以继续合并的ActivityStatistics
+
+    Args:
+        activities (iterable): 按时间排序的活动记录，可以是生成器或ActivityBatch
+        idle_gap (int): 划分工作时段的空闲间隔（秒）
+
+    Returns:
+        ActivityStatistics: 统计
+    """
+    statistics = ActivityStatistics(idle_gap)
+    with span("statistics") as statistics_span:
+        statistics.add_activities(activities)
+        statistics_span.set(rows=statistics.total)
+    return statistics
+
+
+def statistics_result(statistics):
+    """ActivityStatistics的统计结果"""
+    with span("statistics.result"):
+        return statistics.result()
+
+
+def compute_statistics(activities, idle_gap=DEFAULT_IDLE_GAP):
+    """
+    一次遍历计算活动记录的全部统计
+
+    Args:
+        activities (iterable): 按时间排序的活动记录，可以是生成器或ActivityBatch
+        idle_gap (int): 划分工作时段的空闲间隔（秒）
+
+    Returns:
+        dict: 统计结果，见ActivityStatistics.result
+    """
+    return statistics_result(collect_statistics(activities, idle_gap))
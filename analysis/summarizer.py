@@ -4,17 +4,27 @@
 import json
 import os
 from datetime import datetime
+from itertools import chain
 from typing import List, Dict, Any
+from utils.activity_writer import write_activities, OUTPUT_FORMATS, DEFAULT_OUTPUT_FORMAT
+from analysis.sessions import DEFAULT_IDLE_GAP
+from analysis.statistics import ActivityStatistics, collect_statistics, compute_statistics, statistics_result
+from analysis.llm_summarizer import create_overview
+from utils.profiler import span
 
 # 这里将来可以替换为实际的大模型API调用
 # 目前使用简单的模拟功能
 
-def summarize_activities(activities):
+def summarize_activities(activities, save=True, output_format=DEFAULT_OUTPUT_FORMAT, llm=None, idle_gap=DEFAULT_IDLE_GAP):
     """
     使用大模型分析和总结活动记录
     
     Args:
         activities (list): 活动记录列表
+        save (bool): 是否把活动记录保存到output目录
+        output_format (str): 保存活动记录的文件格式，见utils.activity_writer.OUTPUT_FORMATS
+        llm (MapReduceSummarizer, optional): 大模型总结器，不提供时生成模拟的总结
+        idle_gap (int): 划分工作时段的空闲间隔（秒）
     
     Returns:
         dict: 包含总结和分类的字典
@@ -22,42 +32,106 @@ def summarize_activities(activities):
     if not activities:
         return {"summary": "没有找到活动记录。", "categories": []}
     
-    # 将活动转换为可序列化的格式
-    activity_records = []
-    for activity in activities:
-        record = {
-            "timestamp": activity.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-            "type": activity.activity_type.value,
-            "content": activity.content,
-            "source": activity.source
-        }
-        
-        if activity.title:
-            record["title"] = activity.title
-            
-        activity_records.append(record)
+    # 保存活动记录以便调试，记录逐条写出，不再先转换为完整的字典列表
+    output_file = save_activities(activities, output_format) if save else None
     
-    # 保存活动记录为JSON以便调试
-    output_file = save_activities_to_json(activity_records)
+    # 统计信息总是在本地计算，提供了大模型时由大模型生成总结和分类
+    summary = generate_mock_summary(activities, idle_gap)
+    if llm is not None:
+        summary.update(call_llm_api_for_summary(activities, llm, summary))
     
-    # TODO: 在这里集成实际的大模型API
-    # 调用示例:
-    # summary = call_llm_api_for_summary(activity_records)
+    # 将输出文件路径添加到结果中
+    if output_file:
+        summary["output_file"] = output_file
     
-    # 目前返回一个简单的总结
-    summary = generate_mock_summary(activities)
+    return summary
+
+def summarize_activity_range(daily_activities, output_format=DEFAULT_OUTPUT_FORMAT, llm=None, idle_gap=DEFAULT_IDLE_GAP):
+    """
+    总结多天的活动记录
     
-    # 将输出文件路径添加到结果中
-    summary["output_file"] = output_file
+    每天的记录只统计一次，整个范围的统计由每天的统计合并得到，保存活动记录时再
+    逐条写出一次，不会把整个范围复制到一个列表中。提供了大模型时，所有天的分块在
+    同一个事件循环中并发总结，整个范围的总结由每天的总结合并得到，不再重新发送
+    全部活动记录。
     
+    Args:
+        daily_activities (dict): date到当天活动列表（已按时间排序）的映射
+        output_format (str): 保存活动记录的文件格式
+        llm (MapReduceSummarizer, optional): 大模型总结器
+        idle_gap (int): 划分工作时段的空闲间隔（秒）
+    
+    Returns:
+        dict: {"days": 日期字符串到当天总结的映射, "combined": 整个范围的总结}
+    """
+    days = {}
+    combined_statistics = ActivityStatistics(idle_gap)
+    for day in sorted(daily_activities):
+        activities = daily_activities[day]
+        if not activities:
+            days[day.strftime("%Y-%m-%d")] = {"summary": "没有找到活动记录。", "categories": []}
+            continue
+        statistics = collect_statistics(activities, idle_gap)
+        days[day.strftime("%Y-%m-%d")] = build_mock_summary(statistics_result(statistics))
+        with span("statistics.merge", rows=statistics.total):
+            combined_statistics.merge(statistics)
+    
+    if combined_statistics.total:
+        combined = build_mock_summary(statistics_result(combined_statistics))
+        # 只为整个范围保存一份记录，按天依次写出
+        combined["output_file"] = save_activities(
+            chain.from_iterable(daily_activities[day] for day in sorted(daily_activities)), output_format)
+    else:
+        combined = {"summary": "没有找到活动记录。", "categories": []}
+    
+    if llm is not None:
+        llm_days = [(day.strftime("%Y-%m-%d"), daily_activities[day])
+                    for day in sorted(daily_activities) if daily_activities[day]]
+        try:
+            with span("llm.summarize", days=len(llm_days)):
+                results = llm.summarize_many([activities for _, activities in llm_days],
+                                             [create_overview(days[day_str]) for day_str, _ in llm_days])
+            for (day_str, _), result in zip(llm_days, results):
+                if result is not None:
+                    days[day_str].update(result)
+            if llm_days:
+                with span("llm.combine", days=len(llm_days)):
+                    combined.update(llm.combine([(day_str, days[day_str]["summary"]) for day_str, _ in llm_days],
+                                                create_overview(combined)))
+        except Exception as e:
+            print(f"调用大模型API时出错: {str(e)}")
+    
+    return {
+        "days": days,
+        "combined": combined
+    }
+
+def summarize_activity_stream(activities, idle_gap=DEFAULT_IDLE_GAP):
+    """
+    总结一个活动记录流，只遍历一次，不保存活动记录对象
+    
+    用于重新分析已保存的活动记录文件，因此不会再次保存活动记录。划分工作时段时每条
+    记录只保留13字节的列式数据。
+    
+    Args:
+        activities (iterable): 活动记录，可以是生成器
+        idle_gap (int): 划分工作时段的空闲间隔（秒）
+    
+    Returns:
+        dict: 包含总结和分类的字典
+    """
+    summary = generate_mock_summary(activities, idle_gap)
+    if not summary["stats"]:
+        return {"summary": "没有找到活动记录。", "categories": []}
     return summary
 
-def save_activities_to_json(activity_records):
+def save_activities(activities, output_format=DEFAULT_OUTPUT_FORMAT):
     """
-    保存活动记录为JSON文件，便于调试
+    把活动记录流式保存到output目录，便于调试和之后重新分析
     
     Args:
-        activity_records (list): 活动记录列表
+        activities (iterable): 活动记录
+        output_format (str): 文件格式，json为缩进的JSON数组，ndjson为每行一条记录（可压缩）
         
     Returns:
         str: 保存的文件路径
@@ -65,107 +139,55 @@ def save_activities_to_json(activity_records):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_dir = "output"
     
-    # 确保输出目录存在
-    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, f"activities_{timestamp}{OUTPUT_FORMATS[output_format]}")
     
-    output_file = os.path.join(output_dir, f"activities_{timestamp}.json")
-    
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(activity_records, f, ensure_ascii=False, indent=2)
+    write_activities(activities, output_file, output_format)
     
     print(f"活动记录已保存到 {output_file}")
     return output_file
 
-def call_llm_api_for_summary(activity_records):
+def call_llm_api_for_summary(activities, llm, statistics=None):
     """
     调用大语言模型API进行分析和总结
     
     Args:
-        activity_records (list): 活动记录列表
+        activities (iterable): 按时间排序的活动记录
+        llm (MapReduceSummarizer): 分块并发的大模型总结器
+        statistics (dict, optional): 已经算好的本地统计（generate_mock_summary的结果），作为概况附在提示词中
         
     Returns:
-        dict: 包含总结和分类的字典
+        dict: 大模型生成的summary和categories；调用失败时返回空字典，保留本地生成的模拟总结
     """
-    # 这里是示例代码，展示如何调用大模型API
-    # 实际使用时需要替换为真实的API调用
-    
     try:
-        # 构建提示词
-        prompt = create_llm_prompt(activity_records)
-        
-        # API调用示例 (需要替换为实际的API)
-        # response = openai.ChatCompletion.create(
-        #     model="gpt-4",
-        #     messages=[
-        #         {"role": "system", "content": "你是一个专业的数据分析师，擅长总结用户的电脑使用行为。"},
-        #         {"role": "user", "content": prompt}
-        #     ],
-        #     temperature=0.7,
-        # )
-        # 
-        # summary_text = response.choices[0].message['content']
-        
-        # 这里应该解析API返回的结果
-        # 将文本格式的总结转换为结构化数据
-        # return parse_llm_response(summary_text)
-        
-        # 目前返回一个模拟的结果
-        return generate_mock_summary(activity_records)
-        
+        overview = create_overview(statistics) if statistics else None
+        with span("llm.summarize"):
+            return llm.summarize(activities, overview=overview) or {}
     except Exception as e:
         print(f"调用大模型API时出错: {str(e)}")
-        # 如果API调用失败，返回一个简单的总结
-        return generate_mock_summary(activity_records)
-
-def create_llm_prompt(activity_records):
-    """创建发送给大模型的提示词"""
-    # 计算活动的基本统计信息
-    activities_by_type = {}
-    for record in activity_records:
-        activity_type = record["type"]
-        activities_by_type[activity_type] = activities_by_type.get(activity_type, 0) + 1
-    
-    # 构建提示词
-    prompt = f"""我有一天的电脑活动记录，包含以下内容：
-- {activities_by_type.get('terminal', 0)} 条终端命令
-- {activities_by_type.get('safari', 0)} 条Safari浏览记录
-- {activities_by_type.get('chrome', 0)} 条Chrome浏览记录
-
-以下是部分活动记录（按时间顺序）：
+        return {}
 
-"""
-    
-    # 添加一些示例活动记录
-    max_samples = min(10, len(activity_records))
-    for i in range(max_samples):
-        record = activity_records[i]
-        timestamp = record["timestamp"]
-        activity_type = record["type"]
-        content = record["content"]
-        title = record.get("title", "")
-        
-        if activity_type in ["safari", "chrome"] and title:
-            prompt += f"{timestamp} [{activity_type}] {title} - {content[:100]}...\n"
-        else:
-            prompt += f"{timestamp} [{activity_type}] {content[:100]}...\n"
-    
-    prompt += f"\n请分析这些活动记录，并提供以下内容：\n"
-    prompt += f"1. 一段总结，描述我这一天的主要活动和使用电脑的目的\n"
-    prompt += f"2. 将活动分类为不同的主题或项目\n"
-    prompt += f"3. 识别我花费最多时间的活动类型\n"
-    prompt += f"4. 提出改进我工作效率的建议\n"
+def generate_mock_summary(activities, idle_gap=DEFAULT_IDLE_GAP):
+    """
+    生成模拟的总结（未来会替换为大模型调用）
     
-    return prompt
+    所有统计在analysis.statistics中一次遍历得到，可以传入生成器；传入ActivityBatch时
+    使用批量的实现。结果中的统计也用于大模型的提示词和输出，不再重新遍历记录。
+    """
+    return build_mock_summary(compute_statistics(activities, idle_gap))
 
-def generate_mock_summary(activities):
-    """生成模拟的总结（未来会替换为大模型调用）"""
-    total_count = len(activities)
+def build_mock_summary(statistics):
+    """
+    由统计结果生成模拟的总结
     
-    # 计算各类型活动的数量
-    type_counts = {}
-    for activity in activities:
-        activity_type = activity.activity_type.value
-        type_counts[activity_type] = type_counts.get(activity_type, 0) + 1
+    Args:
+        statistics (dict): analysis.statistics的统计结果
+    
+    Returns:
+        dict: 包含总结、分类和统计的字典
+    """
+    type_counts = statistics["counts"]
+    total_count = statistics["total"]
+    first_epoch, last_epoch = statistics["first_epoch"], statistics["last_epoch"]
     
     # 模拟生成分类标签
     categories = []
@@ -173,19 +195,24 @@ def generate_mock_summary(activities):
     if type_counts.get("terminal", 0) > 0:
         categories.append("命令行操作")
     
-    if type_counts.get("safari", 0) > 0 or type_counts.get("chrome", 0) > 0:
+    if type_counts.get("safari", 0) > 0 or type_counts.get("chrome", 0) > 0 or type_counts.get("firefox", 0) > 0:
         categories.append("网页浏览")
     
-    # 生成时间范围
-    if activities:
-        start_time = min(activities, key=lambda x: x.timestamp).timestamp
-        end_time = max(activities, key=lambda x: x.timestamp).timestamp
-        time_range = f"{start_time.strftime('%H:%M')} - {end_time.strftime('%H:%M')}"
+    # 生成时间范围，活动跨越多天时带上日期，并且不再称为"今天"
+    period = "今天"
+    if total_count:
+        start_time = datetime.fromtimestamp(first_epoch)
+        end_time = datetime.fromtimestamp(last_epoch)
+        if start_time.date() == end_time.date():
+            time_range = f"{start_time.strftime('%H:%M')} - {end_time.strftime('%H:%M')}"
+        else:
+            time_range = f"{start_time.strftime('%Y-%m-%d %H:%M')} - {end_time.strftime('%Y-%m-%d %H:%M')}"
+            period = "该时间段"
     else:
         time_range = "无数据"
     
     # 生成摘要文本
-    summary = f"今天总共记录了{total_count}个活动，活动时间范围：{time_range}。"
+    summary = f"{period}总共记录了{total_count}个活动，活动时间范围：{time_range}。"
     
     for activity_type, count in type_counts.items():
         if activity_type == "terminal":
@@ -194,6 +221,8 @@ def generate_mock_summary(activities):
             summary += f"在Safari浏览器中访问了{count}个网页，"
         elif activity_type == "chrome":
             summary += f"在Chrome浏览器中访问了{count}个网页，"
+        elif activity_type == "firefox":
+            summary += f"在Firefox浏览器中访问了{count}个网页，"
     
     # 移除最后的逗号和空格
     summary = summary.rstrip(", ") + "。"
@@ -205,7 +234,13 @@ def generate_mock_summary(activities):
         "summary": summary,
         "categories": categories,
         "stats": type_counts,
-        "time_range": time_range
+        "time_range": time_range,
+        "hourly": statistics["hourly"],
+        "top_commands": statistics["top_commands"],
+        "top_domains": statistics["top_domains"],
+        "distinct": statistics["distinct"],
+        "sessions": statistics["sessions"],
+        "time": statistics["time"]
     }
 
 def test_summarizer():
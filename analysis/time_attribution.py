@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import posixpath
+
+from analysis.sessions import url_domain, ACTIVE_GAP_CAP
+from utils.models import ActivityType
+
+# 没有真实时长时，一条记录最多计入到下一条记录之前的这么多秒
+GAP_CAP = ACTIVE_GAP_CAP
+
+# 真实时长的上限：长时间运行的命令（开发服务器、ssh）和后台标签页的停留时间不会全部计入
+DURATION_CAPS = {
+    ActivityType.TERMINAL: 2 * 3600,
+}
+DEFAULT_DURATION_CAP = 30 * 60
+
+# 每一类时间去向最多保留的条目数量
+TOP_ATTRIBUTIONS = 10
+
+# 路径的前两段是"所有者/仓库"的代码托管网站
+CODE_HOSTS = frozenset({"github.com", "gitlab.com", "bitbucket.org", "gitee.com"})
+
+# 代码托管网站上不是"所有者"的第一段路径
+CODE_HOST_RESERVED = frozenset({"settings", "orgs", "notifications", "marketplace", "explore", "topics",
+                                "sponsors", "login", "search", "pulls", "issues", "dashboard", "users", "groups"})
+
+# 命令前面可以跳过的前缀
+COMMAND_PREFIXES = frozenset({"sudo", "time", "nohup", "exec", "command", "env"})
+
+
+def command_name(command):
+    """命令的程序名：跳过环境变量赋值和sudo等前缀，取第一个词"""
+    for token in command.split():
+        if "=" in token and not token.startswith("="):
+            continue
+        if token in COMMAND_PREFIXES:
+            continue
+        return token
+    return None
+
+
+def cd_project(command):
+    """
+    从cd命令中得到项目名称（目标目录的最后一级）
+
+    Returns:
+        str: 项目名称；不是cd命令时返回False，回到主目录或无法确定目录时返回None
+    """
+    tokens = command.split()
+    if not tokens or tokens[0] not in ("cd", "pushd", "z"):
+        return False
+    if len(tokens) < 2 or tokens[1] in ("~", "-", "..", "/"):
+        return None
+    name = posixpath.basename(tokens[1].rstrip("/"))
+    return name if name not in ("", ".", "..", "~") else None
+
+
+def url_project(url, domain):
+    """代码托管网站上仓库页面对应的项目名称（仓库名），其他网页返回None"""
+    if domain not in CODE_HOSTS:
+        return None
+    path = url.split("://", 1)[1].split("/", 1)[1] if url.count("/") >= 3 else ""
+    segments = [segment for segment in path.split("?", 1)[0].split("#", 1)[0].split("/") if segment]
+    if len(segments) < 2 or segments[0] in CODE_HOST_RESERVED:
+        return None
+    return segments[1]
+
+
+def real_duration(activity_type, metadata):
+    """
+    记录中的真实时长（秒），没有时返回None
+
+    zsh的EXTENDED_HISTORY以整数秒记录命令的运行时间（0表示不到1秒，视为没有），
+    Chrome的访问记录带有停留时间visit_duration。
+    """
+    if not metadata:
+        return None
+    duration = metadata.get("duration")
+    if duration is None:
+        duration = metadata.get("visit_duration")
+    try:
+        duration = float(duration) if duration is not None else 0
+    except (TypeError, ValueError):
+        return None
+    if duration <= 0:
+        return None
+    return min(duration, DURATION_CAPS.get(activity_type, DEFAULT_DURATION_CAP))
+
+
+class TimeAttributor:
+    """
+    把时间分配给活动类型、命令、域名和项目
+
+    每条记录对应一个时间区间：有真实时长时从记录时间开始持续这么久，否则持续到下一条
+    记录，最多GAP_CAP秒。区间重叠时每一刻只计入最近开始、仍在进行中的那条记录（例如
+    长时间运行的命令期间打开的网页），因此总时间不会重复计算。
+
+    区间按开始时间依次压栈，栈顶是当前计时的记录，结束的区间出栈后时间回到下面仍在
+    进行的区间。每个区间只入栈、出栈一次，整体是线性时间；输入可以是生成器，只需要
+    向前看一条记录。
+    """
+
+    def __init__(self, gap_cap=GAP_CAP):
+        self.gap_cap = gap_cap
+        # (类型, 命令, 域名, 项目)到秒数的映射，结束时再按各个维度汇总
+        self._credits = {}
+        self._stack = []
+        self._pending = None
+        self._cursor = None
+        self._project = None
+
+    def add(self, activity):
+        """按时间顺序加入一条活动记录"""
+        command = domain = None
+        if activity.activity_type == ActivityType.TERMINAL:
+            command = command_name(activity.content or "")
+        else:
+            domain = url_domain(activity.content or "")
+        self.add_record(activity.epoch, activity.activity_type, activity.content, activity.metadata, command, domain)
+
+    def add_record(self, epoch, activity_type, content, metadata, command, domain):
+        """
+        加入一条已经解析出命令名（终端命令）或域名（浏览记录）的记录
+
+        不需要Activity对象，可以直接使用ActivityBatch的各列。
+        """
+        if self._cursor is not None and epoch < self._cursor:
+            # 乱序的记录从当前时间开始计算
+            epoch = self._cursor
+        if self._pending is not None:
+            self._push(epoch)
+        self._advance(epoch)
+        self._pending = (epoch, activity_type, content, metadata, command, domain)
+
+    def feed(self, activities):
+        """加入活动记录的同时原样产出，可以接在其他单遍处理的前面"""
+        for activity in activities:
+            self.add(activity)
+            yield activity
+
+    def finish(self):
+        """
+        结束计时，最后一条记录按没有下一条记录处理
+
+        Returns:
+            dict: 时间去向，见as_dict
+        """
+        if self._pending is not None:
+            self._push(None)
+            self._advance(float("inf"))
+        return self.as_dict()
+
+    def merge(self, other):
+        """
+        加入另一段时间线的时间去向
+
+        两段各自结束计时后按秒数相加：每段最后一条记录按没有下一条记录处理，跨过分段
+        的区间不会和下一段的记录抵消，因此合并的总时间等于各段之和。
+
+        Args:
+            other (TimeAttributor): 另一段时间线的计时
+        """
+        self.finish()
+        other.finish()
+        credits = self._credits
+        for keys, seconds in other._credits.items():
+            credits[keys] = credits.get(keys, 0) + seconds
+
+    def _push(self, next_epoch):
+        start, activity_type, content, metadata, command, domain = self._pending
+        self._pending = None
+        duration = real_duration(activity_type, metadata)
+        if duration is None:
+            duration = self.gap_cap if next_epoch is None else min(next_epoch - start, self.gap_cap)
+        if duration > 0:
+            self._stack.append((start + duration, self._keys(activity_type, content or "", command, domain)))
+
+    def _keys(self, activity_type, content, command, domain):
+        """记录的(类型, 命令, 域名, 项目)，项目按时间线上最近的cd命令确定"""
+        project = None
+        if activity_type == ActivityType.TERMINAL:
+            target = cd_project(content)
+            if target is not False:
+                self._project = target
+            project = self._project
+        elif domain is not None:
+            project = url_project(content, domain)
+        return activity_type.value, command, domain, project
+
+    def _advance(self, until):
+        """把当前时间到until之间的时间计入栈顶仍在进行的区间"""
+        if self._cursor is None:
+            self._cursor = until
+            return
+        stack = self._stack
+        credits = self._credits
+        cursor = self._cursor
+        while stack and cursor < until:
+            end, keys = stack[-1]
+            if end <= cursor:
+                stack.pop()
+                continue
+            segment_end = min(end, until)
+            credits[keys] = credits.get(keys, 0) + (segment_end - cursor)
+            cursor = segment_end
+            if end <= until:
+                stack.pop()
+        self._cursor = max(cursor, until)
+
+    def as_dict(self, top=TOP_ATTRIBUTIONS):
+        """
+        时间去向的统计
+
+        Returns:
+            dict: total_seconds为总时间；by_type为各活动类型的秒数；commands、domains、projects
+                  为按时间从多到少排列的[名称, 秒数]列表，各自最多top条
+        """
+        totals = ({}, {}, {}, {})
+        for keys, seconds in self._credits.items():
+            for key, seconds_by_key in zip(keys, totals):
+                if key is not None:
+                    seconds_by_key[key] = seconds_by_key.get(key, 0) + seconds
+        by_type, commands, domains, projects = totals
+
+        def ranked(seconds_by_key):
+            items = sorted(seconds_by_key.items(), key=lambda item: (-item[1], item[0]))[:top]
+            return [[key, int(round(seconds))] for key, seconds in items]
+
+        return {
+            "total_seconds": int(round(sum(self._credits.values()))),
+            "by_type": {key: int(round(seconds)) for key, seconds in by_type.items()},
+            "commands": ranked(commands),
+            "domains": ranked(domains),
+            "projects": ranked(projects),
+        }
+
+
+def attribute_time(activities, gap_cap=GAP_CAP):
+    """
+    计算一组按时间排序的活动记录的时间去向
+
+    Args:
+        activities (iterable): 按时间排序的活动记录，可以是生成器
+        gap_cap (int): 没有真实时长时最多计入的秒数
+
+    Returns:
+        dict: 时间去向，见TimeAttributor.as_dict
+    """
+    attributor = TimeAttributor(gap_cap)
+    for activity in activities:
+        attributor.add(activity)
+    return attributor.finish()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+活动记录内存占用基准测试
+
+对比原来的dataclass实现（每条记录有__dict__、完整的datetime和新建的元数据字典）、
+使用__slots__的Activity，以及按列存储的ActivityBatch，每条记录占用的内存。
+命令和URL字符串在测量之前创建，各种实现共享，只统计记录本身的开销。在项目根目录运行：
+
+    python -m benchmarks.bench_activity_memory --records 1000000
+"""
+
+import argparse
+import gc
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from utils.models import Activity, ActivityBatch, ActivityType
+
+
+@dataclass
+class LegacyActivity:
+    """原来的活动记录类"""
+    timestamp: datetime
+    activity_type: ActivityType
+    content: str
+    source: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    title: Optional[str] = None
+
+
+def build_legacy(epochs, contents):
+    # 与原来的zsh解析器相同：每条记录一个datetime和一个元数据字典
+    return [LegacyActivity(datetime.fromtimestamp(epoch), ActivityType.TERMINAL, content, "zsh_history",
+                           {'duration': 0})
+            for epoch, content in zip(epochs, contents)]
+
+
+def build_legacy_empty(epochs, contents):
+    # 与原来的Safari解析器相同：没有元数据时也会创建一个空字典
+    return [LegacyActivity(datetime.fromtimestamp(epoch), ActivityType.SAFARI, content, "safari_history")
+            for epoch, content in zip(epochs, contents)]
+
+
+def build_slotted(epochs, contents):
+    return [Activity(epoch, ActivityType.TERMINAL, content, "zsh_history") for epoch, content in zip(epochs, contents)]
+
+
+def build_batch(epochs, contents):
+    batch = ActivityBatch()
+    for epoch, content in zip(epochs, contents):
+        batch.append(epoch, ActivityType.TERMINAL, content, "zsh_history")
+    return batch
+
+
+def measure(name, build, epochs, contents):
+    """测量构造结果保留的内存，打印每条记录的字节数"""
+    gc.collect()
+    tracemalloc.start()
+    result = build(epochs, contents)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_record = current / len(epochs)
+    print(f"  {name:<28} {current / 1024 / 1024:8.1f} MB  {per_record:7.1f} 字节/条")
+    del result
+    return per_record
+
+
+def main():
+    parser = argparse.ArgumentParser(description='活动记录内存占用基准测试')
+    parser.add_argument('--records', type=int, default=1000000, help='记录数量')
+    args = parser.parse_args()
+
+    first = int(datetime(2024, 1, 1).timestamp())
+    epochs = [first + i * 7 for i in range(args.records)]
+    contents = [f"git commit -m 'change {i}'" for i in range(args.records)]
+
+    print(f"{args.records} 条记录（不含命令字符串本身）:")
+    legacy = measure("dataclass + 元数据字典", build_legacy, epochs, contents)
+    measure("dataclass + 空元数据字典", build_legacy_empty, epochs, contents)
+    slotted = measure("__slots__ Activity", build_slotted, epochs, contents)
+    batch = measure("ActivityBatch", build_batch, epochs, contents)
+    print(f"\n__slots__ Activity 节省 {1 - slotted / legacy:.0%}，ActivityBatch 节省 {1 - batch / legacy:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+浏览器历史时间范围查询基准测试
+
+在合成的Chrome和Safari数据库上对比原来在SQL中调用datetime()并在Python中
+strptime的查询，与直接比较原始时间列的查询。在项目根目录运行：
+
+    python -m benchmarks.bench_browser_queries --visits 1000000
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.fixtures import build_chrome_history, build_safari_history
+from parsers.chrome_parser import URL_LEVEL_QUERY, datetime_to_chrome_time, chrome_time_to_datetime
+from parsers.safari_parser import VISIT_RANGE_QUERY, datetime_to_safari_time, safari_time_to_datetime
+
+LEGACY_CHROME_QUERY = """
+SELECT datetime((last_visit_time/1000000)-11644473600, 'unixepoch', 'localtime') as visit_date, url, title
+FROM urls
+WHERE datetime((last_visit_time/1000000)-11644473600, 'unixepoch', 'localtime') BETWEEN ? AND ?
+ORDER BY last_visit_time DESC
+"""
+
+LEGACY_SAFARI_QUERY = """
+SELECT datetime(visit_time + 978307200, 'unixepoch', 'localtime') as visit_date, url, title
+FROM history_visits
+INNER JOIN history_items ON history_items.id = history_visits.history_item
+WHERE visit_date BETWEEN ? AND ?
+ORDER BY visit_time DESC
+"""
+
+
+def run_legacy(conn, query, start, end):
+    """原来的实现：SQL中按行转换时间字符串，Python中再strptime"""
+    rows = conn.execute(query, (start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S"))).fetchall()
+    return [datetime.strptime(visit_date, "%Y-%m-%d %H:%M:%S") for visit_date, _, _ in rows]
+
+
+def run_raw(conn, query, params, convert):
+    """解析器中的查询：比较原始时间列，在Python中一次转换"""
+    rows = conn.execute(query, params).fetchall()
+    return [convert(visit_time) for visit_time, _, _ in rows]
+
+
+def measure(name, func, repeat):
+    """多次运行func，打印最短耗时"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(func())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {name:<12} {count:>8} 条  {best * 1000:10.2f} 毫秒")
+    return best
+
+
+def print_plan(conn, query, params):
+    """打印查询计划，确认是否使用了索引"""
+    for row in conn.execute("EXPLAIN QUERY PLAN " + query, params):
+        print(f"    {row[-1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='浏览器历史时间范围查询基准测试')
+    parser.add_argument('--visits', type=int, default=1000000, help='每个数据库生成的访问记录数量')
+    parser.add_argument('--repeat', type=int, default=3, help='每个查询运行的次数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        chrome_path = os.path.join(temp_dir, "History")
+        safari_path = os.path.join(temp_dir, "History.db")
+        print(f"正在生成 {args.visits} 条访问记录的测试数据库...")
+        build_chrome_history(chrome_path, args.visits)
+        build_safari_history(safari_path, args.visits)
+
+        start = datetime(2024, 7, 1)
+        end = start + timedelta(days=1) - timedelta(seconds=1)
+        print(f"查询日期: {start.strftime('%Y-%m-%d')}\n")
+
+        conn = sqlite3.connect(chrome_path)
+        low, high = datetime_to_chrome_time(start), datetime_to_chrome_time(end + timedelta(seconds=1))
+        params = (low, high, low, high)
+        print("Chrome (urls.last_visit_time):")
+        legacy = measure("旧查询", lambda: run_legacy(conn, LEGACY_CHROME_QUERY, start, end), args.repeat)
+        raw = measure("原始时间", lambda: run_raw(conn, URL_LEVEL_QUERY, params, chrome_time_to_datetime), args.repeat)
+        print(f"  加速比: {legacy / raw:.1f}x")
+        print_plan(conn, URL_LEVEL_QUERY, params)
+        conn.close()
+
+        conn = sqlite3.connect(safari_path)
+        low, high = datetime_to_safari_time(start), datetime_to_safari_time(end + timedelta(seconds=1))
+        print("\nSafari (history_visits.visit_time):")
+        legacy = measure("旧查询", lambda: run_legacy(conn, LEGACY_SAFARI_QUERY, start, end), args.repeat)
+        params = (low, high)
+        raw = measure("原始时间", lambda: run_raw(conn, VISIT_RANGE_QUERY, params, safari_time_to_datetime), args.repeat)
+        print(f"  加速比: {legacy / raw:.1f}x")
+        print_plan(conn, VISIT_RANGE_QUERY, params)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
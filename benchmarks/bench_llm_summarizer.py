@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分块并发大模型总结的基准测试
+
+在本地模拟服务上用不同的并发上限总结同一天的合成活动记录，对比总耗时和吞吐量。
+在项目根目录运行：
+
+    python -m benchmarks.bench_llm_summarizer --records 20000 --latency 0.2
+"""
+
+import argparse
+import random
+from datetime import datetime
+
+from analysis.llm_summarizer import MapReduceSummarizer, OpenAICompatibleBackend
+from benchmarks.fixtures import SAMPLE_DOMAINS
+from benchmarks.llm_stub_server import start_stub_server
+from utils.models import Activity, ActivityType
+
+SAMPLE_COMMANDS = ["git status", "ls -la", "python main.py", "vim README.md", "git diff", "pytest -q", "cd src"]
+
+
+def generate_day(record_count, day=datetime(2024, 7, 1), seed=0, repeat_ratio=0.3):
+    """
+    生成一天内按时间排序的合成活动记录
+
+    repeat_ratio比例的记录重复上一条记录（例如反复执行git status或刷新页面）。
+    """
+    rng = random.Random(seed)
+    start = int(day.timestamp()) + 8 * 3600
+    epochs = sorted(start + rng.randrange(14 * 3600) for _ in range(record_count))
+    activities = []
+    for index, epoch in enumerate(epochs):
+        if activities and rng.random() < repeat_ratio:
+            previous = activities[-1]
+            activities.append(Activity(epoch, previous.activity_type, previous.content, previous.source,
+                                       title=previous.title))
+        elif rng.random() < 0.5:
+            activities.append(Activity(epoch, ActivityType.TERMINAL, rng.choice(SAMPLE_COMMANDS), "zsh_history"))
+        else:
+            domain = rng.choice(SAMPLE_DOMAINS)
+            activities.append(Activity(epoch, ActivityType.CHROME, f"https://{domain}/page/{index}",
+                                       "chrome_history_Default", title=f"{domain} 页面 {index}"))
+    return activities
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分块并发大模型总结的基准测试')
+    parser.add_argument('--records', type=int, default=20000, help='活动记录数量')
+    parser.add_argument('--latency', type=float, default=0.2, help='模拟服务每个请求的延迟秒数')
+    parser.add_argument('--chunk-tokens', type=int, default=3000, help='每个分块的token预算')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16], help='要对比的并发上限')
+    parser.add_argument('--no-compaction', action='store_true', help='不压缩时间线，原样发送活动记录')
+    args = parser.parse_args()
+
+    activities = generate_day(args.records)
+    server = start_stub_server(latency=args.latency)
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    print(f"{args.records} 条记录，每个请求延迟 {args.latency} 秒，分块预算 {args.chunk_tokens} tokens\n")
+
+    try:
+        for concurrency in args.concurrency:
+            summarizer = MapReduceSummarizer(OpenAICompatibleBackend(url, "stub", max_workers=concurrency),
+                                             chunk_tokens=args.chunk_tokens, concurrency=concurrency,
+                                             compact=not args.no_compaction)
+            result = summarizer.summarize(activities)
+            stats = result["llm"]
+            line = (f"  并发 {concurrency:>3}: {stats['chunks']:>4} 个分块  {stats['requests']:>4} 次请求  "
+                    f"{stats['elapsed']:7.2f} 秒  {args.records / stats['elapsed']:9.0f} 条/秒")
+            if "compaction" in stats:
+                line += f"  压缩比 {stats['compaction']['ratio']}"
+            print(line)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工作时段划分的基准测试
+
+生成一年的合成时间线（默认约300万条记录），分别用NumPy和纯Python的实现划分工作时段，
+检查两者结果一致并对比耗时。在项目根目录运行：
+
+    python -m benchmarks.bench_sessions --days 365 --per-day 8000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime
+
+from analysis import sessions
+from analysis.sessions import TimelineColumns, sessionize
+from benchmarks.fixtures import SAMPLE_DOMAINS
+from utils.models import ACTIVITY_TYPE_CODES, ActivityType
+
+
+def generate_columns(days, per_day, start=datetime(2024, 1, 1), seed=0):
+    """直接生成列式时间线：每天几段连续的工作，每段内记录间隔较短"""
+    rng = random.Random(seed)
+    columns = TimelineColumns()
+    columns.domains = list(SAMPLE_DOMAINS)
+    terminal = ACTIVITY_TYPE_CODES[ActivityType.TERMINAL]
+    chrome = ACTIVITY_TYPE_CODES[ActivityType.CHROME]
+    day_start = int(start.timestamp())
+    for _ in range(days):
+        epoch = day_start + 8 * 3600
+        for _ in range(per_day):
+            # 大多数间隔很短，偶尔离开一段时间
+            epoch += rng.randrange(1, 15) if rng.random() < 0.999 else rng.randrange(1800, 7200)
+            columns.epochs.append(epoch)
+            if rng.random() < 0.5:
+                columns.type_codes.append(terminal)
+                columns.domain_codes.append(-1)
+            else:
+                columns.type_codes.append(chrome)
+                columns.domain_codes.append(rng.randrange(len(SAMPLE_DOMAINS)))
+        day_start += 86400
+    return columns
+
+
+def main():
+    parser = argparse.ArgumentParser(description='工作时段划分的基准测试')
+    parser.add_argument('--days', type=int, default=365, help='天数')
+    parser.add_argument('--per-day', type=int, default=8000, help='每天的记录数量')
+    args = parser.parse_args()
+
+    columns = generate_columns(args.days, args.per_day)
+    print(f"{len(columns)} 条记录\n")
+
+    results = {}
+    backends = [("NumPy", sessions.np), ("纯Python", None)] if sessions.np is not None else [("纯Python", None)]
+    for name, backend in backends:
+        saved, sessions.np = sessions.np, backend
+        try:
+            started = time.perf_counter()
+            results[name] = sessionize(columns)
+            elapsed = time.perf_counter() - started
+        finally:
+            sessions.np = saved
+        print(f"  {name:<8} {len(results[name]):>6} 个时段  {elapsed:7.3f} 秒  {len(columns) / elapsed:12.0f} 条/秒")
+
+    if len(results) == 2:
+        print(f"\n结果一致: {results['NumPy'] == results['纯Python']}")
+
+
+if __name__ == "__main__":
+    main()
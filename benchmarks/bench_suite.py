@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+解析器和分析流程的基准测试套件
+
+按给定的规模生成合成数据：EXTENDED_HISTORY格式的zsh历史文件、bash和fish的历史文件，
+以及与真实结构一致的Chrome History、Firefox places.sqlite和Safari History.db数据库，
+然后依次测量zsh、bash、fish、Safari、Chrome、Firefox的解析、归并和总结各阶段的耗时、
+吞吐量和峰值内存，结果写入JSON文件。指定基准结果时逐项对比，耗时或峰值内存超过
+阈值的阶段视为性能退化，以非零状态退出。在项目根目录运行：
+
+    python -m benchmarks.bench_suite --sizes 10000,100000 --output bench.json
+    python -m benchmarks.bench_suite --sizes 10000,100000 --baseline bench.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from itertools import chain
+
+from analysis import sessions
+from analysis.summarizer import summarize_activities
+from benchmarks.fixtures import (build_chrome_history, build_firefox_history, build_safari_history,
+                                 generate_bash_history, generate_fish_history, generate_history)
+from parsers.bash_history_parser import parse_bash_history_range
+from parsers.chrome_parser import parse_chrome_history_range
+from parsers.firefox_parser import parse_firefox_history_range
+from parsers.fish_history_parser import parse_fish_history_range
+from parsers.safari_parser import parse_safari_history_range
+from parsers.zsh_history_parser import parse_zsh_history_range
+from utils.time_merger import merge_activities
+
+# 默认的数据规模（每个数据源的记录数量）
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+# 耗时或峰值内存比基准多出这个比例视为退化
+DEFAULT_THRESHOLD = 0.2
+
+# 合成数据的第一天
+FIXTURE_START = datetime(2024, 1, 1)
+
+# 合成的zsh历史中相邻记录的平均间隔（秒），用于估计数据覆盖的天数
+AVERAGE_COMMAND_GAP = 45
+
+# 结果文件的格式版本
+RESULTS_VERSION = 1
+
+
+def fixture_days(size):
+    """一种规模的合成数据覆盖的天数"""
+    return size * AVERAGE_COMMAND_GAP // 86400 + 1
+
+
+def prepare_fixtures(directory, size, seed=0):
+    """
+    生成一种规模的测试数据，已经存在的文件直接复用
+
+    Returns:
+        dict: zsh、bash、fish为历史文件路径，bash_mixed为末尾有没有时间戳的行的bash历史文件，
+              chrome为Chrome用户数据目录，firefox为Firefox配置文件目录，safari为数据库路径
+    """
+    days = fixture_days(size)
+    zsh_path = os.path.join(directory, f"zsh_history_{size}_{seed}")
+    bash_path = os.path.join(directory, f"bash_history_{size}_{seed}")
+    bash_mixed_path = os.path.join(directory, f"bash_history_mixed_{size}_{seed}")
+    fish_path = os.path.join(directory, f"fish_history_{size}_{seed}")
+    chrome_dir = os.path.join(directory, f"chrome_{size}_{seed}")
+    chrome_path = os.path.join(chrome_dir, "Default", "History")
+    firefox_dir = os.path.join(directory, f"firefox_{size}_{seed}")
+    safari_path = os.path.join(directory, f"safari_{size}_{seed}.db")
+
+    if not os.path.exists(zsh_path):
+        generate_history(zsh_path, size, FIXTURE_START, seed)
+    if not os.path.exists(bash_path):
+        generate_bash_history(bash_path, size, FIXTURE_START, seed)
+    if not os.path.exists(bash_mixed_path):
+        # 末尾没有时间戳的行是带时间戳记录的10倍，记录数量和峰值内存都不应随之增长
+        generate_bash_history(bash_mixed_path, size, FIXTURE_START, seed, untimestamped_lines=size * 10)
+    if not os.path.exists(fish_path):
+        generate_fish_history(fish_path, size, FIXTURE_START, seed)
+    if not os.path.exists(chrome_path):
+        build_chrome_history(chrome_path, size, FIXTURE_START, days, seed)
+    if not os.path.exists(os.path.join(firefox_dir, "profiles.ini")):
+        build_firefox_history(firefox_dir, size, FIXTURE_START, days, seed)
+    if not os.path.exists(safari_path):
+        build_safari_history(safari_path, size, FIXTURE_START, days, seed)
+    return {"zsh": zsh_path, "bash": bash_path, "bash_mixed": bash_mixed_path, "fish": fish_path,
+            "chrome": chrome_dir, "firefox": firefox_dir, "safari": safari_path}
+
+
+def flatten_days(daily_activities):
+    """按日期顺序把按天划分的结果连接为一个序列"""
+    return list(chain.from_iterable(daily_activities[day] for day in sorted(daily_activities)))
+
+
+def run_stage(func, measure_memory):
+    """
+    运行一个阶段，屏蔽解析器的提示输出
+
+    Returns:
+        tuple: (返回值, 耗时秒数, 峰值内存字节数或None)
+    """
+    if measure_memory:
+        tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            value = func()
+            elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if measure_memory else None
+    finally:
+        if measure_memory:
+            tracemalloc.stop()
+    return value, elapsed, peak
+
+
+def run_size(fixtures, size, measure_memory):
+    """
+    在一种规模的数据上依次运行各个阶段
+
+    每个阶段先不带内存跟踪运行一次计时，tracemalloc会使分配变慢；需要测量内存时
+    再运行一次记录峰值。
+
+    Returns:
+        dict: 阶段名称到records、seconds、records_per_second、peak_bytes的映射
+    """
+    # 浏览记录按正态分布落在一天中，zsh历史有轻微的随机性，首尾都多留一些余量
+    start_date = FIXTURE_START - timedelta(days=1)
+    end_date = FIXTURE_START + timedelta(days=fixture_days(size) * 2)
+    inputs = {}
+
+    stages = [
+        ("parse_zsh_history", lambda: flatten_days(
+            parse_zsh_history_range(start_date, end_date, file_path=fixtures["zsh"]))),
+        ("parse_bash_history", lambda: flatten_days(
+            parse_bash_history_range(start_date, end_date, file_path=fixtures["bash"]))),
+        ("parse_bash_mixed_history", lambda: flatten_days(
+            parse_bash_history_range(start_date, end_date, file_path=fixtures["bash_mixed"]))),
+        ("parse_fish_history", lambda: flatten_days(
+            parse_fish_history_range(start_date, end_date, file_path=fixtures["fish"]))),
+        ("parse_safari_history", lambda: flatten_days(
+            parse_safari_history_range(start_date, end_date, db_path=fixtures["safari"]))),
+        ("parse_chrome_history", lambda: flatten_days(
+            parse_chrome_history_range(start_date, end_date, visit_level=True, base_dir=fixtures["chrome"]))),
+        ("parse_firefox_history", lambda: flatten_days(
+            parse_firefox_history_range(start_date, end_date, base_dir=fixtures["firefox"]))),
+        ("merge_activities", lambda: merge_activities(
+            inputs["parse_zsh_history"], inputs["parse_bash_history"], inputs["parse_fish_history"],
+            inputs["parse_safari_history"], inputs["parse_chrome_history"],
+            inputs["parse_firefox_history"])),
+        ("summarize_activities", lambda: summarize_activities(inputs["merge_activities"], save=False)),
+    ]
+
+    results = {}
+    for name, func in stages:
+        value, elapsed, _ = run_stage(func, False)
+        peak = run_stage(func, True)[2] if measure_memory else None
+        inputs[name] = value
+        records = len(inputs["merge_activities"]) if name == "summarize_activities" else len(value)
+        results[name] = {
+            "records": records,
+            "seconds": round(elapsed, 6),
+            "records_per_second": round(records / elapsed) if elapsed > 0 else None,
+            "peak_bytes": peak,
+        }
+        memory = f"{peak / 1024 / 1024:9.1f} MB" if peak is not None else ""
+        print(f"  {name:<24} {records:>10} 条  {elapsed:8.3f} 秒  "
+              f"{results[name]['records_per_second'] or 0:>10} 条/秒  {memory}")
+    return results
+
+
+def check_results(results):
+    """
+    检查同一份数据的不同形式是否解析出相同数量的记录
+
+    Returns:
+        list: 不一致的项目，每项为(规模, 阶段, 期望的记录数量, 实际的记录数量)
+    """
+    problems = []
+    for size, stages in results["results"].items():
+        expected = stages["parse_bash_history"]["records"]
+        actual = stages["parse_bash_mixed_history"]["records"]
+        if actual != expected:
+            problems.append((size, "parse_bash_mixed_history", expected, actual))
+    return problems
+
+
+def compare_results(results, baseline, threshold):
+    """
+    与基准结果逐项对比
+
+    Args:
+        results (dict): 本次的结果
+        baseline (dict): 基准结果
+        threshold (float): 允许的增长比例
+
+    Returns:
+        list: 退化的项目，每项为(规模, 阶段, 指标, 基准值, 本次值)
+    """
+    regressions = []
+    for size, stages in results["results"].items():
+        baseline_stages = baseline.get("results", {}).get(size, {})
+        for name, current in stages.items():
+            previous = baseline_stages.get(name)
+            if not previous:
+                continue
+            for metric in ("seconds", "peak_bytes"):
+                before, after = previous.get(metric), current.get(metric)
+                if before and after is not None and after > before * (1 + threshold):
+                    regressions.append((size, name, metric, before, after))
+    return regressions
+
+
+def environment():
+    """记录运行环境，对比不同机器上的结果时参考"""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": sessions.np.__version__ if sessions.np is not None else None,
+    }
+
+
+def parse_sizes(value):
+    """解析逗号分隔的规模列表，例如10000,100000"""
+    try:
+        sizes = [int(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的规模列表: {value}")
+    if not sizes or any(size <= 0 for size in sizes):
+        raise argparse.ArgumentTypeError(f"无效的规模列表: {value}")
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='解析器和分析流程的基准测试套件')
+    parser.add_argument('--sizes', type=parse_sizes, default=DEFAULT_SIZES,
+                        help='逗号分隔的数据规模（每个数据源的记录数量），默认为10000,100000,1000000')
+    parser.add_argument('--seed', type=int, default=0, help='生成测试数据的随机种子')
+    parser.add_argument('--fixtures-dir', help='保存测试数据的目录，已有的文件直接复用；默认使用临时目录')
+    parser.add_argument('--output', help='把结果写入JSON文件')
+    parser.add_argument('--baseline', help='与之前保存的JSON结果对比')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='耗时或峰值内存增长超过这个比例视为退化，默认为0.2')
+    parser.add_argument('--no-memory', action='store_true', help='不测量峰值内存（只运行一次，更快）')
+    args = parser.parse_args()
+
+    temp_dir = None
+    if args.fixtures_dir:
+        directory = args.fixtures_dir
+        os.makedirs(directory, exist_ok=True)
+    else:
+        temp_dir = tempfile.TemporaryDirectory()
+        directory = temp_dir.name
+
+    results = {
+        "version": RESULTS_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "results": {},
+    }
+    try:
+        for size in args.sizes:
+            print(f"规模 {size}: 生成测试数据...")
+            fixtures = prepare_fixtures(directory, size, args.seed)
+            results["results"][str(size)] = run_size(fixtures, size, not args.no_memory)
+            print()
+    finally:
+        if temp_dir:
+            temp_dir.cleanup()
+
+    problems = check_results(results)
+    for size, name, expected, actual in problems:
+        print(f"规模 {size} {name}: 应解析出 {expected} 条记录，实际为 {actual} 条")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到: {args.output}")
+
+    if args.baseline:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取基准结果时出错: {str(e)}")
+            return 1
+        regressions = compare_results(results, baseline, args.threshold)
+        if not regressions:
+            print(f"与基准 {args.baseline} 相比没有超过 {args.threshold:.0%} 的退化")
+            return 1 if problems else 0
+        print(f"与基准 {args.baseline} 相比发现 {len(regressions)} 项退化:")
+        for size, name, metric, before, after in regressions:
+            print(f"  规模 {size} {name} {metric}: {before} -> {after} (+{after / before - 1:.0%})")
+        return 1
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+zsh历史记录解析吞吐量基准测试
+
+对比原来基于readlines+正则的实现和新的字节级解析引擎。在项目根目录运行：
+
+    python -m benchmarks.bench_zsh_parser --lines 1000000
+"""
+
+import argparse
+import os
+import re
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.fixtures import generate_history
+from parsers.zsh_reader import iter_zsh_records, iter_file_chunks, read_zsh_window
+
+
+def legacy_parse(file_path):
+    """原来的实现：逐行strip+正则匹配，为每一行创建dict和datetime"""
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
+        lines = file.readlines()
+
+    entries = []
+    for line in lines:
+        match = re.match(r'^: (\d+):(\d+);(.*)$', line.strip())
+        if match:
+            timestamp, duration, command = match.groups()
+            timestamp = int(timestamp)
+            entries.append({
+                'timestamp': timestamp,
+                'time': datetime.fromtimestamp(timestamp),
+                'command': command,
+                'metadata': {'duration': duration}
+            })
+    return entries
+
+
+def measure(name, func, size):
+    """运行一次func并打印耗时和吞吐量"""
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {count:>10} 条  {elapsed:8.3f} 秒  {size / elapsed / 1024 / 1024:8.1f} MB/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='zsh历史记录解析吞吐量基准测试')
+    parser.add_argument('--lines', type=int, default=1000000, help='生成的历史记录行数')
+    parser.add_argument('--path', help='使用已有的历史文件而不是生成测试数据')
+    args = parser.parse_args()
+
+    temp_dir = None
+    if args.path:
+        path = args.path
+    else:
+        temp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(temp_dir.name, "zsh_history")
+        generate_history(path, args.lines, datetime(2022, 1, 1))
+
+    size = os.path.getsize(path)
+    print(f"测试文件: {path} ({size / 1024 / 1024:.1f} MB)\n")
+
+    # 取文件中间的一天作为单日查询的目标
+    records = list(iter_zsh_records(iter_file_chunks(path)))
+    middle = datetime.fromtimestamp(records[len(records) // 2][0])
+    day_start = int(datetime(middle.year, middle.month, middle.day).timestamp())
+    day_end = int((datetime(middle.year, middle.month, middle.day) + timedelta(days=1)).timestamp()) - 1
+    del records
+
+    print("全量解析:")
+    legacy = measure("旧实现 (readlines+正则)", lambda: len(legacy_parse(path)), size)
+    engine = measure("字节级引擎", lambda: sum(1 for _ in iter_zsh_records(iter_file_chunks(path))), size)
+    print(f"加速比: {legacy / engine:.2f}x\n")
+
+    print(f"单日查询 ({middle.strftime('%Y-%m-%d')}):")
+    legacy = measure("旧实现 (全量解析后过滤)",
+                     lambda: sum(1 for e in legacy_parse(path) if day_start <= e['timestamp'] <= day_end), size)
+    stream = measure("字节级引擎 (整数过滤)",
+                     lambda: sum(1 for _ in iter_zsh_records(iter_file_chunks(path), day_start, day_end)), size)
+    window = measure("字节级引擎 (mmap二分定位)",
+                     lambda: sum(1 for _ in iter_zsh_records(read_zsh_window(path, day_start, day_end), day_start, day_end)), size)
+    print(f"加速比: {legacy / stream:.2f}x (流式), {legacy / window:.2f}x (定位)")
+
+    if temp_dir:
+        temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
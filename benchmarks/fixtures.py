@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import sqlite3
+from datetime import datetime
+
+from parsers.chrome_parser import CHROME_EPOCH_OFFSET
+from parsers.safari_parser import SAFARI_EPOCH_OFFSET
+
+# Chrome History数据库中与浏览记录相关的表（与Chrome实际使用的结构一致）
+CHROME_SCHEMA = """
+CREATE TABLE meta(key LONGVARCHAR NOT NULL UNIQUE PRIMARY KEY, value LONGVARCHAR);
+CREATE TABLE urls(id INTEGER PRIMARY KEY AUTOINCREMENT,url LONGVARCHAR,title LONGVARCHAR,
+    visit_count INTEGER DEFAULT 0 NOT NULL,typed_count INTEGER DEFAULT 0 NOT NULL,
+    last_visit_time INTEGER NOT NULL,hidden INTEGER DEFAULT 0 NOT NULL);
+CREATE TABLE visits(id INTEGER PRIMARY KEY AUTOINCREMENT,url INTEGER NOT NULL,visit_time INTEGER NOT NULL,
+    from_visit INTEGER,external_referrer_url TEXT,transition INTEGER DEFAULT 0 NOT NULL,segment_id INTEGER,
+    visit_duration INTEGER DEFAULT 0 NOT NULL,incremented_omnibox_typed_score BOOLEAN DEFAULT FALSE NOT NULL,
+    opener_visit INTEGER,originator_cache_guid TEXT,originator_visit_id INTEGER,originator_from_visit INTEGER,
+    originator_opener_visit INTEGER,is_known_to_sync BOOLEAN DEFAULT FALSE NOT NULL,
+    consider_for_ntp_most_visited BOOLEAN DEFAULT FALSE NOT NULL,visited_link_id INTEGER DEFAULT 0 NOT NULL,
+    app_id TEXT);
+CREATE INDEX urls_url_index ON urls (url);
+CREATE INDEX visits_url_index ON visits (url);
+CREATE INDEX visits_from_index ON visits (from_visit);
+CREATE INDEX visits_time_index ON visits (visit_time);
+CREATE INDEX visits_originator_id_index ON visits (originator_visit_id);
+"""
+
+# Safari History.db中与浏览记录相关的表（与Safari实际使用的结构一致）
+SAFARI_SCHEMA = """
+CREATE TABLE history_items (id INTEGER PRIMARY KEY AUTOINCREMENT,url TEXT NOT NULL UNIQUE,
+    domain_expansion TEXT NULL,visit_count INTEGER NOT NULL,daily_visit_counts BLOB NOT NULL,
+    weekly_visit_counts BLOB NULL,autocomplete_triggers BLOB NULL,
+    should_recompute_derived_visit_counts INTEGER NOT NULL,visit_count_score INTEGER NOT NULL,
+    status_code INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE history_visits (id INTEGER PRIMARY KEY AUTOINCREMENT,
+    history_item INTEGER NOT NULL REFERENCES history_items(id) ON DELETE CASCADE,
+    visit_time REAL NOT NULL,title TEXT NULL,load_successful BOOLEAN NOT NULL DEFAULT 1,
+    http_non_get BOOLEAN NOT NULL DEFAULT 0,synthesized BOOLEAN NOT NULL DEFAULT 0,
+    redirect_source INTEGER NULL UNIQUE REFERENCES history_visits(id) ON DELETE CASCADE,
+    redirect_destination INTEGER NULL UNIQUE REFERENCES history_visits(id) ON DELETE CASCADE,
+    origin INTEGER NOT NULL DEFAULT 0,generation INTEGER NOT NULL DEFAULT 0,
+    attributes INTEGER NOT NULL DEFAULT 0,score INTEGER NOT NULL DEFAULT 0);
+CREATE INDEX history_items__domain_expansion ON history_items (domain_expansion);
+CREATE INDEX history_visits__last_visit ON history_visits (visit_time);
+CREATE INDEX history_visits__origin ON history_visits (origin, generation);
+"""
+
+# Firefox places.sqlite中与浏览记录相关的表（与Firefox实际使用的结构一致）
+FIREFOX_SCHEMA = """
+CREATE TABLE moz_places (id INTEGER PRIMARY KEY, url LONGVARCHAR, title LONGVARCHAR, rev_host LONGVARCHAR,
+    visit_count INTEGER DEFAULT 0, hidden INTEGER DEFAULT 0 NOT NULL, typed INTEGER DEFAULT 0 NOT NULL,
+    frecency INTEGER DEFAULT -1 NOT NULL, last_visit_date INTEGER, guid TEXT, foreign_count INTEGER DEFAULT 0 NOT NULL,
+    url_hash INTEGER DEFAULT 0 NOT NULL, description TEXT, preview_image_url TEXT, site_name TEXT,
+    origin_id INTEGER, recalc_frecency INTEGER NOT NULL DEFAULT 0, alt_frecency INTEGER,
+    recalc_alt_frecency INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE moz_historyvisits (id INTEGER PRIMARY KEY, from_visit INTEGER, place_id INTEGER, visit_date INTEGER,
+    visit_type INTEGER, session INTEGER, source INTEGER DEFAULT 0 NOT NULL, triggeringPlaceId INTEGER);
+CREATE INDEX moz_places_url_hashindex ON moz_places (url_hash);
+CREATE INDEX moz_places_hostindex ON moz_places (rev_host);
+CREATE INDEX moz_places_visitcount ON moz_places (visit_count);
+CREATE INDEX moz_places_frecencyindex ON moz_places (frecency);
+CREATE INDEX moz_places_lastvisitdateindex ON moz_places (last_visit_date);
+CREATE UNIQUE INDEX moz_places_guid_uniqueindex ON moz_places (guid);
+CREATE INDEX moz_historyvisits_placedateindex ON moz_historyvisits (place_id, visit_date);
+CREATE INDEX moz_historyvisits_fromindex ON moz_historyvisits (from_visit);
+CREATE INDEX moz_historyvisits_dateindex ON moz_historyvisits (visit_date);
+"""
+
+# Firefox的常见访问类型：LINK、TYPED、临时重定向、RELOAD
+FIREFOX_VISIT_TYPES = [1, 1, 1, 2, 6, 9]
+
+SAMPLE_DOMAINS = [
+    "github.com", "stackoverflow.com", "docs.python.org", "google.com", "news.ycombinator.com",
+    "developer.apple.com", "youtube.com", "zhihu.com", "bilibili.com", "wikipedia.org",
+]
+
+# Chrome的常见跳转类型：LINK、TYPED、带CHAIN_START|CHAIN_END的LINK、RELOAD
+CHROME_TRANSITIONS = [0, 1, 805306368, 838860808]
+
+# zsh测试历史文件中的命令
+SAMPLE_COMMANDS = [
+    b"git status",
+    b"ls -la",
+    b"cd ~/projects/wihd",
+    b"python main.py 20250503",
+    b"vim parsers/zsh_history_parser.py",
+    b"docker compose up -d",
+    b"grep -rn TODO .",
+    b"echo \xe4\xbd\xa0\xe5\xa5\xbd",
+]
+
+
+def generate_history(path, line_count, start_date, seed=0):
+    """
+    生成EXTENDED_HISTORY格式的测试历史文件
+
+    包含少量多行命令、Meta转义字节以及SHARE_HISTORY式的轻微乱序。相邻记录平均
+    间隔45秒，一百万行大约覆盖一年半。
+
+    Returns:
+        tuple: (第一条记录的时间戳, 最后一条记录的时间戳)
+    """
+    rng = random.Random(seed)
+    timestamp = first = int(start_date.timestamp())
+    with open(path, 'wb') as f:
+        for i in range(line_count):
+            timestamp += rng.randint(0, 90)
+            jitter = -rng.randint(0, 300) if rng.random() < 0.01 else 0
+            roll = rng.random()
+            if roll < 0.005:
+                command = b"for i in 1 2 3\\\ndo echo $i\\\ndone"
+            elif roll < 0.01:
+                # 0x83 0xa3 是zsh对字节0x83的Meta转义
+                command = b"echo \xe5\x83\xa3\x8f"
+            else:
+                command = rng.choice(SAMPLE_COMMANDS) + b" " + str(i).encode()
+            f.write(b": %d:%d;%s\n" % (timestamp + jitter, rng.randint(0, 5), command))
+    return first, timestamp
+
+
+def generate_bash_history(path, line_count, start_date, seed=0, untimestamped_lines=0):
+    """
+    生成设置了HISTTIMEFORMAT的bash历史文件
+
+    开头有几行没有时间戳的旧记录，包含少量多行命令（lithist）；多个终端退出时
+    各自追加，时间戳有一定的乱序。untimestamped_lines大于0时，在末尾追加这么多行
+    没有时间戳的命令，模拟没有设置HISTTIMEFORMAT的会话写入同一个文件。
+
+    Returns:
+        tuple: (第一条记录的时间戳, 最后一条记录的时间戳)
+    """
+    rng = random.Random(seed)
+    timestamp = first = int(start_date.timestamp())
+    with open(path, 'wb') as f:
+        f.write(b"ls\ncd ~\n")
+        for i in range(line_count):
+            timestamp += rng.randint(0, 90)
+            jitter = -rng.randint(0, 1800) if rng.random() < 0.05 else 0
+            if rng.random() < 0.005:
+                command = b"for i in 1 2 3\ndo echo $i\ndone"
+            else:
+                command = rng.choice(SAMPLE_COMMANDS) + b" " + str(i).encode()
+            f.write(b"#%d\n%s\n" % (timestamp + jitter, command))
+        for i in range(untimestamped_lines):
+            f.write(rng.choice(SAMPLE_COMMANDS) + b" " + str(i).encode() + b"\n")
+    return first, timestamp
+
+
+def generate_fish_history(path, line_count, start_date, seed=0):
+    """
+    生成fish_history文件，包含少量带转义换行的多行命令和paths列表
+
+    Returns:
+        tuple: (第一条记录的时间戳, 最后一条记录的时间戳)
+    """
+    rng = random.Random(seed)
+    timestamp = first = int(start_date.timestamp())
+    with open(path, 'wb') as f:
+        for i in range(line_count):
+            timestamp += rng.randint(0, 90)
+            roll = rng.random()
+            if roll < 0.005:
+                command = b"for i in 1 2 3\\n    echo $i\\nend"
+            else:
+                command = rng.choice(SAMPLE_COMMANDS) + b" " + str(i).encode()
+            f.write(b"- cmd: %s\n  when: %d\n" % (command, timestamp))
+            if roll > 0.9:
+                f.write(b"  paths:\n    - src/main.py\n")
+    return first, timestamp
+
+
+def _visit_times(visit_count, start_date, days, seed):
+    """生成按时间排序的访问时间（Unix时间戳），集中在白天"""
+    rng = random.Random(seed)
+    start = start_date.timestamp()
+    times = [start + rng.randrange(days) * 86400 + rng.gauss(14 * 3600, 4 * 3600) for _ in range(visit_count)]
+    times.sort()
+    return times
+
+
+def _url_count(visit_count):
+    """按访问次数估计不同URL的数量"""
+    return max(1, visit_count // 10)
+
+
+def build_chrome_history(db_path, visit_count, start_date=datetime(2024, 1, 1), days=365, seed=0):
+    """
+    生成Chrome的History测试数据库
+
+    Args:
+        db_path (str): 数据库路径，已存在时会被覆盖
+        visit_count (int): 访问记录数量
+        start_date (datetime): 第一天
+        days (int): 访问记录分布的天数
+        seed (int): 随机种子
+
+    Returns:
+        str: 数据库路径
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+    rng = random.Random(seed)
+    url_count = _url_count(visit_count)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(CHROME_SCHEMA)
+    conn.executemany(
+        "INSERT INTO urls (id, url, title, last_visit_time) VALUES (?, ?, ?, 0)",
+        ((i, f"https://{SAMPLE_DOMAINS[i % len(SAMPLE_DOMAINS)]}/page/{i}?utm_source=feed", f"Page {i}")
+         for i in range(1, url_count + 1))
+    )
+
+    last_visit = {}
+    visit_counts = {}
+
+    def visits():
+        for visit_id, timestamp in enumerate(_visit_times(visit_count, start_date, days, seed), 1):
+            url_id = rng.randint(1, url_count)
+            chrome_time = int((timestamp + CHROME_EPOCH_OFFSET) * 1000000)
+            last_visit[url_id] = chrome_time
+            visit_counts[url_id] = visit_counts.get(url_id, 0) + 1
+            yield (visit_id, url_id, chrome_time, rng.choice(CHROME_TRANSITIONS), rng.randint(0, 600) * 1000000)
+
+    conn.executemany(
+        "INSERT INTO visits (id, url, visit_time, transition, visit_duration) VALUES (?, ?, ?, ?, ?)",
+        visits()
+    )
+    conn.executemany(
+        "UPDATE urls SET last_visit_time = ?, visit_count = ? WHERE id = ?",
+        ((last_visit[url_id], visit_counts[url_id], url_id) for url_id in last_visit)
+    )
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def build_safari_history(db_path, visit_count, start_date=datetime(2024, 1, 1), days=365, seed=0):
+    """
+    生成Safari的History.db测试数据库
+
+    Args:
+        db_path (str): 数据库路径，已存在时会被覆盖
+        visit_count (int): 访问记录数量
+        start_date (datetime): 第一天
+        days (int): 访问记录分布的天数
+        seed (int): 随机种子
+
+    Returns:
+        str: 数据库路径
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+    rng = random.Random(seed)
+    item_count = _url_count(visit_count)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SAFARI_SCHEMA)
+    conn.executemany(
+        "INSERT INTO history_items (id, url, domain_expansion, visit_count, daily_visit_counts, "
+        "should_recompute_derived_visit_counts, visit_count_score) VALUES (?, ?, ?, 0, x'', 0, 0)",
+        ((i, f"https://{SAMPLE_DOMAINS[i % len(SAMPLE_DOMAINS)]}/item/{i}", SAMPLE_DOMAINS[i % len(SAMPLE_DOMAINS)])
+         for i in range(1, item_count + 1))
+    )
+    conn.executemany(
+        "INSERT INTO history_visits (id, history_item, visit_time, title) VALUES (?, ?, ?, ?)",
+        ((visit_id, rng.randint(1, item_count), timestamp - SAFARI_EPOCH_OFFSET, f"Title {visit_id}")
+         for visit_id, timestamp in enumerate(_visit_times(visit_count, start_date, days, seed + 1), 1))
+    )
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def build_firefox_history(base_dir, visit_count, start_date=datetime(2024, 1, 1), days=365, seed=0,
+                          profile="abcd1234.default-release"):
+    """
+    生成Firefox的配置文件目录：profiles.ini和一个配置文件中的places.sqlite
+
+    Args:
+        base_dir (str): Firefox配置文件目录（相当于~/.mozilla/firefox），places.sqlite已存在时会被覆盖
+        visit_count (int): 访问记录数量
+        start_date (datetime): 第一天
+        days (int): 访问记录分布的天数
+        seed (int): 随机种子
+        profile (str): 配置文件的目录名
+
+    Returns:
+        str: places.sqlite的路径
+    """
+    db_path = os.path.join(base_dir, profile, "places.sqlite")
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    with open(os.path.join(base_dir, "profiles.ini"), "w", encoding="utf-8") as f:
+        f.write(f"[General]\nStartWithLastProfile=1\nVersion=2\n\n"
+                f"[Profile0]\nName=default-release\nIsRelative=1\nPath={profile}\nDefault=1\n")
+
+    rng = random.Random(seed)
+    place_count = _url_count(visit_count)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(FIREFOX_SCHEMA)
+    conn.executemany(
+        "INSERT INTO moz_places (id, url, title, rev_host, guid) VALUES (?, ?, ?, ?, ?)",
+        ((i, f"https://{SAMPLE_DOMAINS[i % len(SAMPLE_DOMAINS)]}/entry/{i}", f"Entry {i}",
+          SAMPLE_DOMAINS[i % len(SAMPLE_DOMAINS)][::-1] + ".", f"guid{i:08d}")
+         for i in range(1, place_count + 1))
+    )
+    conn.executemany(
+        "INSERT INTO moz_historyvisits (id, from_visit, place_id, visit_date, visit_type, session) "
+        "VALUES (?, 0, ?, ?, ?, 0)",
+        ((visit_id, rng.randint(1, place_count), int(timestamp * 1000000), rng.choice(FIREFOX_VISIT_TYPES))
+         for visit_id, timestamp in enumerate(_visit_times(visit_count, start_date, days, seed + 2), 1))
+    )
+    conn.execute("UPDATE moz_places SET visit_count = (SELECT count(*) FROM moz_historyvisits WHERE place_id = moz_places.id), "
+                 "last_visit_date = (SELECT max(visit_date) FROM moz_historyvisits WHERE place_id = moz_places.id)")
+    conn.commit()
+    conn.close()
+    return db_path
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OpenAI兼容接口的本地模拟服务
+
+不调用真正的模型，按固定的延迟返回根据提示词生成的回复，用于离线测试
+分块总结的延迟和吞吐量。在项目根目录运行：
+
+    python -m benchmarks.llm_stub_server --port 8000 --latency 0.5
+    python main.py 20250503 --llm-url http://127.0.0.1:8000/v1
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_LINE_PATTERN = re.compile(r'^\d{2}:\d{2}:\d{2}(?:-\d{2}:\d{2}:\d{2})? \[(\w+)\]', re.M)
+
+
+def build_reply(prompt):
+    """根据提示词生成模拟的回复：合并请求返回JSON，分块请求返回一段文字"""
+    if '"summary"' in prompt:
+        periods = re.findall(r'^\[([^\]]+)\]', prompt, re.M)
+        return json.dumps({
+            "summary": f"模拟总结：合并了{len(periods)}个时间段的活动总结。",
+            "categories": ["模拟分类"]
+        }, ensure_ascii=False)
+    if "合并" in prompt:
+        periods = re.findall(r'^\[([^\]]+)\]', prompt, re.M)
+        return f"模拟合并：{len(periods)}个时间段。"
+
+    type_counts = {}
+    for activity_type in _LINE_PATTERN.findall(prompt):
+        type_counts[activity_type] = type_counts.get(activity_type, 0) + 1
+    details = "，".join(f"{activity_type} {count}条" for activity_type, count in sorted(type_counts.items()))
+    return f"模拟分块总结：{details}。"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """处理/chat/completions请求"""
+    latency = 0.0
+    requests = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length).decode("utf-8"))
+        prompt = request["messages"][-1]["content"]
+
+        with StubHandler.lock:
+            StubHandler.requests += 1
+        time.sleep(self.latency)
+
+        reply = build_reply(prompt)
+        body = json.dumps({
+            "id": f"stub-{StubHandler.requests}",
+            "object": "chat.completion",
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(reply) // 4},
+        }, ensure_ascii=False).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port=0, latency=0.0):
+    """
+    在后台线程中启动模拟服务
+
+    Args:
+        port (int): 端口，0表示随机选择
+        latency (float): 每个请求的延迟秒数
+
+    Returns:
+        ThreadingHTTPServer: 服务对象，用server.server_address[1]获取端口，用shutdown()停止
+    """
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenAI兼容接口的本地模拟服务')
+    parser.add_argument('--port', type=int, default=8000, help='监听端口')
+    parser.add_argument('--latency', type=float, default=0.5, help='每个请求的延迟秒数')
+    args = parser.parse_args()
+
+    server = start_stub_server(args.port, args.latency)
+    print(f"模拟服务已启动: http://127.0.0.1:{server.server_address[1]}/v1 （延迟 {args.latency} 秒）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,35 @@
 
 import sys
 import argparse
-import json
 from datetime import datetime
-from parsers.zsh_history_parser import parse_zsh_history
-from parsers.safari_parser import parse_safari_history
-from parsers.chrome_parser import parse_chrome_history
-from utils.time_merger import merge_activities
-from analysis.summarizer import summarize_activities
+from functools import partial
+from parsers.registry import (load_sources_config, select_sources, parse_source, sync_source, describe_sources,
+                              DEFAULT_SOURCES_CONFIG)
+from utils.models import ActivityType
+from utils.time_merger import merge_activities, iter_merged_activities
+from utils.date_range import partition_by_day, range_bounds
+from utils.concurrency import run_tasks, DEFAULT_JOBS
+from utils.activity_store import open_activity_store, DEFAULT_STORE_PATH
+from utils.activity_writer import OUTPUT_FORMATS, DEFAULT_OUTPUT_FORMAT
+from utils.activity_reader import iter_activity_file, expand_activity_paths
+from analysis.summarizer import summarize_activities, summarize_activity_range, summarize_activity_stream, call_llm_api_for_summary
+from analysis.llm_summarizer import (MapReduceSummarizer, OpenAICompatibleBackend,
+                                     DEFAULT_CHUNK_TOKENS, DEFAULT_CONCURRENCY)
+from analysis.sampler import DEFAULT_SAMPLE_SIZE, DEFAULT_SAMPLE_SEED
+from analysis.llm_cache import LLMCache, DEFAULT_CACHE_PATH, DEFAULT_CACHE_BYTES
+from analysis.sessions import DEFAULT_IDLE_GAP
+from utils.profiler import span, traced, enable_profiling, disable_profiling, DEFAULT_PROFILE_PATH
+
+# 输出中各活动类型的名称
+ACTIVITY_TYPE_LABELS = {
+    "terminal": "终端命令",
+    "safari": "Safari浏览",
+    "chrome": "Chrome浏览",
+    "firefox": "Firefox浏览",
+}
+
+# 摘要中最多列出的工作时段数量
+MAX_SESSIONS_SHOWN = 30
 
 def parse_date(date_str):
     """将YYYYMMDD格式的日期字符串转换为datetime对象"""
@@ -22,13 +44,78 @@ def parse_date(date_str):
 def main():
     parser = argparse.ArgumentParser(description='解析并分析电脑操作记录')
     parser.add_argument('date', nargs='?', help='要处理的日期，格式为YYYYMMDD')
-    parser.add_argument('--json', help='直接分析指定的JSON文件（跳过解析步骤）')
+    parser.add_argument('--json', nargs='+', metavar='FILE', help='直接分析已保存的活动记录文件（JSON或NDJSON，可以是压缩的，支持通配符），跳过解析步骤')
     parser.add_argument('--output', '-o', help='输出文件路径，默认为标准输出')
+    parser.add_argument('--incremental', action='store_true', help='增量解析终端历史记录（zsh、bash、fish），只处理上次运行之后新增的内容')
+    parser.add_argument('--chrome-visits', action='store_true', help='按每次访问提取Chrome记录，而不是每个URL只保留最后一次访问')
+    parser.add_argument('--from', dest='from_date', help='日期范围的开始日期，格式为YYYYMMDD')
+    parser.add_argument('--to', dest='to_date', help='日期范围的结束日期（包含），格式为YYYYMMDD，默认与开始日期相同')
+    parser.add_argument('--jobs', '-j', type=int, default=DEFAULT_JOBS, help=f'并发解析数据源和Chrome配置文件的最大数量，默认为{DEFAULT_JOBS}')
+    parser.add_argument('--format', choices=list(OUTPUT_FORMATS), default=DEFAULT_OUTPUT_FORMAT,
+                        help='保存到output目录的活动记录格式：json为缩进的JSON数组，ndjson为每行一条记录，可以用gzip或zstd压缩')
+    parser.add_argument('--store', nargs='?', const=DEFAULT_STORE_PATH, help=f'先把各数据源的新记录同步到本地活动存储，再从存储中查询，默认路径为{DEFAULT_STORE_PATH}')
+    parser.add_argument('--llm-url', help='OpenAI兼容接口的地址（例如http://127.0.0.1:8000/v1），提供时使用大模型生成总结，API密钥从OPENAI_API_KEY读取')
+    parser.add_argument('--llm-model', default='gpt-4o-mini', help='大模型名称，默认为gpt-4o-mini')
+    parser.add_argument('--llm-concurrency', type=int, default=DEFAULT_CONCURRENCY, help=f'同时发出的大模型请求数量上限，默认为{DEFAULT_CONCURRENCY}')
+    parser.add_argument('--chunk-tokens', type=int, default=DEFAULT_CHUNK_TOKENS, help=f'每个分块提示词的token预算，默认为{DEFAULT_CHUNK_TOKENS}')
+    parser.add_argument('--llm-cache', default=DEFAULT_CACHE_PATH, help=f'大模型结果缓存的路径，默认为{DEFAULT_CACHE_PATH}')
+    parser.add_argument('--llm-cache-size', type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024),
+                        help=f'大模型结果缓存的容量上限（MB），超出时淘汰最久未使用的结果，默认为{DEFAULT_CACHE_BYTES // (1024 * 1024)}')
+    parser.add_argument('--no-llm-cache', action='store_true', help='不读取也不写入大模型结果缓存')
+    parser.add_argument('--no-compaction', action='store_true', help='把活动记录原样发送给大模型，不合并重复的命令和同一网站的连续浏览')
+    parser.add_argument('--llm-examples', type=int, default=DEFAULT_SAMPLE_SIZE,
+                        help=f'附在最终总结请求中的代表性活动记录数量，按小时和类型分层抽样，0表示不附带，默认为{DEFAULT_SAMPLE_SIZE}')
+    parser.add_argument('--llm-seed', type=int, default=DEFAULT_SAMPLE_SEED, help='抽取示例的随机种子，同样的种子和记录总是得到同样的示例')
+    parser.add_argument('--idle-gap', type=int, default=DEFAULT_IDLE_GAP // 60,
+                        help=f'两条记录间隔超过这么多分钟时划分为新的工作时段，默认为{DEFAULT_IDLE_GAP // 60}')
+    parser.add_argument('--sources', type=lambda value: [name.strip() for name in value.split(',') if name.strip()],
+                        help='逗号分隔的数据源名称（例如zsh,chrome,brave），只读取这些数据源，包括默认不启用的；--list-sources列出所有数据源')
+    parser.add_argument('--sources-config', default=DEFAULT_SOURCES_CONFIG,
+                        help=f'数据源配置文件（JSON），可以修改各数据源的路径、是否启用，或新增Chromium系浏览器，默认为{DEFAULT_SOURCES_CONFIG}')
+    parser.add_argument('--list-sources', action='store_true', help='列出所有数据源、是否启用以及找到的路径，然后退出')
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_PROFILE_PATH,
+                        help=f'记录各阶段的墙钟时间、CPU时间、行数和内存增长，写入Chrome trace格式的JSON文件，默认为{DEFAULT_PROFILE_PATH}')
     args = parser.parse_args()
+    args.idle_gap_seconds = args.idle_gap * 60
+    
+    if args.list_sources:
+        print(describe_sources(load_sources_config(args.sources_config)))
+        return 0
+    
+    if not args.profile:
+        return run(args)
+    
+    tracer = enable_profiling()
+    try:
+        with span("main"):
+            return run(args)
+    finally:
+        disable_profiling()
+        save_profile(tracer, args.profile)
+
+def run(args):
+    """按命令行参数处理日期、日期范围或已保存的活动记录文件"""
+    # 提供了大模型接口时，按分块并发总结
+    args.llm = create_llm_summarizer(args)
+    
+    # 如果提供了日期范围，一次读取每个数据源并按天汇总
+    if args.from_date or args.to_date:
+        if not args.from_date:
+            print("错误：使用--to时必须同时提供--from")
+            sys.exit(1)
+        start_date = parse_date(args.from_date)
+        end_date = parse_date(args.to_date) if args.to_date else start_date
+        if end_date < start_date:
+            print("错误：结束日期不能早于开始日期")
+            sys.exit(1)
+        if args.json:
+            return analyze_json_file(args.json, args.output, start_date, end_date, args.llm, args.idle_gap_seconds)
+        return process_date_range(start_date, end_date, args)
     
-    # 如果提供了JSON文件路径，直接进行分析
+    # 如果提供了JSON文件路径，直接进行分析，提供日期时只分析当天的记录
     if args.json:
-        return analyze_json_file(args.json, args.output)
+        target_date = parse_date(args.date) if args.date else None
+        return analyze_json_file(args.json, args.output, target_date, target_date, args.llm, args.idle_gap_seconds)
     
     if not args.date:
         print("错误：请提供日期参数，格式为YYYYMMDD")
@@ -38,50 +125,194 @@ def main():
     target_date = parse_date(args.date)
     print(f"正在处理 {target_date.strftime('%Y-%m-%d')} 的操作记录...")
     
-    # 解析各种历史记录
-    zsh_activities = parse_zsh_history(target_date)
-    print(f"找到 {len(zsh_activities)} 条终端命令记录")
+    # 并发解析各种历史记录
+    source_days = parse_sources(target_date, target_date, args)
     
-    safari_activities = parse_safari_history(target_date)
-    print(f"找到 {len(safari_activities)} 条Safari浏览记录")
-    
-    chrome_activities = parse_chrome_history(target_date)
-    print(f"找到 {len(chrome_activities)} 条Chrome浏览记录")
+    source_activities = []
+    for label, days in source_days:
+        activities = days[target_date.date()]
+        print(f"找到 {len(activities)} 条{label}记录")
+        source_activities.append(activities)
     
     # 合并所有活动记录
-    all_activities = merge_activities(zsh_activities, safari_activities, chrome_activities)
+    with span("merge") as merge_span:
+        all_activities = merge_activities(*source_activities)
+        merge_span.set(rows=len(all_activities))
     print(f"总计 {len(all_activities)} 条活动记录")
     
     # 使用大模型分析总结
-    summary = summarize_activities(all_activities)
+    with span("summarize", rows=len(all_activities)):
+        summary = summarize_activities(all_activities, output_format=args.format, llm=args.llm,
+                                       idle_gap=args.idle_gap_seconds)
     
     # 输出结果
     output_summary(summary, args.output)
     
     # TODO: 将结果记录到Google系统
 
-def analyze_json_file(json_path, output_path=None):
-    """分析已有的JSON文件"""
+def save_profile(tracer, path):
+    """把性能分析结果写入Chrome trace文件，并打印耗时最多的区间"""
+    print("\n性能分析（按墙钟时间排序）:")
+    print(tracer.summary())
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        print(f"从 {json_path} 加载了 {len(data)} 条活动记录")
-        
-        # TODO: 调用大模型分析已有的JSON记录
-        # 这里需要实现从JSON直接分析的功能
+        tracer.save(path)
+        print(f"性能分析已保存到 {path}（可以在chrome://tracing或https://ui.perfetto.dev中打开）")
+    except Exception as e:
+        print(f"保存性能分析时出错: {str(e)}")
+
+def create_llm_summarizer(args):
+    """根据命令行参数创建大模型总结器，没有提供接口地址时返回None"""
+    if not args.llm_url:
+        return None
+    backend = OpenAICompatibleBackend(args.llm_url, args.llm_model, max_workers=args.llm_concurrency)
+    cache = None
+    if not args.no_llm_cache:
+        try:
+            cache = LLMCache(args.llm_cache, max_bytes=args.llm_cache_size * 1024 * 1024)
+        except Exception as e:
+            print(f"打开大模型结果缓存时出错，不使用缓存: {str(e)}")
+    return MapReduceSummarizer(backend, chunk_tokens=args.chunk_tokens, concurrency=args.llm_concurrency, cache=cache,
+                               compact=not args.no_compaction, examples=args.llm_examples, seed=args.llm_seed)
+
+def active_sources(args):
+    """按配置文件和--sources选出启用并且找到了历史记录的数据源"""
+    sources = select_sources(load_sources_config(args.sources_config), args.sources)
+    if not sources:
+        print("警告：没有找到任何数据源的历史记录（--list-sources可以查看各数据源的路径）")
+    return sources
+
+def parse_sources(start_date, end_date, args):
+    """
+    在线程池中并发解析所有启用的数据源
+    
+    每个数据源的解析器模块只在用到时才导入。Chrome系浏览器的每个配置文件还会再分别
+    并发处理。某个数据源出错时，它的结果为空，不影响其他数据源。
+    
+    Returns:
+        list: (数据源名称, 按天划分的活动记录)的列表
+    """
+    if args.store:
+        return load_sources_from_store(start_date, end_date, args)
+    
+    sources = active_sources(args)
+    tasks = [
+        (spec.name, traced(f"parse.{spec.name}", partial(parse_source, spec, path, start_date, end_date,
+                                                         incremental=args.incremental, visit_level=args.chrome_visits,
+                                                         jobs=args.jobs), count_daily))
+        for spec, path in sources
+    ]
+    results = run_tasks(tasks, args.jobs, default=lambda name: partition_by_day([], start_date, end_date))
+    return [(spec.label, days) for (spec, _), days in zip(sources, results)]
+
+def count_daily(daily_activities):
+    """按天划分的活动记录的总数"""
+    return sum(len(activities) for activities in daily_activities.values())
+
+def load_sources_from_store(start_date, end_date, args):
+    """
+    把各数据源上次同步之后新增的记录写入本地活动存储，再按时间索引查询日期范围
+    
+    存储中的记录按活动类型查询，只查询启用的数据源产生的类型。
+    
+    Returns:
+        list: (活动类型名称, 按天划分的活动记录)的列表
+    """
+    sources = active_sources(args)
+    with open_activity_store(args.store) as store:
+        tasks = [
+            (spec.name, traced(f"sync.{spec.name}", partial(sync_source, spec, path, store, jobs=args.jobs), int))
+            for spec, path in sources
+        ]
+        synced = run_tasks(tasks, args.jobs, default=lambda name: 0)
+        print(f"同步了 {sum(synced)} 条新记录到活动存储 {args.store}（共 {store.count()} 条）")
         
-        print("暂不支持直接从JSON文件分析，此功能将在未来版本中实现")
-        return 1
+        range_start, range_end = range_bounds(start_date, end_date)
+        start_timestamp, end_timestamp = int(range_start.timestamp()), int(range_end.timestamp())
+        activity_types = [activity_type for activity_type in ActivityType
+                          if any(spec.activity_type == activity_type for spec, _ in sources)]
+        type_days = [
+            (activity_type,
+             partition_by_day(store.query(start_timestamp, end_timestamp, activity_type), start_date, end_date))
+            for activity_type in activity_types
+        ]
     
-    except Exception as e:
-        print(f"分析JSON文件时出错: {str(e)}")
+    # 存储中保存的是Chrome的每次访问，默认按天折叠为每个URL一条记录
+    if not args.chrome_visits and ActivityType.CHROME in activity_types:
+        # 只在用到Chrome系数据源时导入Chrome解析器
+        from parsers.chrome_parser import collapse_chrome_visits
+        type_days = [(activity_type, {day: collapse_chrome_visits(activities) for day, activities in days.items()}
+                      if activity_type == ActivityType.CHROME else days)
+                     for activity_type, days in type_days]
+    
+    return [(ACTIVITY_TYPE_LABELS.get(activity_type.value, activity_type.value), days)
+            for activity_type, days in type_days]
+
+def process_date_range(start_date, end_date, args):
+    """处理一个日期范围内的操作记录，每个数据源只读取一次"""
+    print(f"正在处理 {start_date.strftime('%Y-%m-%d')} 至 {end_date.strftime('%Y-%m-%d')} 的操作记录...")
+    
+    # 并发解析各种历史记录，结果已经按天划分
+    source_days = parse_sources(start_date, end_date, args)
+    for label, days in source_days:
+        print(f"找到 {count_daily(days)} 条{label}记录")
+    
+    # 按天合并所有活动记录
+    daily_activities = {}
+    with span("merge") as merge_span:
+        for day in partition_by_day([], start_date, end_date):
+            daily_activities[day] = merge_activities(*(days[day] for _, days in source_days))
+        merge_span.set(rows=sum(len(acts) for acts in daily_activities.values()))
+    print(f"总计 {sum(len(acts) for acts in daily_activities.values())} 条活动记录")
+    
+    # 生成每天的总结和整个范围的总结
+    with span("summarize", days=len(daily_activities)):
+        result = summarize_activity_range(daily_activities, output_format=args.format, llm=args.llm,
+                                          idle_gap=args.idle_gap_seconds)
+    
+    # 输出结果
+    output_range_summary(result, args.output)
+
+def analyze_json_file(json_paths, output_path=None, start_date=None, end_date=None, llm=None, idle_gap=DEFAULT_IDLE_GAP):
+    """
+    分析已保存的活动记录文件，不读取原始的历史记录
+    
+    文件可以是缩进的JSON数组或NDJSON（可以是压缩的），逐条惰性读取；
+    多个文件按时间归并后逐条交给总结步骤，内存占用与文件大小无关。
+    
+    Args:
+        json_paths (list): 文件路径或通配符
+        output_path (str, optional): 摘要输出路径
+        start_date (datetime, optional): 只分析不早于该日期的记录
+        end_date (datetime, optional): 只分析不晚于该日期（包含）的记录
+        llm (MapReduceSummarizer, optional): 大模型总结器，提供时会再读取一遍文件用于大模型总结
+        idle_gap (int): 划分工作时段的空闲间隔（秒）
+    """
+    paths = expand_activity_paths(json_paths)
+    if not paths:
+        print("错误：没有找到要分析的活动记录文件")
         return 1
+    
+    print(f"正在分析 {len(paths)} 个活动记录文件...")
+    
+    def open_activities():
+        # 每个文件中的记录已经按时间排序，逐条归并
+        activities = iter_merged_activities(*(iter_activity_file(path) for path in paths))
+        if start_date is not None:
+            range_start, range_end = range_bounds(start_date, end_date)
+            start_timestamp, end_timestamp = int(range_start.timestamp()), int(range_end.timestamp())
+            activities = (activity for activity in activities if start_timestamp <= activity.epoch <= end_timestamp)
+        return activities
+    
+    with span("summarize", files=len(paths)):
+        summary = summarize_activity_stream(open_activities(), idle_gap)
+        if llm is not None and summary.get("stats"):
+            summary.update(call_llm_api_for_summary(open_activities(), llm, summary))
+    output_summary(summary, output_path)
+    return 0
 
-def output_summary(summary, output_path=None):
-    """输出摘要结果"""
-    # 格式化输出
-    output = "\n===== 活动摘要 =====\n"
+def format_summary(summary, heading="活动摘要"):
+    """把摘要结果格式化为文本"""
+    output = f"\n===== {heading} =====\n"
     output += summary.get("summary", "无摘要") + "\n\n"
     
     if "categories" in summary and summary["categories"]:
@@ -96,14 +327,112 @@ def output_summary(summary, output_path=None):
                 output += f"- Safari浏览: {count}条\n"
             elif activity_type == "chrome":
                 output += f"- Chrome浏览: {count}条\n"
+            elif activity_type == "firefox":
+                output += f"- Firefox浏览: {count}条\n"
+    
+    if summary.get("top_commands"):
+        output += "- 常用命令: " + "，".join(f"{name}({count})" for name, count in summary["top_commands"][:5]) + "\n"
+    if summary.get("top_domains"):
+        output += "- 常访问网站: " + "，".join(f"{name}({count})" for name, count in summary["top_domains"][:5]) + "\n"
+    if summary.get("distinct"):
+        distinct = summary["distinct"]
+        output += f"- 不同的命令行{distinct['commands']}条，程序{distinct['programs']}个，网站{distinct['domains']}个\n"
+    
+    if summary.get("hourly"):
+        output += format_hourly(summary["hourly"])
     
-    if "time_range" in summary:
+    if summary.get("sessions"):
+        output += format_sessions(summary["sessions"])
+    elif "time_range" in summary:
         output += f"\n活动时间范围: {summary['time_range']}\n"
     
+    if summary.get("time", {}).get("total_seconds"):
+        output += format_time_attribution(summary["time"])
+    
+    if "llm" in summary:
+        llm_stats = summary["llm"]
+        output += f"\n大模型总结: {llm_stats['chunks']}个分块，{llm_stats['requests']}次请求，耗时{llm_stats['elapsed']}秒\n"
+        if "compaction" in llm_stats:
+            compaction = llm_stats["compaction"]
+            output += f"提示词压缩: {compaction['records']}条记录压缩为{compaction['entries']}条，压缩比{compaction['ratio']}\n"
+        if "cache" in llm_stats:
+            cache_stats = llm_stats["cache"]
+            output += (f"缓存: 命中{cache_stats['hits']}次，未命中{cache_stats['misses']}次，"
+                       f"整体总结{'命中' if cache_stats['summary_hit'] else '未命中'}\n")
+    
     if "output_file" in summary:
         output += f"\n详细记录已保存到: {summary['output_file']}\n"
     
-    # 输出结果
+    return output
+
+def format_hourly(hourly, width=30):
+    """把每小时的记录数量格式化为文本直方图，只列出有记录的小时"""
+    totals = [sum(row[hour] for row in hourly.values()) for hour in range(24)]
+    peak = max(totals) or 1
+    output = "\n每小时活动:\n"
+    for hour, total in enumerate(totals):
+        if total:
+            bar = "█" * max(1, round(total * width / peak))
+            output += f"  {hour:02d}点 {bar} {total}\n"
+    return output
+
+def format_sessions(sessions):
+    """把工作时段列表格式化为文本，跨天时显示日期"""
+    first_day = datetime.fromtimestamp(sessions[0]["start"]).date()
+    last_day = datetime.fromtimestamp(sessions[-1]["end"]).date()
+    time_format = "%H:%M" if first_day == last_day else "%m-%d %H:%M"
+    
+    output = f"\n工作时段（共{len(sessions)}个）:\n"
+    for session in sessions[:MAX_SESSIONS_SHOWN]:
+        start = datetime.fromtimestamp(session["start"]).strftime(time_format)
+        end = datetime.fromtimestamp(session["end"]).strftime(time_format)
+        active = format_duration(session["active_seconds"])
+        dominant = ACTIVITY_TYPE_LABELS.get(session["activity_type"], session["activity_type"])
+        if session["domain"]:
+            dominant += f"，最常访问{session['domain']}"
+        output += f"- {start} - {end}  活跃{active}，{session['events']}条记录，主要是{dominant}\n"
+    if len(sessions) > MAX_SESSIONS_SHOWN:
+        output += f"- ……其余{len(sessions) - MAX_SESSIONS_SHOWN}个时段省略\n"
+    return output
+
+def format_duration(seconds):
+    """把秒数格式化为“X小时Y分钟”"""
+    hours, minutes = divmod(int(seconds) // 60, 60)
+    return f"{hours}小时{minutes}分钟" if hours else f"{minutes}分钟"
+
+def format_time_attribution(time_stats):
+    """把时间去向格式化为文本"""
+    output = f"\n时间去向（共{format_duration(time_stats['total_seconds'])}）:\n"
+    by_type = sorted(time_stats["by_type"].items(), key=lambda item: -item[1])
+    output += "- 按类型: " + "，".join(f"{ACTIVITY_TYPE_LABELS.get(name, name)} {format_duration(seconds)}"
+                                       for name, seconds in by_type) + "\n"
+    for key, label in (("projects", "项目"), ("commands", "命令"), ("domains", "网站")):
+        if time_stats[key]:
+            output += f"- 按{label}: " + "，".join(f"{name} {format_duration(seconds)}"
+                                                  for name, seconds in time_stats[key][:5]) + "\n"
+    return output
+
+def output_summary(summary, output_path=None):
+    """输出摘要结果"""
+    with span("output.format"):
+        output = format_summary(summary)
+    write_output(output, output_path)
+
+def output_range_summary(result, output_path=None):
+    """输出日期范围的摘要结果：每天一段，最后是整个范围的汇总"""
+    with span("output.format", days=len(result["days"])):
+        output = ""
+        for day, summary in result["days"].items():
+            output += format_summary(summary, f"{day} 活动摘要")
+        output += format_summary(result["combined"], "整个范围活动摘要")
+    write_output(output, output_path)
+
+def write_output(output, output_path=None):
+    """把格式化后的文本写入文件或标准输出"""
+    with span("output.write", chars=len(output)):
+        _write_output(output, output_path)
+
+def _write_output(output, output_path):
     if output_path:
         try:
             with open(output_path, 'w', encoding='utf-8') as f:
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sys
+from datetime import datetime
+
+from parsers.shell_history import ShellHistoryFormat, iter_record_chunks, parse_history_range, sync_history_to_store
+
+# bash历史记录文件的默认路径
+BASH_HISTORY_PATH = os.path.expanduser("~/.bash_history")
+
+# 写入活动存储时bash历史记录的数据源名称
+BASH_STORE_SOURCE = "bash_history"
+
+# 设置了HISTTIMEFORMAT时，每条命令之前有一行"#<时间戳>"
+TIMESTAMP_LINE = re.compile(rb'#(\d+)\n')
+
+# 按时间戳行切分记录；时间戳行之后直到下一个时间戳行的内容都属于同一条命令
+# （启用lithist时多行命令按原样保存）
+RECORD_SPLIT = re.compile(rb'^#(\d+)\n', re.MULTILINE)
+
+# 文件末尾的时间戳行，说明对应的命令还没有写入
+TRAILING_TIMESTAMP = re.compile(rb'(?:^|\n)#\d+\n\Z')
+
+# 一条记录（包括lithist保存的多行命令）的最大长度。没有设置HISTTIMEFORMAT的会话
+# 追加到同一个文件时，最后一个时间戳之后会跟着没有时间戳的行；超过这个长度时
+# 只把第一行作为命令，之后的行和第一个时间戳之前的行一样跳过
+MAX_RECORD_BYTES = 64 * 1024
+
+
+def bash_record_end(data):
+    """
+    最后一个时间戳行的行首，之前的记录都已完整
+
+    数据中没有时间戳行时，说明这些行都没有时间戳（会被跳过），可以在最后一个
+    换行符处切开。最后一个时间戳行之后的内容超过MAX_RECORD_BYTES时也在最后一个
+    换行符处切开，不再等待下一个时间戳，每块不超过一次读取加一条记录的长度。
+    """
+    start = -1
+    pos = len(data)
+    while True:
+        pos = data.rfind(b'\n#', 0, pos)
+        if pos < 0:
+            break
+        if TIMESTAMP_LINE.match(data, pos + 1):
+            start = pos + 1
+            break
+    if start < 0 and TIMESTAMP_LINE.match(data):
+        start = 0
+    if start >= 0 and len(data) - start <= MAX_RECORD_BYTES:
+        return start
+    return data.rfind(b'\n') + 1
+
+
+def is_complete_bash_chunk(chunk):
+    """块以换行符结尾，并且最后一行不是还没有对应命令的时间戳行"""
+    return chunk.endswith(b'\n') and TRAILING_TIMESTAMP.search(chunk) is None
+
+
+def _iter_record_parts(chunk):
+    """逐条产出块中记录的(时间戳行的位置, 时间戳, 命令部分)，用于需要记录偏移的场合"""
+    matches = list(RECORD_SPLIT.finditer(chunk))
+    for index, match in enumerate(matches):
+        body_end = matches[index + 1].start() if index + 1 < len(matches) else len(chunk)
+        yield match.start(), match[1], chunk[match.end():body_end]
+
+
+def iter_bash_records(chunks, start_timestamp=None, end_timestamp=None, with_offsets=False):
+    """
+    在原始字节块上解析带时间戳的bash历史记录
+
+    第一个时间戳行之前的行没有时间戳，会被跳过；时间戳行之后的内容超过
+    MAX_RECORD_BYTES时只有第一行是命令，其余没有时间戳的行也被跳过。时间窗口以
+    整数比较，窗口外的记录不会被解码。
+
+    Args:
+        chunks (iterable): 在记录边界处切开的原始字节块
+        start_timestamp (int, optional): 开始时间戳（包含）
+        end_timestamp (int, optional): 结束时间戳（包含）
+        with_offsets (bool): 是否在每条记录之前加上它相对第一块开头的字节偏移
+
+    Yields:
+        tuple: (时间戳, None, 命令)，bash不记录执行时长；
+            with_offsets为True时是(偏移, 时间戳, None, 命令)
+    """
+    low = start_timestamp if start_timestamp is not None else -1
+    high = end_timestamp if end_timestamp is not None else float('inf')
+    split = RECORD_SPLIT.split
+    base = 0
+
+    for chunk in chunks:
+        if with_offsets:
+            records = _iter_record_parts(chunk)
+        else:
+            parts = split(chunk)
+            records = ((None, parts[index], parts[index + 1]) for index in range(1, len(parts) - 1, 2))
+        for position, timestamp, body in records:
+            timestamp = int(timestamp)
+            if low <= timestamp <= high:
+                if len(body) > MAX_RECORD_BYTES:
+                    body = body[:body.find(b'\n')]
+                command = body.decode('utf-8', errors='replace').rstrip()
+                if command:
+                    if with_offsets:
+                        yield base + position, timestamp, None, command
+                    else:
+                        yield timestamp, None, command
+        base += len(chunk)
+
+
+BASH_FORMAT = ShellHistoryFormat("bash", BASH_STORE_SOURCE, bash_record_end, iter_bash_records,
+                                 is_complete_bash_chunk)
+
+
+def has_bash_timestamps(file_path):
+    """
+    判断bash历史文件中是否存在带时间戳的记录，找到第一个时间戳行就停止读取
+
+    Args:
+        file_path (str): bash_history文件路径
+
+    Returns:
+        bool: 存在带时间戳的记录时返回True
+    """
+    return any(RECORD_SPLIT.search(chunk) for chunk in iter_record_chunks(file_path, bash_record_end))
+
+
+def print_timestamp_hint():
+    """提示启用HISTTIMEFORMAT"""
+    print("警告: bash历史记录没有时间戳，请在~/.bashrc中添加以下设置：")
+    print("  HISTTIMEFORMAT='%F %T '")
+    print("  HISTSIZE=1000000")
+    print("  HISTFILESIZE=1000000")
+    print("  shopt -s histappend")
+
+
+def parse_bash_history(target_date, incremental=False, state_dir=None, file_path=None):
+    """
+    解析~/.bash_history文件，提取指定日期的命令记录
+
+    Args:
+        target_date (datetime): 目标日期
+        incremental (bool): 是否使用增量模式，只解析上次运行之后新增的内容
+        state_dir (str, optional): 增量模式的状态目录，默认为~/.wihd/bash_history
+        file_path (str, optional): bash_history文件路径，默认为~/.bash_history
+
+    Returns:
+        list: 包含当天命令活动的列表
+    """
+    daily_activities = parse_bash_history_range(target_date, target_date, incremental, state_dir, file_path)
+    return daily_activities[target_date.date()]
+
+
+def parse_bash_history_range(start_date, end_date, incremental=False, state_dir=None, file_path=None):
+    """
+    流式读取~/.bash_history，提取日期范围内的命令记录并按天划分
+
+    Args:
+        start_date (datetime): 开始日期
+        end_date (datetime): 结束日期（包含）
+        incremental (bool): 是否使用增量模式，只解析上次运行之后新增的内容
+        state_dir (str, optional): 增量模式的状态目录，默认为~/.wihd/bash_history
+        file_path (str, optional): bash_history文件路径，默认为~/.bash_history
+
+    Returns:
+        dict: date到当天命令活动的映射，每天的记录是按时间排序的ActivityBatch
+    """
+    file_path = file_path or BASH_HISTORY_PATH
+    daily_activities = parse_history_range(BASH_FORMAT, file_path, start_date, end_date, incremental, state_dir)
+    if (os.path.exists(file_path) and not any(len(activities) for activities in daily_activities.values())
+            and not has_bash_timestamps(file_path)):
+        print_timestamp_hint()
+    return daily_activities
+
+
+def sync_bash_history_to_store(store, file_path=None):
+    """
+    把bash_history中上次同步之后新增的命令写入活动存储
+
+    高水位是已经写入的字节偏移，与zsh相同；文件被截断或重写时从头重新写入。
+
+    Args:
+        store (ActivityStore): 活动存储
+        file_path (str, optional): bash_history文件路径，默认为~/.bash_history
+
+    Returns:
+        int: 写入的记录数量
+    """
+    file_path = file_path or BASH_HISTORY_PATH
+    if not os.path.exists(file_path):
+        print(f"警告: bash历史记录文件 {file_path} 不存在")
+        return 0
+
+    if not has_bash_timestamps(file_path):
+        print_timestamp_hint()
+        return 0
+
+    return sync_history_to_store(store, file_path, BASH_FORMAT)
+
+
+def test_parse_bash_history(date_str=None):
+    """
+    测试函数，用于调试
+
+    Args:
+        date_str (str, optional): 日期字符串，格式为YYYYMMDD。如果不提供，则使用当天日期。
+    """
+    if date_str:
+        try:
+            target_date = datetime.strptime(date_str, '%Y%m%d')
+        except ValueError:
+            print(f"错误：日期格式应为YYYYMMDD，收到的是 '{date_str}'")
+            return
+    else:
+        target_date = datetime.now()
+
+    print(f"正在解析 {target_date.strftime('%Y-%m-%d')} 的bash历史记录...")
+    activities = parse_bash_history(target_date)
+
+    print(f"找到 {len(activities)} 条终端命令记录:")
+    for idx, activity in enumerate(activities[:20], 1):
+        print(f"{idx}. [{activity.timestamp.strftime('%H:%M:%S')}] {activity.content[:80]}{'...' if len(activity.content) > 80 else ''}")
+
+    if len(activities) > 20:
+        print(f"... 以及其他 {len(activities) - 20} 条记录")
+
+    return activities
+
+
+if __name__ == "__main__":
+    # 直接运行此文件时测试功能
+    test_parse_bash_history(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from utils.profiler import span
+
+# 浏览器持有锁时等待的秒数，超时后改用其他方式读取
+BUSY_TIMEOUT_SECONDS = 1.0
+
+# 改用在线备份时等待读锁的秒数
+SNAPSHOT_TIMEOUT_SECONDS = 5.0
+
+
+class BrowserDatabaseError(Exception):
+    """浏览器历史数据库无法读取（通常是缺少完全磁盘访问权限）"""
+
+
+def _database_uri(db_path, **params):
+    """构造只读打开数据库的SQLite URI"""
+    query = "&".join(f"{key}={value}" for key, value in params.items())
+    return f"file:{quote(os.path.abspath(db_path))}?{query}"
+
+
+def _connect(db_path, **params):
+    """以URI方式打开数据库，并读取一次schema以尽早暴露锁和权限问题"""
+    conn = sqlite3.connect(_database_uri(db_path, **params), uri=True, timeout=BUSY_TIMEOUT_SECONDS)
+    try:
+        conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+
+def _is_locked(error):
+    """判断错误是否由于数据库被其他进程锁定"""
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def connect_browser_db(db_path):
+    """
+    以只读方式打开浏览器历史数据库，不复制数据库文件
+
+    依次尝试：
+    1. mode=ro直接只读打开，读取时包含WAL中尚未合并的最新记录；
+    2. 数据库被浏览器锁定时，等待读锁后用SQLite在线备份API把一致的快照复制到内存数据库；
+    3. 仍然无法获得读锁时，用immutable=1忽略锁读取主数据库文件（此时无法包含WAL内容）。
+
+    Args:
+        db_path (str): 数据库文件路径
+
+    Returns:
+        sqlite3.Connection: 只读连接，调用方负责关闭
+
+    Raises:
+        BrowserDatabaseError: 数据库无法读取
+    """
+    if not os.path.exists(db_path):
+        raise BrowserDatabaseError(f"数据库不存在: {db_path}")
+
+    try:
+        return _connect(db_path, mode="ro")
+    except sqlite3.Error as e:
+        if not _is_locked(e):
+            raise BrowserDatabaseError(str(e)) from e
+
+    # 数据库被锁定，等待更长时间获取读锁，然后通过在线备份把一致的快照复制到内存中，
+    # 这样只在复制期间占用读锁。先在源连接上开启读事务，否则backup()遇到锁会无限重试
+    try:
+        source = sqlite3.connect(_database_uri(db_path, mode="ro"), uri=True, timeout=SNAPSHOT_TIMEOUT_SECONDS)
+        try:
+            source.execute("BEGIN")
+            source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+            snapshot = sqlite3.connect(":memory:")
+            try:
+                with span("browser_db.snapshot", path=db_path):
+                    source.backup(snapshot)
+            except sqlite3.Error:
+                snapshot.close()
+                raise
+            return snapshot
+        finally:
+            source.close()
+    except sqlite3.Error as e:
+        if not _is_locked(e):
+            raise BrowserDatabaseError(str(e)) from e
+
+    # 最后手段：忽略锁读取主数据库文件
+    print(f"警告：数据库 {db_path} 被锁定，将忽略锁读取，可能缺少最近的记录")
+    try:
+        return _connect(db_path, mode="ro", immutable=1)
+    except sqlite3.Error as e:
+        raise BrowserDatabaseError(str(e)) from e
+
+
+@contextmanager
+def open_browser_db(db_path):
+    """
+    以只读方式打开浏览器历史数据库的上下文管理器，退出时总会关闭连接
+
+    Args:
+        db_path (str): 数据库文件路径
+
+    Yields:
+        sqlite3.Connection: 只读连接
+
+    Raises:
+        BrowserDatabaseError: 数据库无法读取
+    """
+    with span("browser_db.open", path=db_path):
+        conn = connect_browser_db(db_path)
+    try:
+        yield conn
+    finally:
+        conn.close()
@@ -2,42 +2,117 @@
 # -*- coding: utf-8 -*-
 
 import os
-import sqlite3
-import subprocess
-import shutil
 import glob
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import partial
+from types import MappingProxyType
 from utils.models import Activity, ActivityType
+from parsers.browser_db import open_browser_db, BrowserDatabaseError
+from utils.date_range import range_bounds, partition_by_day
+from utils.concurrency import run_tasks
+from utils.time_merger import iter_merged_activities
+from utils.activity_store import STORE_BATCH_SIZE
+from utils.profiler import span
 
-def parse_chrome_history(target_date):
+# Chrome中的时间是从1601年1月1日开始的微秒数，1601年到1970年相差11644473600秒
+CHROME_EPOCH_OFFSET = 11644473600
+
+# visits表中transition字段的低8位是核心跳转类型
+CHROME_CORE_TRANSITION_MASK = 0xFF
+CHROME_CORE_TRANSITIONS = {
+    0: "link",
+    1: "typed",
+    2: "auto_bookmark",
+    3: "auto_subframe",
+    4: "manual_subframe",
+    5: "generated",
+    6: "auto_toplevel",
+    7: "form_submit",
+    8: "reload",
+    9: "keyword",
+    10: "keyword_generated",
+}
+
+# Chrome默认的用户数据目录
+CHROME_BASE_DIR = os.path.expanduser("~/Library/Application Support/Google/Chrome")
+
+# 按访问提取记录时，fetchmany每批读取的行数
+FETCH_BATCH_SIZE = 1000
+
+# 每个URL只保留最后一次访问时的查询。urls.last_visit_time上没有索引，先通过
+# visits_time_index找出时间范围内有访问的URL，再按最后访问时间过滤
+URL_LEVEL_QUERY = """
+SELECT last_visit_time,
+       url,
+       title
+FROM urls
+WHERE urls.id IN (SELECT url FROM visits WHERE visit_time >= ? AND visit_time < ?)
+  AND last_visit_time >= ? AND last_visit_time < ?
+ORDER BY last_visit_time
+"""
+
+def datetime_to_chrome_time(dt):
+    """把本地时间转换为Chrome的原始时间（1601年起的微秒数）"""
+    return int((dt.timestamp() + CHROME_EPOCH_OFFSET) * 1000000)
+
+def chrome_time_to_datetime(chrome_time):
+    """把Chrome的原始时间（1601年起的微秒数）转换为本地时间"""
+    return datetime.fromtimestamp(chrome_time / 1000000 - CHROME_EPOCH_OFFSET)
+
+def chrome_time_to_epoch(chrome_time):
+    """把Chrome的原始时间（1601年起的微秒数）转换为整数Unix时间戳"""
+    return chrome_time // 1000000 - CHROME_EPOCH_OFFSET
+
+def parse_chrome_history(target_date, visit_level=False, jobs=1, base_dir=None, browser=None):
     """
     解析Chrome的浏览历史记录
     
     Args:
         target_date (datetime): 目标日期
+        visit_level (bool): 是否按每次访问提取记录，而不是每个URL只保留最后一次访问
+        jobs (int): 并发处理配置文件的最大数量
+        base_dir (str, optional): Chrome的用户数据目录，默认为CHROME_BASE_DIR
+        browser (str, optional): 其他Chromium系浏览器的名称，作为配置文件名称的前缀
     
     Returns:
         list: 包含当天Chrome浏览活动的列表
     """
-    activities = []
+    daily_activities = parse_chrome_history_range(target_date, target_date, visit_level, jobs, base_dir, browser)
+    return daily_activities[target_date.date()]
+
+def parse_chrome_history_range(start_date, end_date, visit_level=False, jobs=1, base_dir=None, browser=None):
+    """
+    一次查询每个Chrome配置文件的浏览历史记录，提取日期范围内的记录并按天划分
     
-    # 计算目标日期的Unix时间戳（微秒级）
-    # Chrome使用的是从1601年1月1日开始的微秒数
-    # 首先计算目标日期的边界时间
-    start_date = datetime(target_date.year, target_date.month, target_date.day, 0, 0, 0)
-    end_date = datetime(target_date.year, target_date.month, target_date.day, 23, 59, 59)
+    Chromium、Brave、Edge等浏览器的历史数据库与Chrome相同，指定它们的用户数据目录和
+    browser即可读取，记录的活动类型仍为Chrome浏览。
+    
+    Args:
+        start_date (datetime): 开始日期
+        end_date (datetime): 结束日期（包含）
+        visit_level (bool): 是否按每次访问提取记录，而不是每个URL只保留最后一次访问
+        jobs (int): 并发处理配置文件的最大数量
+        base_dir (str, optional): Chrome的用户数据目录，默认为CHROME_BASE_DIR
+        browser (str, optional): 其他Chromium系浏览器的名称，作为配置文件名称的前缀
+    
+    Returns:
+        dict: date到当天Chrome浏览活动列表的映射
+    """
+    # 计算日期范围的边界时间
+    range_start, range_end = range_bounds(start_date, end_date)
     
     # Chrome基础目录
-    chrome_base_dir = os.path.expanduser("~/Library/Application Support/Google/Chrome")
+    chrome_base_dir = base_dir or CHROME_BASE_DIR
     
     # 获取所有可能的配置文件目录
-    profile_dirs = find_chrome_profiles(chrome_base_dir)
+    profile_dirs = find_chrome_profiles(chrome_base_dir, browser)
     
     if not profile_dirs:
         print("未找到Chrome配置文件目录")
-        return activities
+        return partition_by_day([], start_date, end_date)
     
-    # 依次处理每个配置文件
+    # 为每个配置文件创建一个任务
+    tasks = []
     for profile_name, profile_path in profile_dirs.items():
         # Chrome历史数据库路径
         chrome_db_path = os.path.join(profile_path, "History")
@@ -50,40 +125,46 @@ def parse_chrome_history(target_date):
         print(f"正在处理Chrome配置文件 '{profile_name}' 的历史记录...")
         
         # 读取此配置文件的历史记录
-        profile_activities = parse_chrome_profile_history(chrome_db_path, start_date, end_date, profile_name)
-        activities.extend(profile_activities)
+        tasks.append((f"Chrome配置文件 {profile_name}", partial(
+            parse_chrome_profile_history, chrome_db_path, range_start, range_end, profile_name, visit_level)))
     
-    # 按时间戳排序
-    activities.sort(key=lambda x: x.timestamp)
-    return activities
+    # 并发处理所有配置文件，某个配置文件失败不影响其他配置文件
+    profile_results = run_tasks(tasks, jobs, default=lambda name: [])
+    
+    # 每个配置文件的结果已经按时间排序，归并后按天划分
+    activities = iter_merged_activities(*profile_results)
+    return partition_by_day(activities, start_date, end_date)
 
-def find_chrome_profiles(chrome_base_dir):
+def find_chrome_profiles(chrome_base_dir, browser=None):
     """
     查找所有Chrome配置文件目录
     
     Args:
         chrome_base_dir (str): Chrome基础目录
+        browser (str, optional): 其他Chromium系浏览器的名称，配置文件名称为"浏览器/配置文件"，
+                                 这样不同浏览器的同名配置文件在来源和活动存储中互不冲突
     
     Returns:
         dict: 配置文件名到路径的映射
     """
     profiles = {}
+    prefix = f"{browser}/" if browser else ""
     
     # 检查Default配置文件
     default_path = os.path.join(chrome_base_dir, "Default")
     if os.path.exists(default_path) and os.path.isdir(default_path):
-        profiles["Default"] = default_path
+        profiles[prefix + "Default"] = default_path
     
     # 检查其他Profile配置文件
     profile_pattern = os.path.join(chrome_base_dir, "Profile *")
-    for profile_dir in glob.glob(profile_pattern):
+    for profile_dir in sorted(glob.glob(profile_pattern)):
         if os.path.isdir(profile_dir):
-            profile_name = os.path.basename(profile_dir)
+            profile_name = prefix + os.path.basename(profile_dir)
             profiles[profile_name] = profile_dir
     
     return profiles
 
-def parse_chrome_profile_history(chrome_db_path, start_date, end_date, profile_name):
+def parse_chrome_profile_history(chrome_db_path, start_date, end_date, profile_name, visit_level=False):
     """
     解析单个Chrome配置文件的历史记录
     
@@ -92,74 +173,254 @@ def parse_chrome_profile_history(chrome_db_path, start_date, end_date, profile_n
         start_date (datetime): 开始日期
         end_date (datetime): 结束日期
         profile_name (str): 配置文件名称
+        visit_level (bool): 是否按每次访问提取记录
     
     Returns:
-        list: 包含当天Chrome浏览活动的列表
+        list: 包含当天Chrome浏览活动的列表，按时间排序
     """
+    with span("chrome.profile", profile=profile_name, visit_level=visit_level) as profile_span:
+        activities = _parse_chrome_profile_history(chrome_db_path, start_date, end_date, profile_name, visit_level)
+        profile_span.set(rows=len(activities))
+    return activities
+
+def _parse_chrome_profile_history(chrome_db_path, start_date, end_date, profile_name, visit_level):
     activities = []
     
-    # 由于Chrome可能正在使用数据库，先复制数据库到临时位置
-    temp_db_path = f"/tmp/chrome_history_{profile_name}_temp.db"
-    try:
-        shutil.copy2(chrome_db_path, temp_db_path)
-    except Exception as e:
-        print(f"\n访问Chrome配置文件 '{profile_name}' 的历史记录需要特殊权限")
-        print("由于macOS的安全机制，需要授予终端访问浏览器历史数据的权限")
-        print("请在系统偏好设置 -> 安全性与隐私 -> 隐私 -> 完全磁盘访问权限中添加终端应用")
-        print("或者，您可以手动复制Chrome历史文件:")
-        print(f"cp \"{chrome_db_path}\" ~/Downloads/")
-        print("然后更新代码以从下载目录读取文件\n")
-        return activities
-    
-    # 查询历史记录
+    # 以只读方式直接打开数据库，不复制数据库文件
     try:
-        conn = sqlite3.connect(temp_db_path)
-        cursor = conn.cursor()
-        
-        # Chrome中的时间是从1601年1月1日开始的微秒数
-        # 转换为Unix时间戳需要减去11644473600000000（1601年到1970年的微秒数）再除以1000000
-        query = """
-        SELECT datetime((last_visit_time/1000000)-11644473600, 'unixepoch', 'localtime') as visit_date,
-               url,
-               title
-        FROM urls
-        WHERE datetime((last_visit_time/1000000)-11644473600, 'unixepoch', 'localtime') BETWEEN ? AND ?
-        ORDER BY last_visit_time DESC
-        """
-        
-        cursor.execute(query, (start_date.strftime("%Y-%m-%d %H:%M:%S"), 
-                              end_date.strftime("%Y-%m-%d %H:%M:%S")))
-        results = cursor.fetchall()
+        if visit_level:
+            activities.extend(iter_chrome_profile_visits(chrome_db_path, start_date, end_date, profile_name))
+            print(f"从Chrome配置文件 '{profile_name}' 中找到 {len(activities)} 次访问记录")
+            return activities
         
-        for visit_date_str, url, title in results:
-            # 解析时间字符串为datetime对象
-            visit_date = datetime.strptime(visit_date_str, "%Y-%m-%d %H:%M:%S")
+        with open_browser_db(chrome_db_path) as conn:
+            cursor = conn.cursor()
             
-            # 截取URL前100个字符
-            truncated_url = url[:100] if url else url
-            
-            activity = Activity(
-                timestamp=visit_date,
-                activity_type=ActivityType.CHROME,
-                content=truncated_url,
-                source=f"chrome_history_{profile_name}",
-                title=title,
-                metadata={"profile": profile_name}
-            )
-            activities.append(activity)
+            # 在Python中把时间范围换算为Chrome的原始时间，直接比较裸列，
+            # 避免SQLite对每一行调用datetime()
+            start_time = datetime_to_chrome_time(start_date)
+            end_time = datetime_to_chrome_time(end_date + timedelta(seconds=1))
+            with span("chrome.query", profile=profile_name) as query_span:
+                cursor.execute(URL_LEVEL_QUERY, (start_time, end_time, start_time, end_time))
+                results = cursor.fetchall()
+                query_span.set(rows=len(results))
         
-        conn.close()
+        # 同一配置文件的记录共享来源字符串和元数据
+        source = f"chrome_history_{profile_name}"
+        metadata = MappingProxyType({"profile": profile_name})
         
-        # 清理临时文件
-        os.remove(temp_db_path)
+        with span("chrome.build", profile=profile_name, rows=len(results)):
+            for last_visit_time, url, title in results:
+                # 截取URL前100个字符
+                truncated_url = url[:100] if url else url
+                
+                activity = Activity(
+                    timestamp=chrome_time_to_epoch(last_visit_time),
+                    activity_type=ActivityType.CHROME,
+                    content=truncated_url,
+                    source=source,
+                    title=title,
+                    metadata=metadata
+                )
+                activities.append(activity)
         
         print(f"从Chrome配置文件 '{profile_name}' 中找到 {len(activities)} 条浏览记录")
-        
+    
+    except BrowserDatabaseError as e:
+        print(f"\n访问Chrome配置文件 '{profile_name}' 的历史记录需要特殊权限: {str(e)}")
+        print("由于macOS的安全机制，需要授予终端访问浏览器历史数据的权限")
+        print("请在系统偏好设置 -> 安全性与隐私 -> 隐私 -> 完全磁盘访问权限中添加终端应用")
+        print("或者，您可以手动复制Chrome历史文件:")
+        print(f"cp \"{chrome_db_path}\" ~/Downloads/")
+        print("然后更新代码以从下载目录读取文件\n")
+    
     except Exception as e:
         print(f"解析Chrome配置文件 '{profile_name}' 的历史记录时出错: {str(e)}")
     
     return activities
 
+def iter_chrome_profile_visits(chrome_db_path, start_date, end_date, profile_name, batch_size=FETCH_BATCH_SIZE):
+    """
+    按时间顺序逐次产出单个Chrome配置文件的访问记录
+    
+    与只查询urls.last_visit_time不同，这里把visits表与urls表连接，同一URL
+    在一天内的每次访问都会产生一条记录。结果通过fetchmany分批读取，内存
+    占用与访问记录的总数无关。
+    
+    Args:
+        chrome_db_path (str): Chrome历史数据库路径
+        start_date (datetime): 开始时间
+        end_date (datetime): 结束时间（包含）
+        profile_name (str): 配置文件名称
+        batch_size (int): 每批读取的行数
+    
+    Yields:
+        Activity: 访问记录，metadata中包含跳转类型transition和停留秒数visit_duration
+    
+    Raises:
+        BrowserDatabaseError: 数据库无法读取
+    """
+    # visits.visit_time上有索引，直接比较原始时间
+    query = """
+    SELECT visits.visit_time,
+           urls.url,
+           urls.title,
+           visits.transition,
+           visits.visit_duration
+    FROM visits
+    INNER JOIN urls ON urls.id = visits.url
+    WHERE visits.visit_time >= ? AND visits.visit_time < ?
+    ORDER BY visits.visit_time
+    """
+    source = f"chrome_history_{profile_name}"
+    
+    with open_browser_db(chrome_db_path) as conn:
+        cursor = conn.execute(query, (datetime_to_chrome_time(start_date),
+                                      datetime_to_chrome_time(end_date + timedelta(seconds=1))))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            
+            for visit_time, url, title, transition, visit_duration in rows:
+                yield chrome_visit_activity(visit_time, url, title, transition, visit_duration, source, profile_name)
+
+def chrome_visit_activity(visit_time, url, title, transition, visit_duration, source, profile_name):
+    """由visits表与urls表连接后的一行创建访问记录"""
+    return Activity(
+        timestamp=chrome_time_to_epoch(visit_time),
+        activity_type=ActivityType.CHROME,
+        content=url[:100] if url else url,
+        source=source,
+        title=title,
+        metadata={
+            "profile": profile_name,
+            "transition": chrome_transition_name(transition),
+            "visit_duration": visit_duration / 1000000
+        }
+    )
+
+def sync_chrome_history_to_store(store, jobs=1, base_dir=None, browser=None):
+    """
+    把所有Chrome配置文件中上次同步之后新增的访问记录写入活动存储
+    
+    Args:
+        store (ActivityStore): 活动存储
+        jobs (int): 并发处理配置文件的最大数量
+        base_dir (str, optional): Chrome的用户数据目录，默认为CHROME_BASE_DIR
+        browser (str, optional): 其他Chromium系浏览器的名称，作为配置文件名称的前缀
+    
+    Returns:
+        int: 写入的记录数量
+    """
+    chrome_base_dir = base_dir or CHROME_BASE_DIR
+    profile_dirs = find_chrome_profiles(chrome_base_dir, browser)
+    
+    tasks = []
+    for profile_name, profile_path in profile_dirs.items():
+        chrome_db_path = os.path.join(profile_path, "History")
+        if os.path.exists(chrome_db_path):
+            tasks.append((f"Chrome配置文件 {profile_name}", partial(
+                sync_chrome_profile_to_store, store, chrome_db_path, profile_name)))
+    
+    return sum(run_tasks(tasks, jobs, default=lambda name: 0))
+
+def sync_chrome_profile_to_store(store, chrome_db_path, profile_name, batch_size=STORE_BATCH_SIZE):
+    """
+    把单个Chrome配置文件中visits.id大于高水位的访问记录写入活动存储
+    
+    每批记录与新的高水位在同一个事务中提交，中途失败时下次从最后提交的位置继续。
+    visits.id同时是记录标识。Chrome重建数据库后visits.id会变小，此时从新的标识起点
+    从头重新同步，与之前写入的相同访问合并。
+    
+    Args:
+        store (ActivityStore): 活动存储
+        chrome_db_path (str): Chrome历史数据库路径
+        profile_name (str): 配置文件名称
+        batch_size (int): 每次提交的记录数量
+    
+    Returns:
+        int: 写入的记录数量
+    """
+    source = f"chrome_history_{profile_name}"
+    last_id, state = store.get_mark(source)
+    
+    # visits.id是自增主键，按id顺序读取新增的访问
+    query = """
+    SELECT visits.id,
+           visits.visit_time,
+           urls.url,
+           urls.title,
+           visits.transition,
+           visits.visit_duration
+    FROM visits
+    INNER JOIN urls ON urls.id = visits.url
+    WHERE visits.id > ?
+    ORDER BY visits.id
+    """
+    count = 0
+    try:
+        with open_browser_db(chrome_db_path) as conn:
+            max_id = conn.execute("SELECT max(id) FROM visits").fetchone()[0] or 0
+            if max_id < last_id or not state:
+                last_id = 0
+                id_base = store.next_record_id(source)
+            else:
+                id_base = state['id_base']
+            
+            cursor = conn.execute(query, (last_id,))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                activities = [chrome_visit_activity(*row[1:], source, profile_name) for row in rows]
+                count += store.record(source, activities, [id_base + row[0] for row in rows], rows[-1][0],
+                                      {'id_base': id_base}, id_base)
+    except BrowserDatabaseError as e:
+        print(f"访问Chrome配置文件 '{profile_name}' 的历史记录需要特殊权限: {str(e)}")
+    
+    if count:
+        print(f"从Chrome配置文件 '{profile_name}' 同步了 {count} 次访问记录")
+    return count
+
+def collapse_chrome_visits(activities):
+    """
+    把访问记录折叠为每个URL一条记录，保留最后一次访问
+    
+    用于从活动存储读取时得到与默认的按URL提取相同形式的结果。
+    
+    Args:
+        activities (iterable): 按时间排序的访问记录
+    
+    Returns:
+        list: 按时间排序的活动记录，metadata包含配置文件名称和最后一次访问的停留秒数（有记录时）
+    """
+    latest = {}
+    profile_metadata = {}
+    for activity in activities:
+        key = (activity.source, activity.content)
+        latest.pop(key, None)
+        latest[key] = activity
+    
+    collapsed = []
+    for activity in latest.values():
+        profile = activity.metadata.get("profile")
+        visit_duration = activity.metadata.get("visit_duration")
+        if visit_duration:
+            # 保留停留时间，用于计算时间去向
+            metadata = MappingProxyType({"profile": profile, "visit_duration": visit_duration})
+        else:
+            if profile not in profile_metadata:
+                profile_metadata[profile] = MappingProxyType({"profile": profile})
+            metadata = profile_metadata[profile]
+        collapsed.append(Activity(activity.epoch, ActivityType.CHROME, activity.content, activity.source,
+                                  metadata=metadata, title=activity.title))
+    return collapsed
+
+def chrome_transition_name(transition):
+    """把Chrome的跳转类型转换为可读的名称（只取低8位的核心类型）"""
+    return CHROME_CORE_TRANSITIONS.get(transition & CHROME_CORE_TRANSITION_MASK, "unknown")
+
 def test_parse_chrome_history():
     """测试函数，用于调试"""
     # 测试当天的记录
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import glob
+import configparser
+from datetime import datetime, timedelta
+from functools import partial
+from types import MappingProxyType
+from utils.models import Activity, ActivityType
+from parsers.browser_db import open_browser_db, BrowserDatabaseError
+from utils.date_range import range_bounds, partition_by_day
+from utils.concurrency import run_tasks
+from utils.time_merger import iter_merged_activities
+from utils.activity_store import STORE_BATCH_SIZE
+from utils.profiler import span
+
+# Firefox默认的配置文件目录（包含profiles.ini），macOS在前，之后是Linux
+FIREFOX_BASE_DIRS = (
+    os.path.expanduser("~/Library/Application Support/Firefox"),
+    os.path.expanduser("~/.mozilla/firefox"),
+    os.path.expanduser("~/snap/firefox/common/.mozilla/firefox"),
+    os.path.expanduser("~/.var/app/org.mozilla.firefox/.mozilla/firefox"),
+)
+
+# moz_historyvisits.visit_type的取值
+FIREFOX_VISIT_TYPES = {
+    1: "link",
+    2: "typed",
+    3: "bookmark",
+    4: "embed",
+    5: "redirect_permanent",
+    6: "redirect_temporary",
+    7: "download",
+    8: "framed_link",
+    9: "reload",
+}
+
+# 页面中嵌入的内容和子框架中的跳转，Firefox的历史记录界面也不显示
+FIREFOX_HIDDEN_VISIT_TYPES = (4, 8)
+
+# 按访问提取记录时，fetchmany每批读取的行数
+FETCH_BATCH_SIZE = 1000
+
+def datetime_to_firefox_time(dt):
+    """把本地时间转换为Firefox的原始时间（1970年起的微秒数）"""
+    return int(dt.timestamp() * 1000000)
+
+def firefox_time_to_epoch(firefox_time):
+    """把Firefox的原始时间（1970年起的微秒数）转换为整数Unix时间戳"""
+    return firefox_time // 1000000
+
+def find_firefox_base_dir():
+    """第一个存在的Firefox配置文件目录，都不存在时返回None"""
+    for base_dir in FIREFOX_BASE_DIRS:
+        if os.path.isdir(base_dir):
+            return base_dir
+    return None
+
+def find_firefox_profiles(firefox_base_dir):
+    """
+    通过profiles.ini查找所有Firefox配置文件目录
+
+    profiles.ini中每个[ProfileN]小节有Name、Path和IsRelative（Path是否相对于
+    profiles.ini所在的目录）。没有profiles.ini时查找包含places.sqlite的子目录。
+
+    Args:
+        firefox_base_dir (str): Firefox配置文件目录
+
+    Returns:
+        dict: 配置文件名到路径的映射，只包含有places.sqlite的配置文件
+    """
+    profiles = {}
+    ini_path = os.path.join(firefox_base_dir, "profiles.ini")
+
+    if os.path.exists(ini_path):
+        config = configparser.ConfigParser(interpolation=None)
+        try:
+            config.read(ini_path, encoding="utf-8")
+        except configparser.Error as e:
+            print(f"读取Firefox的profiles.ini时出错: {str(e)}")
+        for section in config.sections():
+            if not section.startswith("Profile") or not config.has_option(section, "Path"):
+                continue
+            path = config.get(section, "Path")
+            if config.get(section, "IsRelative", fallback="1") == "1":
+                path = os.path.join(firefox_base_dir, path)
+            name = config.get(section, "Name", fallback=os.path.basename(path))
+            if os.path.exists(os.path.join(path, "places.sqlite")):
+                profiles[name] = path
+    else:
+        for places_path in sorted(glob.glob(os.path.join(firefox_base_dir, "**", "places.sqlite"), recursive=True)):
+            profile_dir = os.path.dirname(places_path)
+            profiles[os.path.basename(profile_dir)] = profile_dir
+
+    return profiles
+
+def parse_firefox_history(target_date, jobs=1, base_dir=None):
+    """
+    解析Firefox的浏览历史记录
+
+    Args:
+        target_date (datetime): 目标日期
+        jobs (int): 并发处理配置文件的最大数量
+        base_dir (str, optional): Firefox配置文件目录，默认使用FIREFOX_BASE_DIRS中第一个存在的
+
+    Returns:
+        list: 包含当天Firefox浏览活动的列表
+    """
+    daily_activities = parse_firefox_history_range(target_date, target_date, jobs, base_dir)
+    return daily_activities[target_date.date()]
+
+def parse_firefox_history_range(start_date, end_date, jobs=1, base_dir=None):
+    """
+    一次查询每个Firefox配置文件的浏览历史记录，提取日期范围内的每次访问并按天划分
+
+    Args:
+        start_date (datetime): 开始日期
+        end_date (datetime): 结束日期（包含）
+        jobs (int): 并发处理配置文件的最大数量
+        base_dir (str, optional): Firefox配置文件目录，默认使用FIREFOX_BASE_DIRS中第一个存在的
+
+    Returns:
+        dict: date到当天Firefox浏览活动列表的映射
+    """
+    # 计算日期范围的边界时间
+    range_start, range_end = range_bounds(start_date, end_date)
+
+    firefox_base_dir = base_dir or find_firefox_base_dir()
+    profile_dirs = find_firefox_profiles(firefox_base_dir) if firefox_base_dir else {}
+
+    if not profile_dirs:
+        print("未找到Firefox配置文件目录")
+        return partition_by_day([], start_date, end_date)
+
+    # 为每个配置文件创建一个任务
+    tasks = []
+    for profile_name, profile_path in profile_dirs.items():
+        print(f"正在处理Firefox配置文件 '{profile_name}' 的历史记录...")
+        tasks.append((f"Firefox配置文件 {profile_name}", partial(
+            parse_firefox_profile_history, os.path.join(profile_path, "places.sqlite"),
+            range_start, range_end, profile_name)))
+
+    # 并发处理所有配置文件，某个配置文件失败不影响其他配置文件
+    profile_results = run_tasks(tasks, jobs, default=lambda name: [])
+
+    # 每个配置文件的结果已经按时间排序，归并后按天划分
+    activities = iter_merged_activities(*profile_results)
+    return partition_by_day(activities, start_date, end_date)
+
+def parse_firefox_profile_history(places_db_path, start_date, end_date, profile_name):
+    """
+    解析单个Firefox配置文件的历史记录
+
+    Args:
+        places_db_path (str): places.sqlite路径
+        start_date (datetime): 开始时间
+        end_date (datetime): 结束时间（包含）
+        profile_name (str): 配置文件名称
+
+    Returns:
+        list: 按时间排序的Firefox浏览活动列表
+    """
+    activities = []
+    with span("firefox.profile", profile=profile_name) as profile_span:
+        try:
+            activities.extend(iter_firefox_profile_visits(places_db_path, start_date, end_date, profile_name))
+            print(f"从Firefox配置文件 '{profile_name}' 中找到 {len(activities)} 次访问记录")
+
+        except BrowserDatabaseError as e:
+            print(f"\n访问Firefox配置文件 '{profile_name}' 的历史记录时出错: {str(e)}")
+            print("Firefox运行时可能锁定了places.sqlite；在macOS上还需要授予终端完全磁盘访问权限\n")
+
+        except Exception as e:
+            print(f"解析Firefox配置文件 '{profile_name}' 的历史记录时出错: {str(e)}")
+        profile_span.set(rows=len(activities))
+
+    return activities
+
+def iter_firefox_profile_visits(places_db_path, start_date, end_date, profile_name, batch_size=FETCH_BATCH_SIZE):
+    """
+    按时间顺序逐次产出单个Firefox配置文件的访问记录
+
+    把moz_historyvisits与moz_places连接，在Python中把时间范围换算为原始的微秒数，
+    直接比较visit_date，可以使用moz_historyvisits_dateindex索引。结果通过fetchmany
+    分批读取，内存占用与访问记录的总数无关。
+
+    Args:
+        places_db_path (str): places.sqlite路径
+        start_date (datetime): 开始时间
+        end_date (datetime): 结束时间（包含）
+        profile_name (str): 配置文件名称
+        batch_size (int): 每批读取的行数
+
+    Yields:
+        Activity: 访问记录，metadata中包含配置文件名称和访问类型visit_type
+
+    Raises:
+        BrowserDatabaseError: 数据库无法读取
+    """
+    query = f"""
+    SELECT moz_historyvisits.visit_date,
+           moz_places.url,
+           moz_places.title,
+           moz_historyvisits.visit_type
+    FROM moz_historyvisits
+    INNER JOIN moz_places ON moz_places.id = moz_historyvisits.place_id
+    WHERE moz_historyvisits.visit_date >= ? AND moz_historyvisits.visit_date < ?
+      AND moz_historyvisits.visit_type NOT IN ({", ".join(map(str, FIREFOX_HIDDEN_VISIT_TYPES))})
+    ORDER BY moz_historyvisits.visit_date
+    """
+    source = f"firefox_history_{profile_name}"
+    metadata_by_type = {}
+
+    with open_browser_db(places_db_path) as conn:
+        cursor = conn.execute(query, (datetime_to_firefox_time(start_date),
+                                      datetime_to_firefox_time(end_date + timedelta(seconds=1))))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+
+            for visit_date, url, title, visit_type in rows:
+                yield firefox_visit_activity(visit_date, url, title, visit_type, source, profile_name, metadata_by_type)
+
+def firefox_visit_activity(visit_date, url, title, visit_type, source, profile_name, metadata_by_type):
+    """由moz_historyvisits与moz_places连接后的一行创建访问记录，同一访问类型的记录共享元数据"""
+    metadata = metadata_by_type.get(visit_type)
+    if metadata is None:
+        metadata = metadata_by_type[visit_type] = MappingProxyType({
+            "profile": profile_name,
+            "visit_type": FIREFOX_VISIT_TYPES.get(visit_type, f"unknown_{visit_type}"),
+        })
+    return Activity(
+        timestamp=firefox_time_to_epoch(visit_date),
+        activity_type=ActivityType.FIREFOX,
+        content=url[:100] if url else url,
+        source=source,
+        title=title,
+        metadata=metadata
+    )
+
+def sync_firefox_history_to_store(store, jobs=1, base_dir=None):
+    """
+    把所有Firefox配置文件中上次同步之后新增的访问记录写入活动存储
+
+    Args:
+        store (ActivityStore): 活动存储
+        jobs (int): 并发处理配置文件的最大数量
+        base_dir (str, optional): Firefox配置文件目录，默认使用FIREFOX_BASE_DIRS中第一个存在的
+
+    Returns:
+        int: 写入的记录数量
+    """
+    firefox_base_dir = base_dir or find_firefox_base_dir()
+    profile_dirs = find_firefox_profiles(firefox_base_dir) if firefox_base_dir else {}
+
+    tasks = [
+        (f"Firefox配置文件 {profile_name}", partial(
+            sync_firefox_profile_to_store, store, os.path.join(profile_path, "places.sqlite"), profile_name))
+        for profile_name, profile_path in profile_dirs.items()
+    ]
+    return sum(run_tasks(tasks, jobs, default=lambda name: 0))
+
+def sync_firefox_profile_to_store(store, places_db_path, profile_name, batch_size=STORE_BATCH_SIZE):
+    """
+    把单个Firefox配置文件中moz_historyvisits.id大于高水位的访问记录写入活动存储
+
+    每批记录与新的高水位在同一个事务中提交。moz_historyvisits.id同时是记录标识。
+    清除历史记录后id会变小，此时从新的标识起点从头重新同步，与之前写入的相同访问合并。
+
+    Args:
+        store (ActivityStore): 活动存储
+        places_db_path (str): places.sqlite路径
+        profile_name (str): 配置文件名称
+        batch_size (int): 每次提交的记录数量
+
+    Returns:
+        int: 写入的记录数量
+    """
+    source = f"firefox_history_{profile_name}"
+    last_id, state = store.get_mark(source)
+
+    # moz_historyvisits.id是自增主键，按id顺序读取新增的访问
+    query = f"""
+    SELECT moz_historyvisits.id,
+           moz_historyvisits.visit_date,
+           moz_places.url,
+           moz_places.title,
+           moz_historyvisits.visit_type
+    FROM moz_historyvisits
+    INNER JOIN moz_places ON moz_places.id = moz_historyvisits.place_id
+    WHERE moz_historyvisits.id > ?
+      AND moz_historyvisits.visit_type NOT IN ({", ".join(map(str, FIREFOX_HIDDEN_VISIT_TYPES))})
+    ORDER BY moz_historyvisits.id
+    """
+    count = 0
+    metadata_by_type = {}
+    try:
+        with open_browser_db(places_db_path) as conn:
+            max_id = conn.execute("SELECT max(id) FROM moz_historyvisits").fetchone()[0] or 0
+            if max_id < last_id or not state:
+                last_id = 0
+                id_base = store.next_record_id(source)
+            else:
+                id_base = state['id_base']
+
+            cursor = conn.execute(query, (last_id,))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                activities = [firefox_visit_activity(*row[1:], source, profile_name, metadata_by_type) for row in rows]
+                count += store.record(source, activities, [id_base + row[0] for row in rows], rows[-1][0],
+                                      {'id_base': id_base}, id_base)
+    except BrowserDatabaseError as e:
+        print(f"访问Firefox配置文件 '{profile_name}' 的历史记录时出错: {str(e)}")
+
+    if count:
+        print(f"从Firefox配置文件 '{profile_name}' 同步了 {count} 次访问记录")
+    return count
+
+def test_parse_firefox_history():
+    """测试函数，用于调试"""
+    # 测试当天的记录
+    today = datetime.now()
+    activities = parse_firefox_history(today)
+
+    print(f"今天找到 {len(activities)} 条Firefox浏览记录:")
+    for idx, activity in enumerate(activities[:10], 1):  # 只显示前10条
+        print(f"{idx}. [{activity.timestamp.strftime('%H:%M:%S')}] {activity.title or '无标题'} - {activity.content}")
+
+    if len(activities) > 10:
+        print(f"... 以及其他 {len(activities) - 10} 条记录")
+
+if __name__ == "__main__":
+    # 直接运行此文件时测试功能
+    test_parse_firefox_history()
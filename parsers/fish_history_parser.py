@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sys
+from datetime import datetime
+
+from parsers.shell_history import ShellHistoryFormat, parse_history_range, sync_history_to_store
+
+# fish历史记录文件的默认路径（遵循XDG_DATA_HOME）
+FISH_HISTORY_PATH = os.path.join(os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share"),
+                                 "fish", "fish_history")
+
+# 写入活动存储时fish历史记录的数据源名称
+FISH_STORE_SOURCE = "fish_history"
+
+# 每条记录以"- cmd: "行开始，下一行是"  when: <时间戳>"，之后可能有缩进的paths列表
+RECORD_START = b'- cmd: '
+RECORD_PATTERN = re.compile(rb'^- cmd: (.*)\n  when: (\d+)$', re.MULTILINE)
+
+# fish把命令中的反斜杠和换行转义为\\和\n
+ESCAPE_PATTERN = re.compile(rb'\\([\\n])')
+
+
+def _unescape(match):
+    return b'\n' if match.group(1) == b'n' else b'\\'
+
+
+def decode_fish_command(raw):
+    """把原始命令字节还原为字符串，无法解码的字节显示为替换字符"""
+    if b'\\' in raw:
+        raw = ESCAPE_PATTERN.sub(_unescape, raw)
+    return raw.decode('utf-8', errors='replace').rstrip()
+
+
+def fish_record_end(data):
+    """最后一个"- cmd: "行的行首，之前的记录都已完整"""
+    pos = data.rfind(b'\n' + RECORD_START)
+    if pos >= 0:
+        return pos + 1
+    if data.startswith(RECORD_START):
+        return 0
+    return data.rfind(b'\n') + 1
+
+
+def is_complete_fish_chunk(chunk):
+    """块以换行符结尾，并且最后一行不是还没有时间的"- cmd: "行"""
+    if not chunk.endswith(b'\n'):
+        return False
+    last_line = chunk[chunk.rfind(b'\n', 0, len(chunk) - 1) + 1:]
+    return not last_line.startswith(RECORD_START)
+
+
+def iter_fish_records(chunks, start_timestamp=None, end_timestamp=None, with_offsets=False):
+    """
+    在原始字节块上解析fish的历史记录
+
+    时间窗口以整数比较，窗口外的记录不会被解码。没有when的记录会被跳过。
+
+    Args:
+        chunks (iterable): 在记录边界处切开的原始字节块
+        start_timestamp (int, optional): 开始时间戳（包含）
+        end_timestamp (int, optional): 结束时间戳（包含）
+        with_offsets (bool): 是否在每条记录之前加上它相对第一块开头的字节偏移
+
+    Yields:
+        tuple: (时间戳, None, 命令)，fish不记录执行时长；
+            with_offsets为True时是(偏移, 时间戳, None, 命令)
+    """
+    low = start_timestamp if start_timestamp is not None else -1
+    high = end_timestamp if end_timestamp is not None else float('inf')
+    finditer = RECORD_PATTERN.finditer
+    base = 0
+
+    for chunk in chunks:
+        for match in finditer(chunk):
+            timestamp = int(match[2])
+            if low <= timestamp <= high:
+                command = decode_fish_command(match[1])
+                if command:
+                    if with_offsets:
+                        yield base + match.start(), timestamp, None, command
+                    else:
+                        yield timestamp, None, command
+        base += len(chunk)
+
+
+FISH_FORMAT = ShellHistoryFormat("fish", FISH_STORE_SOURCE, fish_record_end, iter_fish_records,
+                                 is_complete_fish_chunk)
+
+
+def parse_fish_history(target_date, incremental=False, state_dir=None, file_path=None):
+    """
+    解析fish_history文件，提取指定日期的命令记录
+
+    Args:
+        target_date (datetime): 目标日期
+        incremental (bool): 是否使用增量模式，只解析上次运行之后新增的内容
+        state_dir (str, optional): 增量模式的状态目录，默认为~/.wihd/fish_history
+        file_path (str, optional): fish_history文件路径，默认为~/.local/share/fish/fish_history
+
+    Returns:
+        list: 包含当天命令活动的列表
+    """
+    daily_activities = parse_fish_history_range(target_date, target_date, incremental, state_dir, file_path)
+    return daily_activities[target_date.date()]
+
+
+def parse_fish_history_range(start_date, end_date, incremental=False, state_dir=None, file_path=None):
+    """
+    流式读取fish_history，提取日期范围内的命令记录并按天划分
+
+    Args:
+        start_date (datetime): 开始日期
+        end_date (datetime): 结束日期（包含）
+        incremental (bool): 是否使用增量模式，只解析上次运行之后新增的内容
+        state_dir (str, optional): 增量模式的状态目录，默认为~/.wihd/fish_history
+        file_path (str, optional): fish_history文件路径，默认为~/.local/share/fish/fish_history
+
+    Returns:
+        dict: date到当天命令活动的映射，每天的记录是按时间排序的ActivityBatch
+    """
+    return parse_history_range(FISH_FORMAT, file_path or FISH_HISTORY_PATH, start_date, end_date,
+                               incremental, state_dir)
+
+
+def sync_fish_history_to_store(store, file_path=None):
+    """
+    把fish_history中上次同步之后新增的命令写入活动存储
+
+    高水位是已经写入的字节偏移，与zsh相同。fish整理历史文件时会写入新文件再替换，
+    这时inode变化，从头重新写入，已有的记录不会重复。
+
+    Args:
+        store (ActivityStore): 活动存储
+        file_path (str, optional): fish_history文件路径，默认为~/.local/share/fish/fish_history
+
+    Returns:
+        int: 写入的记录数量
+    """
+    file_path = file_path or FISH_HISTORY_PATH
+    if not os.path.exists(file_path):
+        print(f"警告: fish历史记录文件 {file_path} 不存在")
+        return 0
+
+    return sync_history_to_store(store, file_path, FISH_FORMAT)
+
+
+def test_parse_fish_history(date_str=None):
+    """
+    测试函数，用于调试
+
+    Args:
+        date_str (str, optional): 日期字符串，格式为YYYYMMDD。如果不提供，则使用当天日期。
+    """
+    if date_str:
+        try:
+            target_date = datetime.strptime(date_str, '%Y%m%d')
+        except ValueError:
+            print(f"错误：日期格式应为YYYYMMDD，收到的是 '{date_str}'")
+            return
+    else:
+        target_date = datetime.now()
+
+    print(f"正在解析 {target_date.strftime('%Y-%m-%d')} 的fish历史记录...")
+    activities = parse_fish_history(target_date)
+
+    print(f"找到 {len(activities)} 条终端命令记录:")
+    for idx, activity in enumerate(activities[:20], 1):
+        print(f"{idx}. [{activity.timestamp.strftime('%H:%M:%S')}] {activity.content[:80]}{'...' if len(activity.content) > 80 else ''}")
+
+    if len(activities) > 20:
+        print(f"... 以及其他 {len(activities) - 20} 条记录")
+
+    return activities
+
+
+if __name__ == "__main__":
+    # 直接运行此文件时测试功能
+    test_parse_fish_history(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import importlib
+import json
+import os
+from dataclasses import dataclass, field, replace
+from typing import Dict, Tuple
+
+from utils.date_range import partition_by_day
+from utils.models import ActivityType
+
+# 数据源配置文件的默认路径，不存在时使用内置的配置
+DEFAULT_SOURCES_CONFIG = os.path.expanduser("~/.wihd/sources.json")
+
+
+@dataclass(frozen=True)
+class SourceSpec:
+    """
+    一个数据源：在哪里找到历史记录，以及由哪个解析器模块读取
+
+    解析器模块只在数据源启用、并且找到了历史记录时才导入。kind决定调用解析函数时
+    传入的参数：shell为历史文件路径，chromium为用户数据目录，firefox为包含profiles.ini
+    的目录，safari为数据库路径。
+    """
+    name: str                      # 数据源名称，用于配置文件和--sources
+    label: str                     # 输出中的名称
+    kind: str                      # shell、chromium、firefox或safari
+    activity_type: ActivityType    # 产生的活动类型
+    module: str                    # 解析器模块
+    parse: str                     # 模块中按日期范围解析的函数
+    sync: str                      # 模块中同步到活动存储的函数
+    paths: Tuple[str, ...] = ()    # 候选路径，使用第一个存在的
+    enabled: bool = True           # 没有在配置文件或--sources中指定时是否启用
+    options: Dict[str, str] = field(default_factory=dict)  # 额外传给解析函数的参数
+
+    def locate(self):
+        """第一个存在的候选路径，都不存在时返回None"""
+        for path in self.paths:
+            path = os.path.expanduser(path)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def load(self):
+        """导入解析器模块"""
+        return importlib.import_module(self.module)
+
+
+def _chromium(name, label, paths, browser=None):
+    """Chromium系浏览器的数据源，历史数据库与Chrome相同"""
+    return SourceSpec(name, label, "chromium", ActivityType.CHROME, "parsers.chrome_parser",
+                      "parse_chrome_history_range", "sync_chrome_history_to_store", paths,
+                      options={"browser": browser} if browser else {})
+
+
+# 内置的数据源，macOS和Linux上的默认位置都在候选路径中
+BUILTIN_SOURCES = (
+    SourceSpec("zsh", "zsh终端命令", "shell", ActivityType.TERMINAL, "parsers.zsh_history_parser",
+               "parse_zsh_history_range", "sync_zsh_history_to_store", ("~/.zsh_history",)),
+    SourceSpec("bash", "bash终端命令", "shell", ActivityType.TERMINAL, "parsers.bash_history_parser",
+               "parse_bash_history_range", "sync_bash_history_to_store", ("~/.bash_history",)),
+    SourceSpec("fish", "fish终端命令", "shell", ActivityType.TERMINAL, "parsers.fish_history_parser",
+               "parse_fish_history_range", "sync_fish_history_to_store",
+               (os.path.join(os.environ.get("XDG_DATA_HOME") or "~/.local/share", "fish", "fish_history"),)),
+    SourceSpec("safari", "Safari浏览", "safari", ActivityType.SAFARI, "parsers.safari_parser",
+               "parse_safari_history_range", "sync_safari_history_to_store", ("~/Library/Safari/History.db",)),
+    _chromium("chrome", "Chrome浏览", ("~/Library/Application Support/Google/Chrome", "~/.config/google-chrome")),
+    _chromium("chromium", "Chromium浏览", ("~/Library/Application Support/Chromium", "~/.config/chromium",
+                                          "~/snap/chromium/common/chromium"), "chromium"),
+    _chromium("brave", "Brave浏览", ("~/Library/Application Support/BraveSoftware/Brave-Browser",
+                                    "~/.config/BraveSoftware/Brave-Browser"), "brave"),
+    _chromium("edge", "Edge浏览", ("~/Library/Application Support/Microsoft Edge", "~/.config/microsoft-edge"),
+              "edge"),
+    SourceSpec("firefox", "Firefox浏览", "firefox", ActivityType.FIREFOX, "parsers.firefox_parser",
+               "parse_firefox_history_range", "sync_firefox_history_to_store",
+               ("~/Library/Application Support/Firefox", "~/.mozilla/firefox", "~/snap/firefox/common/.mozilla/firefox",
+                "~/.var/app/org.mozilla.firefox/.mozilla/firefox")),
+)
+
+# 配置文件中新增数据源时，按kind使用的模板
+SOURCE_TEMPLATES = {
+    "chromium": _chromium("", "", ()),
+}
+
+
+def _configured_spec(name, spec, config):
+    """按配置文件中的一项修改或新建数据源"""
+    if spec is None:
+        template = SOURCE_TEMPLATES.get(config.get("kind"))
+        if template is None:
+            raise ValueError(f"新的数据源 '{name}' 需要kind，可选的有: {', '.join(SOURCE_TEMPLATES)}")
+        spec = replace(template, name=name, label=f"{name}浏览", options={"browser": name})
+    changes = {}
+    if "paths" in config:
+        paths = config["paths"]
+        changes["paths"] = (paths,) if isinstance(paths, str) else tuple(paths)
+    if "enabled" in config:
+        changes["enabled"] = bool(config["enabled"])
+    if "label" in config:
+        changes["label"] = str(config["label"])
+    return replace(spec, **changes)
+
+
+def load_sources_config(path=None):
+    """
+    读取数据源配置文件，返回内置数据源按配置修改后的列表
+
+    配置文件是JSON，例如：
+
+        {"sources": {"bash": {"enabled": true},
+                     "chrome": {"paths": ["~/chrome-profile"]},
+                     "vivaldi": {"kind": "chromium", "paths": ["~/.config/vivaldi"]}}}
+
+    每一项可以指定paths（候选路径）、enabled和label；不认识的名称加上kind可以新增
+    数据源。文件不存在时使用内置的配置，读取出错时打印提示后使用内置的配置。
+
+    Args:
+        path (str, optional): 配置文件路径，默认为~/.wihd/sources.json
+
+    Returns:
+        list: SourceSpec列表
+    """
+    sources = {spec.name: spec for spec in BUILTIN_SOURCES}
+    path = path or DEFAULT_SOURCES_CONFIG
+    if not os.path.exists(path):
+        return list(sources.values())
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f).get("sources", {})
+        configured = dict(sources)
+        for name, entry in config.items():
+            configured[name] = _configured_spec(name, sources.get(name), entry)
+        return list(configured.values())
+    except Exception as e:
+        print(f"读取数据源配置文件 {path} 时出错，使用内置的配置: {str(e)}")
+        return list(sources.values())
+
+
+def select_sources(sources, names=None):
+    """
+    选出要使用的数据源
+
+    Args:
+        sources (list): SourceSpec列表
+        names (list, optional): --sources指定的名称，提供时只使用这些数据源（包括默认不启用的）
+
+    Returns:
+        list: (SourceSpec, 路径)的列表，只包含找到了历史记录的数据源
+    """
+    if names:
+        known = {spec.name: spec for spec in sources}
+        for name in names:
+            if name not in known:
+                print(f"警告：未知的数据源 '{name}'，可选的有: {', '.join(known)}")
+        chosen = [known[name] for name in names if name in known]
+    else:
+        chosen = [spec for spec in sources if spec.enabled]
+
+    active = []
+    for spec in chosen:
+        path = spec.locate()
+        if path is None:
+            if names:
+                print(f"警告：没有找到数据源 '{spec.name}' 的历史记录: {', '.join(spec.paths)}")
+            continue
+        active.append((spec, path))
+    return active
+
+
+def parse_source(spec, path, start_date, end_date, incremental=False, visit_level=False, jobs=1):
+    """
+    导入数据源的解析器模块，解析日期范围内的记录
+
+    Returns:
+        dict: date到当天活动记录的映射
+    """
+    try:
+        module = spec.load()
+    except ImportError as e:
+        print(f"数据源 '{spec.name}' 的解析器不可用: {str(e)}")
+        return partition_by_day([], start_date, end_date)
+
+    parse = getattr(module, spec.parse)
+    if spec.kind == "shell":
+        return parse(start_date, end_date, incremental=incremental, file_path=path)
+    if spec.kind == "chromium":
+        return parse(start_date, end_date, visit_level=visit_level, jobs=jobs, base_dir=path, **spec.options)
+    if spec.kind == "firefox":
+        return parse(start_date, end_date, jobs=jobs, base_dir=path, **spec.options)
+    return parse(start_date, end_date, db_path=path, **spec.options)
+
+
+def sync_source(spec, path, store, jobs=1):
+    """
+    导入数据源的解析器模块，把新记录同步到活动存储
+
+    Returns:
+        int: 写入的记录数量
+    """
+    try:
+        module = spec.load()
+    except ImportError as e:
+        print(f"数据源 '{spec.name}' 的解析器不可用: {str(e)}")
+        return 0
+
+    sync = getattr(module, spec.sync)
+    if spec.kind == "shell":
+        return sync(store, file_path=path)
+    if spec.kind in ("chromium", "firefox"):
+        return sync(store, jobs=jobs, base_dir=path, **spec.options)
+    return sync(store, db_path=path, **spec.options)
+
+
+def describe_sources(sources):
+    """
+    列出所有数据源的状态，用于--list-sources
+
+    Returns:
+        str: 每行一个数据源：名称、是否启用、找到的路径
+    """
+    lines = []
+    for spec in sources:
+        path = spec.locate()
+        state = "启用" if spec.enabled else "不启用"
+        location = path if path else f"未找到（{', '.join(spec.paths)}）"
+        lines.append(f"{spec.name:<10} {state:<4} {spec.label:<10} {location}")
+    return "\n".join(lines)
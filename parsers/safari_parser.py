@@ -2,95 +2,191 @@
 # -*- coding: utf-8 -*-
 
 import os
-import sqlite3
-import subprocess
-from datetime import datetime
+from datetime import datetime, timedelta
 from utils.models import Activity, ActivityType
+from parsers.browser_db import open_browser_db, BrowserDatabaseError
+from utils.date_range import range_bounds, partition_by_day
+from utils.profiler import span
+from utils.activity_store import STORE_BATCH_SIZE
 
-def parse_safari_history(target_date):
+# 写入活动存储时Safari历史记录的数据源名称
+SAFARI_STORE_SOURCE = "safari_history"
+
+# Safari中的时间是从2001年1月1日开始的秒数，2001年与1970年相差978307200秒
+SAFARI_EPOCH_OFFSET = 978307200
+
+# Safari历史数据库的默认路径
+SAFARI_HISTORY_PATH = os.path.expanduser("~/Library/Safari/History.db")
+
+# 按时间范围查询访问记录，直接比较原始时间列，可以使用history_visits.visit_time上的索引
+VISIT_RANGE_QUERY = """
+SELECT history_visits.visit_time,
+       url,
+       title
+FROM history_visits
+INNER JOIN history_items ON history_items.id = history_visits.history_item
+WHERE history_visits.visit_time >= ? AND history_visits.visit_time < ?
+ORDER BY history_visits.visit_time
+"""
+
+def datetime_to_safari_time(dt):
+    """把本地时间转换为Safari的原始时间（2001年起的秒数）"""
+    return dt.timestamp() - SAFARI_EPOCH_OFFSET
+
+def safari_time_to_datetime(safari_time):
+    """把Safari的原始时间（2001年起的秒数）转换为本地时间"""
+    return datetime.fromtimestamp(safari_time + SAFARI_EPOCH_OFFSET)
+
+def safari_time_to_epoch(safari_time):
+    """把Safari的原始时间（2001年起的秒数）转换为整数Unix时间戳"""
+    return int(safari_time) + SAFARI_EPOCH_OFFSET
+
+def parse_safari_history(target_date, db_path=None):
     """
     解析Safari的浏览历史记录
     
     Args:
         target_date (datetime): 目标日期
+        db_path (str, optional): Safari历史数据库路径，默认为SAFARI_HISTORY_PATH
     
     Returns:
         list: 包含当天Safari浏览活动的列表
     """
+    daily_activities = parse_safari_history_range(target_date, target_date, db_path)
+    return daily_activities[target_date.date()]
+
+def parse_safari_history_range(start_date, end_date, db_path=None):
+    """
+    一次查询Safari的浏览历史记录，提取日期范围内的记录并按天划分
+    
+    Args:
+        start_date (datetime): 开始日期
+        end_date (datetime): 结束日期（包含）
+        db_path (str, optional): Safari历史数据库路径，默认为SAFARI_HISTORY_PATH
+    
+    Returns:
+        dict: date到当天Safari浏览活动列表的映射
+    """
     activities = []
     
-    # 计算目标日期的边界时间字符串
-    start_date_str = target_date.strftime("%Y-%m-%d 00:00:00")
-    end_date_str = target_date.strftime("%Y-%m-%d 23:59:59")
+    # 计算日期范围的边界时间
+    range_start, range_end = range_bounds(start_date, end_date)
     
     # Safari历史数据库路径
-    safari_db_path = os.path.expanduser("~/Library/Safari/History.db")
+    safari_db_path = db_path or SAFARI_HISTORY_PATH
     
     # 检查文件是否存在
     if not os.path.exists(safari_db_path):
         print(f"警告：Safari历史记录数据库不存在: {safari_db_path}")
-        return activities
+        return partition_by_day(activities, start_date, end_date)
     
-    # 由于权限问题，先复制数据库到临时位置
-    temp_db_path = "/tmp/safari_history_temp.db"
+    # 以只读方式直接打开数据库，不复制数据库文件
     try:
-        # 尝试直接复制
-        subprocess.run(["cp", safari_db_path, temp_db_path], check=True)
-    except subprocess.CalledProcessError:
-        # 如果直接复制失败，输出更友好的提示
-        print("\n访问Safari历史记录需要特殊权限")
+        with open_browser_db(safari_db_path) as conn:
+            cursor = conn.cursor()
+            
+            # 在Python中把时间范围换算为Safari的原始时间，直接比较裸列
+            with span("safari.query") as query_span:
+                cursor.execute(VISIT_RANGE_QUERY, (datetime_to_safari_time(range_start),
+                                                   datetime_to_safari_time(range_end + timedelta(seconds=1))))
+                results = cursor.fetchall()
+                query_span.set(rows=len(results))
+        
+        with span("safari.build", rows=len(results)):
+            for visit_time, url, title in results:
+                # 截取URL前100个字符
+                truncated_url = url[:100] if url else url
+                
+                activity = Activity(
+                    timestamp=safari_time_to_epoch(visit_time),
+                    activity_type=ActivityType.SAFARI,
+                    content=truncated_url,
+                    source="safari_history",
+                    title=title
+                )
+                activities.append(activity)
+    
+    except BrowserDatabaseError as e:
+        # 无法读取数据库时，输出更友好的提示
+        print(f"\n访问Safari历史记录需要特殊权限: {str(e)}")
         print("由于macOS的安全机制，需要授予终端访问浏览器历史数据的权限")
         print("请在系统偏好设置 -> 安全性与隐私 -> 隐私 -> 完全磁盘访问权限中添加终端应用")
         print("或者，您可以手动复制Safari历史文件:")
         print(f"sudo cp {safari_db_path} ~/Downloads/")
         print("然后更新代码以从下载目录读取文件\n")
-        return activities
     
-    # 查询历史记录
-    try:
-        conn = sqlite3.connect(temp_db_path)
-        cursor = conn.cursor()
-        
-        query = """
-        SELECT datetime(visit_time + 978307200, 'unixepoch', 'localtime') as visit_date, 
-               url, 
-               title 
-        FROM history_visits 
-        INNER JOIN history_items ON history_items.id = history_visits.history_item 
-        WHERE visit_date BETWEEN ? AND ?
-        ORDER BY visit_time DESC
-        """
-        
-        cursor.execute(query, (start_date_str, end_date_str))
-        results = cursor.fetchall()
-        
-        for visit_date_str, url, title in results:
-            # 解析时间字符串为datetime对象
-            visit_date = datetime.strptime(visit_date_str, "%Y-%m-%d %H:%M:%S")
-            
-            # 截取URL前100个字符
-            truncated_url = url[:100] if url else url
-            
-            activity = Activity(
-                timestamp=visit_date,
-                activity_type=ActivityType.SAFARI,
-                content=truncated_url,
-                source="safari_history",
-                title=title
-            )
-            activities.append(activity)
-        
-        conn.close()
-        
-        # 清理临时文件
-        os.remove(temp_db_path)
-        
     except Exception as e:
         print(f"解析Safari历史记录时出错: {str(e)}")
     
-    # 按时间戳排序
-    activities.sort(key=lambda x: x.timestamp)
-    return activities
+    # 查询结果已经按时间排序，直接按天划分
+    return partition_by_day(activities, start_date, end_date)
+
+def sync_safari_history_to_store(store, batch_size=STORE_BATCH_SIZE, db_path=None):
+    """
+    把Safari中history_visits.id大于高水位的访问记录写入活动存储
+    
+    每批记录与新的高水位在同一个事务中提交，history_visits.id同时是记录标识。
+    Safari重建数据库后id会变小，此时从新的标识起点从头重新同步，与之前写入的
+    相同访问合并。
+    
+    Args:
+        store (ActivityStore): 活动存储
+        batch_size (int): 每次提交的记录数量
+        db_path (str, optional): Safari历史数据库路径，默认为SAFARI_HISTORY_PATH
+    
+    Returns:
+        int: 写入的记录数量
+    """
+    safari_db_path = db_path or SAFARI_HISTORY_PATH
+    if not os.path.exists(safari_db_path):
+        print(f"警告：Safari历史记录数据库不存在: {safari_db_path}")
+        return 0
+    
+    last_id, state = store.get_mark(SAFARI_STORE_SOURCE)
+    
+    query = """
+    SELECT history_visits.id,
+           history_visits.visit_time,
+           url,
+           title
+    FROM history_visits
+    INNER JOIN history_items ON history_items.id = history_visits.history_item
+    WHERE history_visits.id > ?
+    ORDER BY history_visits.id
+    """
+    count = 0
+    try:
+        with open_browser_db(safari_db_path) as conn:
+            max_id = conn.execute("SELECT max(id) FROM history_visits").fetchone()[0] or 0
+            if max_id < last_id or not state:
+                last_id = 0
+                id_base = store.next_record_id(SAFARI_STORE_SOURCE)
+            else:
+                id_base = state['id_base']
+            
+            cursor = conn.execute(query, (last_id,))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                activities = [
+                    Activity(
+                        timestamp=safari_time_to_epoch(visit_time),
+                        activity_type=ActivityType.SAFARI,
+                        content=url[:100] if url else url,
+                        source=SAFARI_STORE_SOURCE,
+                        title=title
+                    )
+                    for _, visit_time, url, title in rows
+                ]
+                count += store.record(SAFARI_STORE_SOURCE, activities, [id_base + row[0] for row in rows],
+                                      rows[-1][0], {'id_base': id_base}, id_base)
+    except BrowserDatabaseError as e:
+        print(f"访问Safari历史记录需要特殊权限: {str(e)}")
+    
+    if count:
+        print(f"从Safari同步了 {count} 条浏览记录")
+    return count
 
 def test_parse_safari_history():
     """测试函数，用于调试"""
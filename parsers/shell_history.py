@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from types import MappingProxyType
+from typing import Callable
+
+from utils.checkpoint import FileCheckpoint, load_checkpoint, save_checkpoint, resolve_resume_offset, compute_tail_hash
+from utils.date_range import range_bounds, partition_by_day
+from utils.models import ActivityBatch, ActivityType
+from utils.profiler import span
+
+# 全量读取时每次读入的块大小
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# 增量模式的状态目录，每种历史记录使用以数据源名称命名的子目录
+STATE_ROOT = os.path.expanduser("~/.wihd")
+
+
+@dataclass(frozen=True)
+class ShellHistoryFormat:
+    """
+    一种shell历史文件的格式
+
+    zsh、bash和fish的解析器共用同一套按块读取、增量缓存和同步到活动存储的实现，
+    格式只需要说明记录的边界在哪里，以及如何从块中解析出记录。
+    """
+    name: str                                # 名称，用于提示和性能分析的区间名
+    source: str                              # 活动记录的来源，也是活动存储中的数据源名称
+    record_end: Callable[[bytes], int]       # 数据中最后一条完整记录之后的位置，0表示还没有完整的记录
+    iter_records: Callable                   # (块, 开始时间戳, 结束时间戳[, with_offsets]) -> (时间戳, 持续时间, 命令)
+    is_complete: Callable[[bytes], bool]     # 文件末尾的一块是否已经写完
+
+    @property
+    def state_dir(self):
+        """增量模式的默认状态目录"""
+        return os.path.join(STATE_ROOT, self.source)
+
+
+# 命令的执行时长只有少数几种取值，相同时长的记录共享同一个只读元数据
+_duration_metadata = {}
+
+def duration_metadata(duration):
+    """返回包含执行时长的共享元数据，没有执行时长（bash和fish）时返回None"""
+    if duration is None:
+        return None
+    metadata = _duration_metadata.get(duration)
+    if metadata is None:
+        metadata = _duration_metadata.setdefault(duration, MappingProxyType({'duration': duration}))
+    return metadata
+
+
+def iter_record_chunks(file_path, record_end, offset=0, chunk_size=CHUNK_SIZE):
+    """
+    按块读取文件，每块都在记录边界处结束，内存占用与文件大小无关
+
+    Args:
+        file_path (str): 文件路径
+        record_end (callable): 返回数据中最后一条完整记录之后的位置，0表示需要继续读取
+        offset (int): 开始读取的偏移
+        chunk_size (int): 每次读取的字节数
+
+    Yields:
+        bytes: 以完整记录结尾的字节块；文件末尾剩下的部分最后产出，可能是未写完的记录
+    """
+    with open(file_path, 'rb') as file:
+        file.seek(offset)
+        remainder = b''
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            data = remainder + chunk
+            end = record_end(data)
+            if end <= 0:
+                remainder = data
+                continue
+            remainder = data[end:]
+            yield data[:end]
+        if remainder:
+            yield remainder
+
+
+def iter_complete_chunks(file_path, history_format, offset=0):
+    """
+    从offset开始按块读取完整的记录，文件末尾未写完的记录留到下次
+
+    Yields:
+        bytes: 以完整记录结尾的字节块，长度之和就是可以提交的偏移增量
+    """
+    for chunk in iter_record_chunks(file_path, history_format.record_end, offset):
+        if not history_format.is_complete(chunk):
+            break
+        yield chunk
+
+
+def update_history_cache(file_path, history_format, state_dir=None):
+    """
+    从上次的检查点继续解析历史文件，把新条目追加到按天分区的缓存中
+
+    检查点记录已消费的字节偏移、文件inode和大小。文件被截断或重写
+    （例如zsh的历史去重）时会清空缓存并全量重新扫描。新增的内容按块读取，
+    即使第一次运行要处理很大的历史文件，内存占用也只有一块。
+
+    Args:
+        file_path (str): 历史文件路径
+        history_format (ShellHistoryFormat): 历史文件的格式
+        state_dir (str, optional): 状态目录
+
+    Returns:
+        int: 新增的条目数量；如果文件中没有带时间戳的记录则返回-1
+    """
+    state_dir = state_dir or history_format.state_dir
+    days_dir = os.path.join(state_dir, "days")
+    state_path = os.path.join(state_dir, "checkpoint.json")
+    os.makedirs(days_dir, exist_ok=True)
+
+    checkpoint = load_checkpoint(state_path)
+    offset = resolve_resume_offset(file_path, checkpoint)
+
+    if offset == 0:
+        # 需要全量扫描，清空旧的分区缓存
+        for name in os.listdir(days_dir):
+            os.remove(os.path.join(days_dir, name))
+        partitions = {}
+    else:
+        # 丢弃上次运行中未提交到检查点的分区数据，避免重复
+        partitions = dict(checkpoint.partitions)
+        for name in os.listdir(days_dir):
+            partition_path = os.path.join(days_dir, name)
+            committed_size = partitions.get(name, 0)
+            if os.path.getsize(partition_path) > committed_size:
+                with open(partition_path, 'r+b') as f:
+                    f.truncate(committed_size)
+
+    stat = os.stat(file_path)
+    count = 0
+    consumed = 0
+    day_start = day_end = 0
+    for chunk in iter_complete_chunks(file_path, history_format, offset):
+        # 按天分组新条目，同一天的连续条目复用已经计算好的分区边界
+        new_entries = {}
+        for timestamp, duration, command in history_format.iter_records([chunk]):
+            if not day_start <= timestamp < day_end:
+                day_date = datetime.fromtimestamp(timestamp).date()
+                day_start = int(datetime(day_date.year, day_date.month, day_date.day).timestamp())
+                day_end = int((datetime(day_date.year, day_date.month, day_date.day) + timedelta(days=1)).timestamp())
+                day = day_date.strftime('%Y%m%d') + ".jsonl"
+            record = {'timestamp': timestamp, 'duration': duration, 'command': command}
+            new_entries.setdefault(day, []).append(json.dumps(record, ensure_ascii=False))
+            count += 1
+
+        for day_name, records in new_entries.items():
+            partition_path = os.path.join(days_dir, day_name)
+            with open(partition_path, 'a', encoding='utf-8') as f:
+                f.write("\n".join(records) + "\n")
+            partitions[day_name] = os.path.getsize(partition_path)
+        consumed += len(chunk)
+
+    if offset == 0 and count == 0 and consumed > 0:
+        return -1
+
+    new_offset = offset + consumed
+    save_checkpoint(state_path, FileCheckpoint(
+        path=file_path,
+        inode=stat.st_ino,
+        size=min(stat.st_size, new_offset),
+        offset=new_offset,
+        tail_hash=compute_tail_hash(file_path, new_offset),
+        partitions=partitions
+    ))
+
+    return count
+
+
+def read_history_cache(state_dir, start_timestamp, end_timestamp):
+    """
+    只读取覆盖目标时间范围的缓存分区
+
+    Returns:
+        list: (时间戳, 持续时间, 命令)元组的列表
+    """
+    records = []
+    days_dir = os.path.join(state_dir, "days")
+    day = datetime.fromtimestamp(start_timestamp).date()
+    last_day = datetime.fromtimestamp(end_timestamp).date()
+    while day <= last_day:
+        partition_path = os.path.join(days_dir, day.strftime('%Y%m%d') + ".jsonl")
+        day += timedelta(days=1)
+        if not os.path.exists(partition_path):
+            continue
+
+        with open(partition_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                timestamp = record['timestamp']
+                if start_timestamp <= timestamp <= end_timestamp:
+                    records.append((timestamp, record['duration'], record['command']))
+
+    return records
+
+
+def read_history_records(file_path, history_format, start_timestamp, end_timestamp):
+    """
+    流式扫描整个历史文件，只解码时间范围内的记录
+
+    Returns:
+        list: (时间戳, 持续时间, 命令)元组的列表
+    """
+    chunks = iter_record_chunks(file_path, history_format.record_end)
+    return list(history_format.iter_records(chunks, start_timestamp, end_timestamp))
+
+
+def parse_history_range(history_format, file_path, start_date, end_date, incremental=False, state_dir=None):
+    """
+    一次读取历史文件，提取日期范围内的命令记录并按天划分
+
+    Args:
+        history_format (ShellHistoryFormat): 历史文件的格式
+        file_path (str): 历史文件路径
+        start_date (datetime): 开始日期
+        end_date (datetime): 结束日期（包含）
+        incremental (bool): 是否使用增量模式，只解析上次运行之后新增的内容
+        state_dir (str, optional): 增量模式的状态目录，默认为~/.wihd/<数据源名称>
+
+    Returns:
+        dict: date到当天命令活动的映射，每天的记录是按时间排序的ActivityBatch
+    """
+    range_start, range_end = range_bounds(start_date, end_date)
+    start_timestamp = int(range_start.timestamp())
+    end_timestamp = int(range_end.timestamp())
+    activities = ActivityBatch()
+
+    if not os.path.exists(file_path):
+        print(f"警告: {history_format.name}历史记录文件 {file_path} 不存在")
+        return partition_by_day(activities, start_date, end_date)
+
+    with span(f"{history_format.name}.read", incremental=incremental) as read_span:
+        records = None
+        if incremental:
+            state_dir = state_dir or history_format.state_dir
+            try:
+                if update_history_cache(file_path, history_format, state_dir) >= 0:
+                    records = read_history_cache(state_dir, start_timestamp, end_timestamp)
+                else:
+                    records = []
+            except Exception as e:
+                print(f"增量解析{history_format.name}历史记录时出错，改为全量解析: {str(e)}")
+        if records is None:
+            try:
+                records = read_history_records(file_path, history_format, start_timestamp, end_timestamp)
+            except Exception as e:
+                print(f"解析{history_format.name}历史记录时出错: {str(e)}")
+                records = []
+        read_span.set(rows=len(records))
+
+    with span(f"{history_format.name}.build") as build_span:
+        for timestamp, duration, command in records:
+            activities.append(timestamp, ActivityType.TERMINAL, command, history_format.source,
+                              metadata=duration_metadata(duration))
+        build_span.set(rows=len(activities))
+
+    # 多个终端交替写入时时间戳可能乱序，排序后按天划分
+    with span(f"{history_format.name}.sort", rows=len(activities)):
+        activities.sort()
+    return partition_by_day(activities, start_date, end_date)
+
+
+def sync_history_to_store(store, file_path, history_format):
+    """
+    把历史文件中上次同步之后新增的命令写入活动存储
+
+    高水位是已经写入的字节偏移，和增量模式一样保存文件的inode、大小和偏移之前的
+    尾部摘要。每条命令以它在文件中的字节偏移作为记录标识，同一秒内重复执行的相同命令
+    也是不同的记录。文件被截断或重写时从新的标识起点从头重新写入，与之前写入的相同
+    命令合并，已有的记录不会重复。每块记录和新的偏移在同一个事务中提交。
+
+    Args:
+        store (ActivityStore): 活动存储
+        file_path (str): 历史文件路径
+        history_format (ShellHistoryFormat): 历史文件的格式
+
+    Returns:
+        int: 写入的记录数量
+    """
+    _, state = store.get_mark(history_format.source)
+    offset = resolve_resume_offset(file_path, FileCheckpoint(**state['file']) if state else None)
+    # 从头写入时记录标识从存储中尚未使用的位置开始，否则沿用上次的起点
+    id_base = state['id_base'] if state and offset else store.next_record_id(history_format.source)
+
+    stat = os.stat(file_path)
+    count = 0
+    for chunk in iter_complete_chunks(file_path, history_format, offset):
+        activities = ActivityBatch()
+        record_ids = []
+        for position, timestamp, duration, command in history_format.iter_records([chunk], with_offsets=True):
+            activities.append(timestamp, ActivityType.TERMINAL, command, history_format.source,
+                              metadata=duration_metadata(duration))
+            record_ids.append(id_base + offset + position)
+
+        offset += len(chunk)
+        checkpoint = FileCheckpoint(
+            path=file_path,
+            inode=stat.st_ino,
+            size=min(stat.st_size, offset),
+            offset=offset,
+            tail_hash=compute_tail_hash(file_path, offset)
+        )
+        count += store.record(history_format.source, activities, record_ids, offset,
+                              {'file': asdict(checkpoint), 'id_base': id_base}, id_base)
+
+    return count
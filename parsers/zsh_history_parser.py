@@ -2,90 +2,131 @@
 # -*- coding: utf-8 -*-
 
 import os
-import re
 import sys
 import time
 from datetime import datetime, timedelta
-from utils.models import Activity, ActivityType
+from utils.models import ActivityBatch, ActivityType
+from utils.date_range import range_bounds, partition_by_day
+from utils.profiler import span
+from parsers.shell_history import (ShellHistoryFormat, duration_metadata, update_history_cache, read_history_cache,
+                                   sync_history_to_store)
+from parsers.zsh_reader import (read_zsh_window, iter_zsh_records, iter_file_chunks, has_extended_history,
+                                decode_command, zsh_record_end, is_complete_zsh_chunk)
 
-def parse_zsh_history(target_date):
+# zsh历史记录文件的默认路径
+ZSH_HISTORY_PATH = os.path.expanduser("~/.zsh_history")
+
+# 增量模式下检查点和按天分区缓存的默认存放目录
+DEFAULT_STATE_DIR = os.path.expanduser("~/.wihd/zsh_history")
+
+# 写入活动存储时zsh历史记录的数据源名称
+ZSH_STORE_SOURCE = "zsh_history"
+
+# EXTENDED_HISTORY格式，与bash、fish共用按块读取、增量缓存和同步的实现
+ZSH_FORMAT = ShellHistoryFormat("zsh", ZSH_STORE_SOURCE, zsh_record_end, iter_zsh_records, is_complete_zsh_chunk)
+
+def parse_zsh_history(target_date, incremental=False, state_dir=None, file_path=None):
     """
     解析~/.zsh_history文件，提取指定日期的命令记录
     
     Args:
         target_date (datetime): 目标日期
+        incremental (bool): 是否使用增量模式，只解析上次运行之后新增的内容
+        state_dir (str, optional): 增量模式的状态目录，默认为~/.wihd/zsh_history
+        file_path (str, optional): zsh_history文件路径，默认为~/.zsh_history
     
     Returns:
         list: 包含当天命令活动的列表
     """
-    # 计算目标日期的开始和结束时间戳
-    start_timestamp = int(datetime(target_date.year, target_date.month, target_date.day, 0, 0, 0).timestamp())
-    end_timestamp = int(datetime(target_date.year, target_date.month, target_date.day, 23, 59, 59).timestamp())
+    daily_activities = parse_zsh_history_range(target_date, target_date, incremental, state_dir, file_path)
+    return daily_activities[target_date.date()]
+
+def parse_zsh_history_range(start_date, end_date, incremental=False, state_dir=None, file_path=None):
+    """
+    一次读取~/.zsh_history，提取日期范围内的命令记录并按天划分
     
-    zsh_history_path = os.path.expanduser("~/.zsh_history")
-    activities = []
+    Args:
+        start_date (datetime): 开始日期
+        end_date (datetime): 结束日期（包含）
+        incremental (bool): 是否使用增量模式，只解析上次运行之后新增的内容
+        state_dir (str, optional): 增量模式的状态目录，默认为~/.wihd/zsh_history
+        file_path (str, optional): zsh_history文件路径，默认为~/.zsh_history
+    
+    Returns:
+        dict: date到当天命令活动的映射，每天的记录是按时间排序的ActivityBatch
+    """
+    # 计算日期范围的开始和结束时间戳
+    range_start, range_end = range_bounds(start_date, end_date)
+    start_timestamp = int(range_start.timestamp())
+    end_timestamp = int(range_end.timestamp())
+    
+    zsh_history_path = file_path or ZSH_HISTORY_PATH
+    activities = ActivityBatch()
     
     if not os.path.exists(zsh_history_path):
         print(f"警告: zsh历史记录文件 {zsh_history_path} 不存在")
-        return activities
-    
-    # 尝试使用不同的格式解析zsh_history
-    entries = parse_zsh_history_file(zsh_history_path)
-    
-    # 过滤出目标日期的条目
-    for entry in entries:
-        if 'timestamp' in entry and start_timestamp <= entry['timestamp'] <= end_timestamp:
-            activity = Activity(
-                timestamp=entry['time'],
-                activity_type=ActivityType.TERMINAL,
-                content=entry['command'],
-                source="zsh_history",
-                metadata=entry.get('metadata', {})
-            )
-            activities.append(activity)
-    
-    # 按时间戳排序
-    activities.sort(key=lambda x: x.timestamp)
-    return activities
+        return partition_by_day(activities, start_date, end_date)
+    
+    # 读取目标时间范围内的记录（已按时间戳过滤）
+    with span("zsh.read", incremental=incremental) as read_span:
+        if incremental:
+            records = load_incremental_records(zsh_history_path, start_timestamp, end_timestamp, state_dir)
+        else:
+            records = load_window_records(zsh_history_path, start_timestamp, end_timestamp)
+        read_span.set(rows=len(records) if records is not None else 0)
+    
+    with span("zsh.build") as build_span:
+        if records is None:
+            # 没有时间戳的历史记录，只能使用估计时间
+            for entry in parse_zsh_history_file(zsh_history_path):
+                if start_timestamp <= entry['timestamp'] <= end_timestamp:
+                    activities.append(
+                        entry['timestamp'],
+                        ActivityType.TERMINAL,
+                        entry['command'],
+                        "zsh_history",
+                        metadata=entry['metadata']
+                    )
+        else:
+            # 直接按列填充，不为每条记录创建Activity对象
+            for timestamp, duration, command in records:
+                activities.append(timestamp, ActivityType.TERMINAL, command, "zsh_history",
+                                  metadata=duration_metadata(duration))
+        build_span.set(rows=len(activities))
+    
+    # 按时间戳排序后按天划分（SHARE_HISTORY产生的乱序很少，多数情况下已经有序）
+    with span("zsh.sort", rows=len(activities)):
+        activities.sort()
+    return partition_by_day(activities, start_date, end_date)
 
-def parse_zsh_history_file(file_path):
+def parse_zsh_history_file(file_path, start_timestamp=None, end_timestamp=None):
     """
     尝试使用多种方式解析zsh_history文件
     
     Args:
         file_path (str): zsh_history文件路径
+        start_timestamp (int, optional): 只保留不早于该时间戳的条目
+        end_timestamp (int, optional): 只保留不晚于该时间戳的条目
     
     Returns:
         list: 解析出的历史记录条目
     """
-    entries = []
-    
     try:
         # 获取文件修改时间作为回退方案
         file_mtime = os.path.getmtime(file_path)
         
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-            lines = file.readlines()
-        
-        # 处理标准格式的行
+        # 处理标准格式的行，窗口外的记录在创建dict之前就被跳过
         standard_entries = []
-        for line in lines:
-            # 标准格式: ": [时间戳]:[持续时间];[命令]"
-            match = re.match(r'^: (\d+):(\d+);(.*)$', line.strip())
-            if match:
-                timestamp, duration, command = match.groups()
-                timestamp = int(timestamp)
-                
-                entry = {
-                    'timestamp': timestamp,
-                    'time': datetime.fromtimestamp(timestamp),
-                    'command': command,
-                    'metadata': {'duration': duration}
-                }
-                standard_entries.append(entry)
+        for timestamp, duration, command in iter_zsh_records(iter_file_chunks(file_path), start_timestamp, end_timestamp):
+            standard_entries.append({
+                'timestamp': timestamp,
+                'time': datetime.fromtimestamp(timestamp),
+                'command': command,
+                'metadata': {'duration': duration}
+            })
         
         # 如果找到标准格式的条目，直接返回它们
-        if standard_entries:
+        if standard_entries or has_extended_history(file_path):
             return standard_entries
             
         # 否则，处理非标准格式
@@ -97,12 +138,100 @@ def parse_zsh_history_file(file_path):
         print("  setopt SHARE_HISTORY")
         print("  setopt INC_APPEND_HISTORY")
         
-        return parse_nonstandard_format(lines, file_mtime)
+        with open(file_path, 'rb') as file:
+            lines = file.read().split(b'\n')
+        
+        entries = parse_nonstandard_format(lines, file_mtime)
+        if start_timestamp is not None or end_timestamp is not None:
+            low = start_timestamp if start_timestamp is not None else 0
+            high = end_timestamp if end_timestamp is not None else float('inf')
+            entries = [entry for entry in entries if low <= entry['timestamp'] <= high]
+        return entries
     
     except Exception as e:
         print(f"解析zsh历史记录时出错: {str(e)}")
         return []
 
+def load_window_records(file_path, start_timestamp, end_timestamp):
+    """
+    只读取目标时间窗口内的历史记录
+
+    通过内存映射和二分查找定位窗口，单日查询的开销与历史文件的总长度基本无关。
+
+    Args:
+        file_path (str): zsh_history文件路径
+        start_timestamp (int): 开始时间戳
+        end_timestamp (int): 结束时间戳
+
+    Returns:
+        list: (时间戳, 持续时间, 命令)元组的列表；文件没有时间戳时返回None
+    """
+    try:
+        chunks = read_zsh_window(file_path, start_timestamp, end_timestamp)
+    except Exception as e:
+        print(f"定位zsh历史记录时间窗口时出错，改为全量解析: {str(e)}")
+        chunks = iter_file_chunks(file_path)
+    
+    if chunks is None:
+        return None
+    
+    return list(iter_zsh_records(chunks, start_timestamp, end_timestamp))
+
+def sync_zsh_history_to_store(store, file_path=None):
+    """
+    把zsh_history中上次同步之后新增的命令写入活动存储
+
+    高水位是已经写入的字节偏移，和增量模式一样保存文件的inode、大小和偏移之前的
+    尾部摘要；文件被截断或重写时从头重新写入，已有的记录不会重复。
+
+    Args:
+        store (ActivityStore): 活动存储
+        file_path (str, optional): zsh_history文件路径，默认为~/.zsh_history
+
+    Returns:
+        int: 写入的记录数量
+    """
+    file_path = file_path or ZSH_HISTORY_PATH
+    if not os.path.exists(file_path):
+        print(f"警告: zsh历史记录文件 {file_path} 不存在")
+        return 0
+
+    if not has_extended_history(file_path):
+        print("警告: zsh历史记录没有时间戳（未启用EXTENDED_HISTORY），无法写入活动存储")
+        return 0
+
+    return sync_history_to_store(store, file_path, ZSH_FORMAT)
+
+def load_incremental_records(file_path, start_timestamp, end_timestamp, state_dir=None):
+    """
+    以增量模式读取指定时间范围内的历史记录
+
+    先把上次运行之后新增的内容追加到缓存，再只读取覆盖目标时间范围的分区，
+    因此每天重复运行的开销只和新增的行数成正比。
+
+    Args:
+        file_path (str): zsh_history文件路径
+        start_timestamp (int): 开始时间戳
+        end_timestamp (int): 结束时间戳
+        state_dir (str, optional): 状态目录
+
+    Returns:
+        list: (时间戳, 持续时间, 命令)元组的列表；文件没有时间戳时返回None
+    """
+    state_dir = state_dir or DEFAULT_STATE_DIR
+
+    try:
+        new_count = update_history_cache(file_path, ZSH_FORMAT, state_dir)
+    except Exception as e:
+        print(f"增量解析zsh历史记录时出错，改为按时间窗口解析: {str(e)}")
+        return load_window_records(file_path, start_timestamp, end_timestamp)
+
+    if new_count < 0:
+        # 没有时间戳的历史记录无法增量处理
+        return None
+
+    return read_history_cache(state_dir, start_timestamp, end_timestamp)
+
 def parse_nonstandard_format(lines, file_mtime=None):
     """
     解析非标准格式的zsh_history
@@ -121,6 +250,8 @@ def parse_nonstandard_format(lines, file_mtime=None):
     current_timestamp = file_mtime
     
     for line in reversed(lines):  # 从最新的命令开始
+        if isinstance(line, bytes):
+            line = decode_command(line)
         line = line.strip()
         if not line:
             continue
@@ -158,15 +289,12 @@ def get_nearby_history_entries(target_date, days_before=3, days_after=1):
     """
     result = {}
     
-    # 遍历目标日期前后的日期
-    for day_offset in range(-days_before, days_after+1):
-        date = target_date + timedelta(days=day_offset)
-        date_str = date.strftime('%Y-%m-%d')
-        
-        # 获取该日期的活动
-        activities = parse_zsh_history(date)
+    # 一次读取整个日期范围，再按天取出活动
+    daily_activities = parse_zsh_history_range(target_date - timedelta(days=days_before),
+                                               target_date + timedelta(days=days_after))
+    for day, activities in daily_activities.items():
         if activities:
-            result[date_str] = activities
+            result[day.strftime('%Y-%m-%d')] = activities
     
     return result
 
@@ -229,7 +357,7 @@ def dump_raw_history():
     """
     显示原始zsh_history文件内容进行调试
     """
-    zsh_history_path = os.path.expanduser("~/.zsh_history")
+    zsh_history_path = ZSH_HISTORY_PATH
     
     if not os.path.exists(zsh_history_path):
         print(f"警告: zsh历史记录文件 {zsh_history_path} 不存在")
@@ -267,7 +395,7 @@ if __name__ == "__main__":
                 count = int(sys.argv[2])
             
             # 获取历史记录
-            zsh_history_path = os.path.expanduser("~/.zsh_history")
+            zsh_history_path = ZSH_HISTORY_PATH
             entries = parse_zsh_history_file(zsh_history_path)
             
             # 按时间戳排序
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import mmap
+import os
+import re
+
+from parsers.shell_history import CHUNK_SIZE, iter_record_chunks
+
+# zsh用0x83（Meta）转义特殊字节：Meta后面的字节是原字节异或0x20
+META_BYTE = b'\x83'
+
+# 多行命令在历史文件中以"反斜杠+换行"分隔
+CONTINUATION = b'\\\n'
+
+# 标准格式: ": [时间戳]:[持续时间];[命令]"，命令可以包含若干续行
+RECORD_PATTERN = re.compile(rb'^: (\d+):(\d+);((?:.*\\\n)*.*)$', re.MULTILINE)
+
+# SHARE_HISTORY会让多个终端交替写入，时间戳可能轻微乱序
+# 查找窗口时在两端各放宽这么多秒，保证乱序的条目也能被扫描到
+DEFAULT_SLACK_SECONDS = 3600
+
+
+def unmetafy(raw):
+    """
+    还原zsh历史文件中经过Meta转义的字节
+
+    Args:
+        raw (bytes): 历史文件中的原始字节
+
+    Returns:
+        bytes: 还原后的字节
+    """
+    if META_BYTE not in raw:
+        return raw
+
+    parts = raw.split(META_BYTE)
+    result = bytearray(parts[0])
+    for part in parts[1:]:
+        if part:
+            result.append(part[0] ^ 0x20)
+            result += part[1:]
+    return bytes(result)
+
+
+def decode_command(raw):
+    """把原始命令字节还原为字符串，续行会被合并，无法解码的字节显示为替换字符而不是被丢弃"""
+    if CONTINUATION in raw:
+        raw = raw.replace(CONTINUATION, b'\n')
+    return unmetafy(raw).decode('utf-8', errors='replace').rstrip()
+
+
+def _decode_plain(raw):
+    """解码不含Meta字节和续行的命令"""
+    return raw.decode('utf-8', errors='replace').rstrip()
+
+
+def zsh_record_end(data):
+    """最后一个不是续行的换行符之后的位置，多行命令不会被拆到两个块中"""
+    end = data.rfind(b'\n')
+    while end > 0 and data[end - 1] == 0x5c:
+        end = data.rfind(b'\n', 0, end - 1)
+    return end + 1
+
+
+def is_complete_zsh_chunk(chunk):
+    """块以换行符结尾，并且最后一行不是续行"""
+    return chunk.endswith(b'\n') and not chunk.endswith(CONTINUATION)
+
+
+def iter_file_chunks(file_path, offset=0, chunk_size=CHUNK_SIZE):
+    """
+    按块读取zsh历史文件，每块都在记录边界处结束，内存占用与文件大小无关
+
+    Args:
+        file_path (str): 文件路径
+        offset (int): 开始读取的偏移
+        chunk_size (int): 每次读取的字节数
+
+    Yields:
+        bytes: 以完整记录结尾的字节块
+    """
+    return iter_record_chunks(file_path, zsh_record_end, offset, chunk_size)
+
+
+def iter_zsh_records(chunks, start_timestamp=None, end_timestamp=None, with_offsets=False):
+    """
+    在原始字节块上解析EXTENDED_HISTORY格式的记录
+
+    以反斜杠结尾的行是多行命令的续行，会和下一行合并（与zsh读取历史时的
+    处理一致）。时间窗口以整数比较，窗口外的记录不会被解码，也不会创建
+    datetime或dict。不符合格式的行会被跳过。
+
+    Args:
+        chunks (iterable): 在记录边界处切开的原始字节块
+        start_timestamp (int, optional): 开始时间戳（包含）
+        end_timestamp (int, optional): 结束时间戳（包含）
+        with_offsets (bool): 是否在每条记录之前加上它相对第一块开头的字节偏移
+
+    Yields:
+        tuple: (时间戳, 持续时间, 命令)，时间戳和持续时间都是int；
+            with_offsets为True时是(偏移, 时间戳, 持续时间, 命令)
+    """
+    low = start_timestamp if start_timestamp is not None else -1
+    high = end_timestamp if end_timestamp is not None else float('inf')
+    findall = RECORD_PATTERN.findall
+    finditer = RECORD_PATTERN.finditer
+    base = 0
+
+    for chunk in chunks:
+        # 绝大多数块既没有Meta字节也没有续行，整块检查一次即可走快速路径
+        if META_BYTE in chunk or CONTINUATION in chunk:
+            decode = decode_command
+        else:
+            decode = _decode_plain
+        if with_offsets:
+            for match in finditer(chunk):
+                timestamp = int(match[1])
+                if low <= timestamp <= high:
+                    yield base + match.start(), timestamp, int(match[2]), decode(match[3])
+            base += len(chunk)
+            continue
+        for timestamp, duration, command in findall(chunk):
+            timestamp = int(timestamp)
+            if low <= timestamp <= high:
+                yield timestamp, int(duration), decode(command)
+
+
+def _parse_timestamp_at(buf, pos, size):
+    """
+    解析位于pos的行首的": <epoch>:"前缀
+
+    Returns:
+        int: 时间戳，行不是EXTENDED_HISTORY格式时返回None
+    """
+    if buf[pos:pos + 2] != b': ':
+        return None
+
+    colon = buf.find(b':', pos + 2, min(size, pos + 24))
+    if colon < 0:
+        return None
+
+    digits = buf[pos + 2:colon]
+    if not digits.isdigit():
+        return None
+    return int(digits)
+
+
+def _align_to_line(buf, pos):
+    """返回大于等于pos的第一个行首位置"""
+    if pos == 0:
+        return 0
+    newline = buf.find(b'\n', pos - 1)
+    return len(buf) if newline < 0 else newline + 1
+
+
+def _next_record(buf, pos, size):
+    """
+    从行首pos开始向后查找第一条带时间戳的记录
+
+    Returns:
+        tuple: (记录的行首位置, 时间戳)，找不到时返回(size, None)
+    """
+    while pos < size:
+        timestamp = _parse_timestamp_at(buf, pos, size)
+        if timestamp is not None:
+            return pos, timestamp
+        newline = buf.find(b'\n', pos)
+        if newline < 0:
+            break
+        pos = newline + 1
+    return size, None
+
+
+def _bisect_timestamp(buf, size, target):
+    """
+    二分查找第一条时间戳不小于target的记录的行首位置
+
+    Returns:
+        int: 行首位置，所有记录都早于target时返回size
+    """
+    lo, hi = 0, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        _, timestamp = _next_record(buf, _align_to_line(buf, mid), size)
+        if timestamp is None or timestamp >= target:
+            hi = mid
+        else:
+            lo = mid + 1
+    return _next_record(buf, _align_to_line(buf, lo), size)[0]
+
+
+def has_extended_history(file_path):
+    """
+    判断历史文件中是否存在EXTENDED_HISTORY格式（带时间戳）的记录
+
+    Args:
+        file_path (str): zsh_history文件路径
+
+    Returns:
+        bool: 存在带时间戳的记录时返回True
+    """
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return False
+
+    with open(file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return _next_record(buf, 0, size)[1] is not None
+
+
+def read_zsh_window(file_path, start_timestamp, end_timestamp, slack=DEFAULT_SLACK_SECONDS):
+    """
+    通过内存映射和二分查找读取时间窗口附近的原始行
+
+    EXTENDED_HISTORY格式的历史记录基本按时间排序，因此可以直接定位到
+    窗口的起止位置，只切出这一段字节，而不必解析整个文件。窗口两端各放宽
+    slack秒，用于容纳SHARE_HISTORY产生的轻微乱序条目，调用方仍需按精确的
+    时间范围过滤。
+
+    Args:
+        file_path (str): zsh_history文件路径
+        start_timestamp (int): 开始时间戳
+        end_timestamp (int): 结束时间戳
+        slack (int): 窗口两端放宽的秒数
+
+    Returns:
+        list: 窗口内的原始字节块；文件不含时间戳时返回None
+    """
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return []
+
+    with open(file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if _next_record(buf, 0, size)[1] is None:
+                return None
+
+            window_start = _bisect_timestamp(buf, size, start_timestamp - slack)
+            window_end = _bisect_timestamp(buf, size, end_timestamp + slack + 1)
+            if window_end <= window_start:
+                return []
+
+            return [buf[window_start:window_end]]
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import glob
+import json
+import os
+import re
+from datetime import datetime
+
+from utils.activity_writer import open_compressed
+from utils.models import Activity, ActivityType
+
+# 流式解析JSON数组时每次读取的字符数
+READ_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\r\n"
+_ARRAY_START = re.compile(r'\ufeff?[ \t\r\n]*\[')
+_SEPARATOR = re.compile(r'[ \t\r\n,]*')
+
+# 元素被读取块截断时，解析错误出现在被截断的记号（false、\uXXXX转义等）的开头，
+# 距离缓冲区末尾不超过这么多字符；被截断的字符串例外，错误位置是字符串的开头
+_TRUNCATED_TOKEN_CHARS = 6
+_UNTERMINATED_STRING = "Unterminated string"
+
+
+def detect_format(path):
+    """
+    判断活动记录文件的格式
+
+    压缩文件按扩展名判断；未压缩的文件以'['开头时是JSON数组，否则按NDJSON处理。
+
+    Args:
+        path (str): 文件路径
+
+    Returns:
+        str: utils.activity_writer.OUTPUT_FORMATS中的格式
+    """
+    if path.endswith(".gz"):
+        return "ndjson.gz"
+    if path.endswith(".zst"):
+        return "ndjson.zst"
+
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            char = f.read(1)
+            if not char or char not in _WHITESPACE + "\ufeff":
+                break
+    return "json" if char == "[" else "ndjson"
+
+
+def _is_truncated(error, size):
+    """解析错误是否可能只是因为缓冲区在元素中间结束"""
+    return error.pos >= size - _TRUNCATED_TOKEN_CHARS or error.msg.startswith(_UNTERMINATED_STRING)
+
+
+def iter_json_array(f, chunk_size=READ_CHUNK_SIZE):
+    """
+    逐个产出JSON数组中的元素，不把整个文件读入内存
+
+    内存占用只与单个元素和读取块的大小有关。
+
+    Args:
+        f (file): 文本文件对象
+        chunk_size (int): 每次读取的字符数
+
+    Yields:
+        object: 数组中的元素
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+    eof = False
+
+    while True:
+        # 跳过空白、数组开头和元素之间的逗号
+        if not started:
+            match = _ARRAY_START.match(buffer, pos)
+            if match:
+                started = True
+                pos = match.end()
+        if started:
+            pos = _SEPARATOR.match(buffer, pos).end()
+
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+
+            if pos < len(buffer):
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError as e:
+                    # 只有错误出现在缓冲区末尾时才可能是元素还没有读完整，其他格式错误立即抛出，
+                    # 不会为了等待后续内容而把整个文件读入缓冲区
+                    if eof or not _is_truncated(e, len(buffer)):
+                        raise
+                else:
+                    # 数字等标量可能被读取块截断，只有后面还有字符时才能确定已经完整
+                    if end < len(buffer) or eof:
+                        yield value
+                        pos = end
+                        continue
+
+        if eof:
+            raise ValueError("JSON数组不完整")
+
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def iter_ndjson(f):
+    """
+    逐行产出NDJSON文件中的记录，跳过空行
+
+    Args:
+        f (file): 文本文件对象
+
+    Yields:
+        object: 每行解析出的记录
+    """
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def record_to_activity(record):
+    """
+    由保存的记录重建活动记录
+
+    Args:
+        record (dict): utils.activity_writer.activity_to_record生成的字典
+
+    Returns:
+        Activity: 活动记录
+    """
+    return Activity(
+        timestamp=datetime.fromisoformat(record["timestamp"]),
+        activity_type=ActivityType(record["type"]),
+        content=record["content"],
+        source=record["source"],
+        metadata=record.get("metadata"),
+        title=record.get("title")
+    )
+
+
+def iter_activity_file(path):
+    """
+    惰性读取一个活动记录文件（缩进的JSON数组或NDJSON，可以是压缩的）
+
+    无法识别的记录会被跳过，文件读取出错时打印错误并结束。
+
+    Args:
+        path (str): 文件路径
+
+    Yields:
+        Activity: 文件中的活动记录，顺序与文件中相同
+    """
+    skipped = 0
+    try:
+        file_format = detect_format(path)
+        with open_compressed(path, "r", file_format) as f:
+            records = iter_json_array(f) if file_format == "json" else iter_ndjson(f)
+            for record in records:
+                try:
+                    activity = record_to_activity(record)
+                except (KeyError, ValueError, TypeError):
+                    skipped += 1
+                    continue
+                yield activity
+    except Exception as e:
+        print(f"读取活动记录文件 {path} 时出错: {str(e)}")
+
+    if skipped:
+        print(f"警告：{path} 中有 {skipped} 条无法识别的记录已被跳过")
+
+
+def expand_activity_paths(patterns):
+    """
+    展开文件路径和通配符，按文件名排序并去除重复
+
+    Args:
+        patterns (list): 文件路径或glob模式
+
+    Returns:
+        list: 存在的文件路径
+    """
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        pattern = os.path.expanduser(pattern)
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if not os.path.isfile(path):
+                print(f"警告：活动记录文件不存在: {path}")
+            elif path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
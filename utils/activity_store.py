@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from utils.models import ACTIVITY_TYPES, ActivityBatch, EMPTY_METADATA
+
+# 活动存储的默认路径
+DEFAULT_STORE_PATH = os.path.expanduser("~/.wihd/activities.db")
+
+# 同步数据源时每次提交的记录数量，每次提交都会同时更新该数据源的高水位
+STORE_BATCH_SIZE = 5000
+
+# 查询时fetchmany每批读取的行数
+QUERY_BATCH_SIZE = 5000
+
+# 每条记录以数据源自己的标识为主键（shell历史记录的字节偏移、浏览器访问表的id），
+# 同一秒内内容相同的两次执行或访问是两条记录；时间范围查询使用(timestamp, type)索引
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS activities (
+    source TEXT NOT NULL,
+    record_id INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    content TEXT NOT NULL,
+    title TEXT,
+    metadata TEXT,
+    PRIMARY KEY (source, record_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS activities_time ON activities (timestamp, type);
+CREATE TABLE IF NOT EXISTS high_water_marks (
+    source TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    state TEXT
+);
+"""
+
+UPSERT_QUERY = """
+INSERT INTO activities (source, record_id, timestamp, type, content, title, metadata)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (source, record_id)
+DO UPDATE SET timestamp = excluded.timestamp, type = excluded.type, content = excluded.content,
+              title = excluded.title, metadata = excluded.metadata
+"""
+
+# 数据源重建之后，查找一条重建之前写入的相同记录
+PREVIOUS_RECORD_QUERY = """
+SELECT record_id FROM activities
+WHERE timestamp = ? AND type = ? AND source = ? AND content = ? AND record_id < ?
+LIMIT 1
+"""
+
+_ACTIVITY_TYPES_BY_VALUE = {activity_type.value: activity_type for activity_type in ACTIVITY_TYPES}
+
+
+class ActivityStore:
+    """
+    基于SQLite的本地活动记录存储
+
+    各数据源把新记录增量写入存储，并在同一个事务中更新自己的高水位
+    （zsh历史文件的字节偏移、Chrome的visits.id、Safari的history_visits.id）。
+    记录以数据源中的标识区分，数据源重建（历史文件被重写、浏览器重建数据库）后
+    从新的标识起点重新写入，与重建之前写入的相同记录合并。
+    浏览器清理了自己的历史记录之后，已经写入的记录仍然可以查询。
+    多个线程可以共享同一个存储，写入操作会被串行化。
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(STORE_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        """关闭数据库连接"""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_mark(self, source):
+        """
+        读取数据源的高水位
+
+        Args:
+            source (str): 数据源名称
+
+        Returns:
+            tuple: (位置, 附加状态)，没有记录时为(0, None)
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT position, state FROM high_water_marks WHERE source = ?", (source,)).fetchone()
+        if row is None:
+            return 0, None
+        position, state = row
+        return position, json.loads(state) if state else None
+
+    def next_record_id(self, source):
+        """
+        返回数据源中尚未使用的最小记录标识，数据源重建后从这里开始编号
+
+        Args:
+            source (str): 活动记录的来源
+
+        Returns:
+            int: 最大的记录标识加一，没有记录时为0
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT max(record_id) FROM activities WHERE source = ?", (source,)).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def record(self, source, activities, record_ids, position, state=None, id_base=0):
+        """
+        写入一批活动记录并更新数据源的高水位，两者在同一个事务中提交
+
+        标识已经存在的记录会被更新。id_base大于0时，标识小于id_base的是数据源重建之前
+        写入的记录：新记录与其中时间戳、类型、来源和内容都相同的一条合并，改用新的标识，
+        重新扫描重建后的数据源不会产生重复的记录。
+
+        Args:
+            source (str): 数据源名称
+            activities (iterable): 活动记录
+            record_ids (iterable): 与活动记录一一对应的、数据源中的记录标识
+            position (int): 新的高水位
+            state (dict, optional): 与高水位一起保存的附加状态
+            id_base (int): 本次重建之后记录标识的起点
+
+        Returns:
+            int: 写入的记录数量
+        """
+        rows = [(activity.source, record_id, activity.epoch, activity.activity_type.value, activity.content,
+                 activity.title,
+                 json.dumps(dict(activity.metadata), ensure_ascii=False) if activity.metadata else None)
+                for activity, record_id in zip(activities, record_ids)]
+        with self._lock, self.conn:
+            if id_base:
+                for row in rows:
+                    previous = self.conn.execute(
+                        PREVIOUS_RECORD_QUERY, (row[2], row[3], row[0], row[4], id_base)).fetchone()
+                    if previous is not None:
+                        self.conn.execute(
+                            "UPDATE OR IGNORE activities SET record_id = ? WHERE source = ? AND record_id = ?",
+                            (row[1], row[0], previous[0]))
+            self.conn.executemany(UPSERT_QUERY, rows)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO high_water_marks (source, position, state) VALUES (?, ?, ?)",
+                (source, position, json.dumps(state) if state is not None else None))
+        return len(rows)
+
+    def reset_source(self, source):
+        """清除数据源的高水位，下次同步时从头读取（已有的记录保留）"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM high_water_marks WHERE source = ?", (source,))
+
+    def query(self, start_timestamp, end_timestamp, activity_type=None):
+        """
+        查询时间范围内的活动记录
+
+        Args:
+            start_timestamp (int): 开始时间戳（包含）
+            end_timestamp (int): 结束时间戳（包含）
+            activity_type (ActivityType, optional): 只返回该类型的记录
+
+        Returns:
+            ActivityBatch: 按时间排序的活动记录
+        """
+        query = """
+        SELECT timestamp, type, source, content, title, metadata
+        FROM activities
+        WHERE timestamp >= ? AND timestamp <= ?
+        """
+        params = [start_timestamp, end_timestamp]
+        if activity_type is not None:
+            query += " AND type = ?"
+            params.append(activity_type.value)
+        query += " ORDER BY timestamp"
+
+        batch = ActivityBatch()
+        with self._lock:
+            cursor = self.conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(QUERY_BATCH_SIZE)
+                if not rows:
+                    break
+                for timestamp, type_value, source, content, title, metadata in rows:
+                    batch.append(timestamp, _ACTIVITY_TYPES_BY_VALUE[type_value], content, source,
+                                 metadata=json.loads(metadata) if metadata else EMPTY_METADATA, title=title)
+        return batch
+
+    def count(self):
+        """返回存储中的记录总数"""
+        with self._lock:
+            return self.conn.execute("SELECT count(*) FROM activities").fetchone()[0]
+
+
+@contextmanager
+def open_activity_store(path=None):
+    """
+    打开活动存储的上下文管理器，退出时关闭连接
+
+    Args:
+        path (str, optional): 数据库路径，默认为~/.wihd/activities.db
+
+    Yields:
+        ActivityStore: 活动存储
+    """
+    store = ActivityStore(path or DEFAULT_STORE_PATH)
+    try:
+        yield store
+    finally:
+        store.close()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip
+import io
+import json
+import os
+
+from utils.profiler import span
+
+try:
+    import zstandard
+except ImportError:  # zstd压缩是可选功能
+    zstandard = None
+
+# 支持的活动记录文件格式及其扩展名
+OUTPUT_FORMATS = {
+    "json": ".json",              # 缩进的JSON数组，适合查看单天的记录
+    "ndjson": ".ndjson",          # 每行一条记录
+    "ndjson.gz": ".ndjson.gz",    # gzip压缩的NDJSON
+    "ndjson.zst": ".ndjson.zst",  # zstd压缩的NDJSON，需要安装zstandard
+}
+
+DEFAULT_OUTPUT_FORMAT = "json"
+
+# 写入文件时使用的缓冲区大小
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def activity_to_record(activity):
+    """
+    把活动记录转换为可序列化的字典
+
+    Args:
+        activity (Activity): 活动记录
+
+    Returns:
+        dict: 包含时间、类型、内容和来源的字典，有标题或元数据时一并包含
+    """
+    record = {
+        "timestamp": activity.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+        "type": activity.activity_type.value,
+        "content": activity.content,
+        "source": activity.source
+    }
+
+    if activity.title:
+        record["title"] = activity.title
+
+    if activity.metadata:
+        record["metadata"] = dict(activity.metadata)
+
+    return record
+
+
+def open_compressed(path, mode, output_format):
+    """
+    按文件格式以文本方式打开（可能压缩的）文件
+
+    Args:
+        path (str): 文件路径
+        mode (str): 'r'或'w'
+        output_format (str): OUTPUT_FORMATS中的格式
+
+    Returns:
+        file: 文本文件对象
+    """
+    if output_format.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=6)
+    if output_format.endswith(".zst"):
+        if zstandard is None:
+            raise ValueError("使用zstd压缩需要先安装zstandard: pip install zstandard")
+        raw = open(path, mode + "b")
+        if mode == "w":
+            stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return open(path, mode, encoding="utf-8", buffering=WRITE_BUFFER_SIZE)
+
+
+def _write_json_array(activities, f):
+    """流式写出与json.dump(records, indent=2)相同的缩进JSON数组"""
+    count = 0
+    for activity in activities:
+        text = json.dumps(activity_to_record(activity), ensure_ascii=False, indent=2)
+        f.write(",\n  " if count else "[\n  ")
+        f.write(text.replace("\n", "\n  "))
+        count += 1
+    f.write("\n]" if count else "[]")
+    return count
+
+
+def _write_ndjson(activities, f):
+    """每行写出一条记录"""
+    count = 0
+    for activity in activities:
+        f.write(json.dumps(activity_to_record(activity), ensure_ascii=False))
+        f.write("\n")
+        count += 1
+    return count
+
+
+def write_activities(activities, output_file, output_format=DEFAULT_OUTPUT_FORMAT):
+    """
+    流式写出活动记录
+
+    记录逐条序列化，不会先构造完整的列表；先写入临时文件，全部写完后再
+    原子地重命名为目标文件，中途失败不会留下不完整的文件。
+
+    Args:
+        activities (iterable): 活动记录，可以是生成器
+        output_file (str): 目标文件路径
+        output_format (str): OUTPUT_FORMATS中的格式
+
+    Returns:
+        int: 写出的记录数量
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {output_format}")
+
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    temp_file = output_file + ".tmp"
+    try:
+        with span("output.activities", format=output_format) as write_span:
+            with open_compressed(temp_file, "w", output_format) as f:
+                if output_format == "json":
+                    count = _write_json_array(activities, f)
+                else:
+                    count = _write_ndjson(activities, f)
+            write_span.set(rows=count)
+        os.replace(temp_file, output_file)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+    return count
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Optional
+
+# 用于识别文件被原地重写的尾部字节长度
+TAIL_HASH_BYTES = 4096
+
+
+@dataclass
+class FileCheckpoint:
+    """增量读取文件时保存的检查点"""
+    path: str                       # 被读取的文件路径
+    inode: int                      # 文件inode，变化说明文件被替换
+    size: int                       # 上次读取时的文件大小
+    offset: int                     # 已经消费到的字节偏移（总是位于行边界）
+    tail_hash: str                  # offset之前一段字节的摘要，用于识别原地重写
+    partitions: Dict[str, int] = field(default_factory=dict)  # 缓存分区文件名到已提交大小的映射
+
+
+def compute_tail_hash(file_path, offset):
+    """
+    计算文件在offset之前最后一段字节的摘要
+
+    Args:
+        file_path (str): 文件路径
+        offset (int): 结束偏移
+
+    Returns:
+        str: 十六进制摘要
+    """
+    start = max(0, offset - TAIL_HASH_BYTES)
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(offset - start)
+    return hashlib.sha1(data).hexdigest()
+
+
+def load_checkpoint(state_path):
+    """
+    读取检查点文件
+
+    Args:
+        state_path (str): 检查点文件路径
+
+    Returns:
+        FileCheckpoint: 检查点，不存在或损坏时返回None
+    """
+    if not os.path.exists(state_path):
+        return None
+
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return FileCheckpoint(**data)
+    except (ValueError, TypeError) as e:
+        print(f"警告：检查点文件 {state_path} 已损坏，将重新全量扫描: {str(e)}")
+        return None
+
+
+def save_checkpoint(state_path, checkpoint):
+    """
+    原子地保存检查点文件
+
+    Args:
+        state_path (str): 检查点文件路径
+        checkpoint (FileCheckpoint): 检查点
+    """
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    temp_path = state_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(asdict(checkpoint), f, ensure_ascii=False)
+    os.replace(temp_path, state_path)
+
+
+def resolve_resume_offset(file_path, checkpoint: Optional[FileCheckpoint]):
+    """
+    判断能否从检查点继续读取
+
+    文件被替换（inode变化）、被截断（大小小于偏移）或偏移之前的内容发生变化
+    （例如zsh去重后原地重写）时，都需要从头重新扫描。
+
+    Args:
+        file_path (str): 文件路径
+        checkpoint (FileCheckpoint): 上次保存的检查点，可以为None
+
+    Returns:
+        int: 应该开始读取的偏移，0表示需要全量扫描
+    """
+    if checkpoint is None or checkpoint.path != file_path:
+        return 0
+
+    stat = os.stat(file_path)
+    if stat.st_ino != checkpoint.inode:
+        return 0
+    if stat.st_size < checkpoint.size:
+        return 0
+    if compute_tail_hash(file_path, checkpoint.offset) != checkpoint.tail_hash:
+        return 0
+
+    return checkpoint.offset
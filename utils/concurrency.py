@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+
+# 默认的并发数。解析器主要在等待文件读取和SQLite查询，线程足够使用
+DEFAULT_JOBS = 4
+
+
+def run_tasks(tasks, jobs=DEFAULT_JOBS, default=None):
+    """
+    在线程池中并发执行多个任务，按任务的顺序返回结果
+
+    每个任务的异常都被单独捕获，一个任务失败不会影响其他任务。
+
+    Args:
+        tasks (list): (任务名称, 无参数可调用对象) 的列表
+        jobs (int): 最大并发数，小于等于1时按顺序执行
+        default (callable, optional): 任务失败时用于生成替代结果的函数，参数为任务名称
+
+    Returns:
+        list: 与tasks顺序一致的结果列表
+    """
+    def run(name, func):
+        try:
+            return func()
+        except Exception as e:
+            print(f"任务 '{name}' 执行时出错: {str(e)}")
+            return default(name) if default else None
+
+    if jobs <= 1 or len(tasks) <= 1:
+        return [run(name, func) for name, func in tasks]
+
+    with ThreadPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+        futures = [executor.submit(run, name, func) for name, func in tasks]
+        return [future.result() for future in futures]
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from bisect import bisect_right
+from datetime import datetime, time, timedelta
+
+from utils.models import ActivityBatch
+
+
+def iter_days(start_date, end_date):
+    """
+    按顺序列出日期范围内的每一天
+
+    Args:
+        start_date (datetime): 开始日期
+        end_date (datetime): 结束日期（包含）
+
+    Returns:
+        list: date对象列表
+    """
+    days = []
+    day = start_date.date() if isinstance(start_date, datetime) else start_date
+    last_day = end_date.date() if isinstance(end_date, datetime) else end_date
+    while day <= last_day:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def range_bounds(start_date, end_date):
+    """
+    计算日期范围的边界时间
+
+    Args:
+        start_date (datetime): 开始日期
+        end_date (datetime): 结束日期（包含）
+
+    Returns:
+        tuple: (开始时间, 结束时间)，分别是第一天的00:00:00和最后一天的23:59:59
+    """
+    start = datetime(start_date.year, start_date.month, start_date.day, 0, 0, 0)
+    end = datetime(end_date.year, end_date.month, end_date.day, 23, 59, 59)
+    return start, end
+
+
+def partition_by_day(activities, start_date, end_date):
+    """
+    把按时间排序的活动记录划分到每一天
+
+    Args:
+        activities (iterable): 活动记录，可以是ActivityBatch
+        start_date (datetime): 开始日期
+        end_date (datetime): 结束日期（包含）
+
+    Returns:
+        dict: date到活动列表的映射，范围内的每一天都有键（可能是空列表），
+              范围外的活动会被丢弃。传入ActivityBatch时每天的值也是ActivityBatch
+    """
+    days = iter_days(start_date, end_date)
+    day_starts = [int(datetime(day.year, day.month, day.day).timestamp()) for day in days]
+    range_end = int((datetime.combine(days[-1], time()) + timedelta(days=1)).timestamp()) if days else None
+
+    if isinstance(activities, ActivityBatch):
+        # 批次已按时间排序，二分查找每天的边界后切片
+        day_ends = day_starts[1:] + [range_end]
+        return {day: activities.between(day_start, day_end)
+                for day, day_start, day_end in zip(days, day_starts, day_ends)}
+
+    partitions = {day: [] for day in days}
+    for activity in activities:
+        epoch = activity.epoch
+        if not day_starts or epoch < day_starts[0] or epoch >= range_end:
+            continue
+        partitions[days[bisect_right(day_starts, epoch) - 1]].append(activity)
+
+    return partitions
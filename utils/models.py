@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from dataclasses import dataclass, field
+from array import array
+from bisect import bisect_left
 from datetime import datetime
 from enum import Enum
-from typing import Dict, Any, Optional
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
 
 
 class ActivityType(Enum):
@@ -12,21 +14,192 @@ class ActivityType(Enum):
     TERMINAL = "terminal"  # 终端命令
     SAFARI = "safari"      # Safari浏览记录
     CHROME = "chrome"      # Chrome浏览记录
+    FIREFOX = "firefox"    # Firefox浏览记录
+
+
+# 没有额外元数据的活动共享同一个只读的空映射，不再为每条记录创建一个空字典
+EMPTY_METADATA: Mapping[str, Any] = MappingProxyType({})
+
+# ActivityBatch中活动类型的编码，按枚举定义的顺序
+ACTIVITY_TYPES = list(ActivityType)
+ACTIVITY_TYPE_CODES = {activity_type: code for code, activity_type in enumerate(ACTIVITY_TYPES)}
+
+
+def to_epoch(timestamp):
+    """把datetime或数字时间戳转换为整数Unix时间戳（秒）"""
+    if isinstance(timestamp, datetime):
+        return int(timestamp.timestamp())
+    return int(timestamp)
 
 
-@dataclass
 class Activity:
-    """活动记录类"""
-    timestamp: datetime                    # 活动发生的时间
-    activity_type: ActivityType            # 活动类型
-    content: str                           # 活动内容（命令或URL）
-    source: str                            # 数据来源
-    metadata: Dict[str, Any] = field(default_factory=dict)  # 额外元数据
-    title: Optional[str] = None            # 网页标题（对于浏览记录）
-    
+    """
+    活动记录类
+
+    时间以整数Unix时间戳（秒）保存在epoch中，timestamp属性按需转换为本地时间的datetime。
+    使用__slots__，每条记录没有__dict__；没有元数据时metadata是共享的EMPTY_METADATA。
+    """
+    __slots__ = ('epoch', 'activity_type', 'content', 'source', 'metadata', 'title')
+
+    def __init__(self, timestamp, activity_type: ActivityType, content: str, source: str,
+                 metadata: Optional[Mapping[str, Any]] = None, title: Optional[str] = None):
+        self.epoch = to_epoch(timestamp)         # 活动发生的时间（Unix时间戳）
+        self.activity_type = activity_type       # 活动类型
+        self.content = content                   # 活动内容（命令或URL）
+        self.source = source                     # 数据来源
+        self.metadata = metadata or EMPTY_METADATA  # 额外元数据（只读）
+        self.title = title                       # 网页标题（对于浏览记录）
+
+    @property
+    def timestamp(self) -> datetime:
+        """活动发生的本地时间"""
+        return datetime.fromtimestamp(self.epoch)
+
+    def _fields(self):
+        return (self.epoch, self.activity_type, self.content, self.source, dict(self.metadata), self.title)
+
+    def __eq__(self, other):
+        if not isinstance(other, Activity):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (f"Activity(timestamp={self.timestamp!r}, activity_type={self.activity_type}, "
+                f"content={self.content!r}, source={self.source!r}, "
+                f"metadata={dict(self.metadata)!r}, title={self.title!r})")
+
     def __str__(self):
         """字符串表示"""
-        if self.activity_type in [ActivityType.SAFARI, ActivityType.CHROME] and self.title:
+        if self.activity_type in [ActivityType.SAFARI, ActivityType.CHROME, ActivityType.FIREFOX] and self.title:
             return f"[{self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}] [{self.activity_type.value}] {self.title} - {self.content}"
         else:
-            return f"[{self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}] [{self.activity_type.value}] {self.content}" 
\ No newline at end of file
+            return f"[{self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}] [{self.activity_type.value}] {self.content}"
+
+
+class ActivityBatch:
+    """
+    按列存储的一批活动记录
+
+    时间戳、类型和来源分别保存在array中，来源字符串只保存一份并以编号引用，
+    内容、标题和元数据保存在列表中。解析器可以直接逐条append，不创建Activity对象；
+    遍历或下标访问时才按需生成Activity，因此可以直接交给合并和总结步骤使用。
+    """
+    __slots__ = ('epochs', 'type_codes', 'source_codes', 'sources', 'contents', 'titles', 'metadata',
+                 '_source_index')
+
+    def __init__(self, sources=None):
+        self.epochs = array('q')          # Unix时间戳（秒）
+        self.type_codes = array('B')      # ACTIVITY_TYPES中的下标
+        self.source_codes = array('H')    # sources中的下标
+        self.sources = list(sources) if sources else []
+        self.contents = []
+        self.titles = []
+        self.metadata = []
+        self._source_index = {source: code for code, source in enumerate(self.sources)}
+
+    @classmethod
+    def from_activities(cls, activities):
+        """由Activity序列创建批次"""
+        batch = cls()
+        batch.extend(activities)
+        return batch
+
+    def _source_code(self, source):
+        code = self._source_index.get(source)
+        if code is None:
+            code = self._source_index[source] = len(self.sources)
+            self.sources.append(source)
+        return code
+
+    def append(self, timestamp, activity_type, content, source, metadata=None, title=None):
+        """追加一条记录，参数与Activity的构造参数相同"""
+        self.epochs.append(to_epoch(timestamp))
+        self.type_codes.append(ACTIVITY_TYPE_CODES[activity_type])
+        self.source_codes.append(self._source_code(source))
+        self.contents.append(content)
+        self.titles.append(title)
+        self.metadata.append(metadata or EMPTY_METADATA)
+
+    def append_activity(self, activity):
+        """追加一个Activity对象"""
+        self.append(activity.epoch, activity.activity_type, activity.content, activity.source,
+                    activity.metadata, activity.title)
+
+    def extend(self, activities):
+        """追加多个Activity对象"""
+        for activity in activities:
+            self.append_activity(activity)
+
+    def activity(self, index):
+        """生成第index条记录的Activity对象"""
+        activity = Activity.__new__(Activity)
+        activity.epoch = self.epochs[index]
+        activity.activity_type = ACTIVITY_TYPES[self.type_codes[index]]
+        activity.content = self.contents[index]
+        activity.source = self.sources[self.source_codes[index]]
+        activity.metadata = self.metadata[index]
+        activity.title = self.titles[index]
+        return activity
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def __iter__(self):
+        for index in range(len(self.epochs)):
+            yield self.activity(index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(range(*index.indices(len(self.epochs))))
+        if index < 0:
+            index += len(self.epochs)
+        if not 0 <= index < len(self.epochs):
+            raise IndexError("ActivityBatch index out of range")
+        return self.activity(index)
+
+    def take(self, indices):
+        """按给定的下标顺序取出记录组成新的批次，新批次共享来源字符串表"""
+        batch = ActivityBatch(self.sources)
+        if isinstance(indices, range) and indices.step == 1:
+            # 连续区间直接切片
+            start, stop = indices.start, indices.stop
+            batch.epochs = self.epochs[start:stop]
+            batch.type_codes = self.type_codes[start:stop]
+            batch.source_codes = self.source_codes[start:stop]
+            batch.contents = self.contents[start:stop]
+            batch.titles = self.titles[start:stop]
+            batch.metadata = self.metadata[start:stop]
+            return batch
+        indices = list(indices)
+        batch.epochs = array('q', [self.epochs[i] for i in indices])
+        batch.type_codes = array('B', [self.type_codes[i] for i in indices])
+        batch.source_codes = array('H', [self.source_codes[i] for i in indices])
+        batch.contents = [self.contents[i] for i in indices]
+        batch.titles = [self.titles[i] for i in indices]
+        batch.metadata = [self.metadata[i] for i in indices]
+        return batch
+
+    def is_sorted(self):
+        """判断记录是否已按时间排序"""
+        epochs = self.epochs
+        return all(epochs[i] <= epochs[i + 1] for i in range(len(epochs) - 1))
+
+    def sort(self):
+        """按时间稳定排序（原地）"""
+        if self.is_sorted():
+            return
+        order = sorted(range(len(self.epochs)), key=self.epochs.__getitem__)
+        sorted_batch = self.take(order)
+        for name in ('epochs', 'type_codes', 'source_codes', 'contents', 'titles', 'metadata'):
+            setattr(self, name, getattr(sorted_batch, name))
+
+    def between(self, start_epoch, end_epoch):
+        """取出时间在[start_epoch, end_epoch)内的记录，批次必须已按时间排序"""
+        start = bisect_left(self.epochs, start_epoch)
+        stop = bisect_left(self.epochs, end_epoch, start)
+        return self.take(range(start, stop))
+
+    def __repr__(self):
+        return f"ActivityBatch({len(self)} activities)"
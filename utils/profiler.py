@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows上没有resource模块，不记录常驻内存
+    resource = None
+
+# ru_maxrss在macOS上以字节为单位，在Linux上以KB为单位
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+# --profile不指定路径时写入的文件
+DEFAULT_PROFILE_PATH = os.path.join("output", "profile.json")
+
+# 当前的记录器，没有开启性能分析时为None
+_tracer = None
+
+
+def _peak_rss():
+    """进程到目前为止的常驻内存峰值（字节），无法获取时返回0"""
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+
+class _NullSpan:
+    """关闭性能分析时使用的空区间，所有操作都不做任何事"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """
+    一个计时区间：墙钟时间、当前线程的CPU时间、产出的行数和常驻内存峰值的增长
+
+    通过with使用，区间结束时交给记录器。set可以在区间内附加行数等参数。
+    """
+
+    __slots__ = ("tracer", "name", "category", "args", "start", "cpu_start", "rss_start")
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def set(self, **args):
+        """附加参数，例如rows=产出的记录数量"""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.rss_start = _peak_rss()
+        self.cpu_start = time.thread_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        cpu = time.thread_time() - self.cpu_start
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self, end, cpu, _peak_rss() - self.rss_start)
+        return False
+
+
+class Tracer:
+    """
+    收集各个区间并导出为Chrome trace格式（chrome://tracing或Perfetto可以打开）
+
+    每个区间是一个"X"（完整）事件，时间以记录器创建时为0点，单位为微秒；各线程中的
+    区间按线程分行显示，嵌套的区间显示为层级。
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.events = []
+        self.threads = {}
+        self._lock = threading.Lock()
+
+    def span(self, name, category, args):
+        return Span(self, name, category, args)
+
+    def record(self, span, end, cpu, rss_delta):
+        """记录一个结束的区间"""
+        thread = threading.current_thread()
+        args = dict(span.args)
+        args["cpu_ms"] = round(cpu * 1000, 3)
+        if resource is not None:
+            args["peak_rss_delta_kb"] = rss_delta // 1024
+        event = {
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": round((span.start - self.origin) * 1e6, 1),
+            "dur": round((end - span.start) * 1e6, 1),
+            "pid": self.pid,
+            "tid": thread.ident,
+            "args": args,
+        }
+        with self._lock:
+            self.events.append(event)
+            self.threads.setdefault(thread.ident, thread.name)
+
+    def trace(self):
+        """Chrome trace格式的字典"""
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+        metadata = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                    for tid, name in threads.items()]
+        return {"traceEvents": metadata + sorted(events, key=lambda event: event["ts"]),
+                "displayTimeUnit": "ms"}
+
+    def save(self, path):
+        """
+        把记录的区间写入Chrome trace格式的JSON文件
+
+        Args:
+            path (str): 文件路径
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.trace(), f, ensure_ascii=False)
+
+    def summary(self, limit=20):
+        """
+        按墙钟时间从多到少列出各区间
+
+        Returns:
+            str: 每行一个区间的墙钟时间、CPU时间、行数和名称
+        """
+        with self._lock:
+            events = sorted(self.events, key=lambda event: -event["dur"])[:limit]
+        lines = [f"{'墙钟(ms)':>10} {'CPU(ms)':>10} {'行数':>10}  区间"]
+        for event in events:
+            rows = event["args"].get("rows")
+            lines.append(f"{event['dur'] / 1000:>10.1f} {event['args']['cpu_ms']:>10.1f} "
+                         f"{rows if rows is not None else '-':>10}  {event['name']}")
+        return "\n".join(lines)
+
+
+def span(name, category="wihd", **args):
+    """
+    性能分析的区间
+
+    没有开启性能分析时返回共享的空区间，只有一次全局变量检查的开销，可以放在
+    热路径上。用法：
+
+        with span("chrome.query", profile=name) as s:
+            rows = cursor.fetchall()
+            s.set(rows=len(rows))
+
+    Args:
+        name (str): 区间名称
+        category (str): 类别，Chrome trace中可以按类别筛选
+        **args: 附加在区间上的参数
+
+    Returns:
+        上下文管理器，进入后得到的对象有set方法
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return tracer.span(name, category, args)
+
+
+def enable_profiling():
+    """开启性能分析，返回新的记录器"""
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def disable_profiling():
+    """关闭性能分析，返回之前的记录器（没有开启时为None）"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def traced(name, func, rows=None, category="wihd", **args):
+    """
+    把无参数的可调用对象包装为在区间中运行，用于交给run_tasks的任务
+
+    Args:
+        name (str): 区间名称
+        func (callable): 无参数的可调用对象
+        rows (callable, optional): 由返回值计算行数的函数
+        category (str): 类别
+        **args: 附加在区间上的参数
+
+    Returns:
+        callable: 包装后的无参数可调用对象
+    """
+    def run():
+        with span(name, category, **args) as current:
+            result = func()
+            if rows is not None and _tracer is not None:
+                current.set(rows=rows(result))
+            return result
+    return run
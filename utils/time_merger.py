@@ -1,22 +1,35 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import heapq
+from operator import attrgetter
+
+# 活动记录的排序键（整数Unix时间戳，比较时不需要构造datetime）
+activity_time_key = attrgetter('epoch')
+
+def iter_merged_activities(*activity_iterables):
+    """
+    惰性地合并多个已按时间排序的活动序列
+
+    使用基于堆的k路归并，每次只持有每个输入序列的当前元素，
+    输入可以是列表、ActivityBatch，也可以是生成器。时间相同的活动按输入的顺序输出。
+
+    Args:
+        *activity_iterables: 可变参数，传入多个已按时间排序的活动序列
+
+    Returns:
+        iterator: 按时间排序的活动迭代器
+    """
+    return heapq.merge(*activity_iterables, key=activity_time_key)
+
 def merge_activities(*activity_lists):
     """
     合并多个活动列表，按时间戳排序
-    
+
     Args:
-        *activity_lists: 可变参数，传入多个活动列表
-    
+        *activity_lists: 可变参数，传入多个已按时间排序的活动列表（或生成器）
+
     Returns:
         list: 合并后的活动列表，按时间排序
     """
-    # 合并所有活动
-    all_activities = []
-    for activities in activity_lists:
-        all_activities.extend(activities)
-    
-    # 按时间戳排序
-    all_activities.sort(key=lambda x: x.timestamp)
-    
-    return all_activities 
\ No newline at end of file
+    return list(iter_merged_activities(*activity_lists))